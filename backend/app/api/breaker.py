@@ -0,0 +1,161 @@
+"""Circuit breakers for failing fast while an upstream API is down."""
+import time
+from enum import Enum
+
+from backend.app.core import config
+from backend.app.utils import LoggerManager
+
+logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
+
+
+class BreakerState(str, Enum):
+    """Enumeration for representing the state of a circuit breaker.
+
+    Values:
+        CLOSED  |  OPEN  |  HALF_OPEN
+    """
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+class CircuitBreaker:
+    """Circuit breaker for a single upstream operation.
+
+    CLOSED: Calls are allowed. After 'failure_threshold' consecutive
+        failures the breaker opens.
+    OPEN: Calls are rejected until 'reset_timeout' seconds have passed,
+        after which the breaker becomes half-open.
+    HALF_OPEN: Up to 'half_open_max_calls' trial calls are allowed.
+        A successful trial closes the breaker, a failed one opens it.
+    """
+
+    def __init__(
+            self, name: str, failure_threshold: int,
+            reset_timeout: float, half_open_max_calls: int = 1) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = BreakerState.CLOSED
+        self.consecutive_failures: int = 0
+        self.opened_at: float = 0.0
+        self.half_open_calls: int = 0
+        self.counters: dict[str, int] = {
+            "successes": 0, "failures": 0, "rejected": 0,
+            "opened": 0, "half_opened": 0, "closed": 0}
+
+    @property
+    def state(self) -> BreakerState:
+        """The current state, moving from OPEN to HALF_OPEN once due."""
+        if self._state is BreakerState.OPEN and \
+                time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._transition(BreakerState.HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: BreakerState) -> None:
+        """Change the state, logging & counting the change."""
+        logger.warning(
+            "Circuit breaker '%s': %s -> %s (consecutive failures: %s).",
+            self.name, self._state.value, state.value,
+            self.consecutive_failures)
+        self._state = state
+        match state:
+            case BreakerState.OPEN:
+                self.opened_at = time.monotonic()
+                self.counters["opened"] += 1
+            case BreakerState.HALF_OPEN:
+                self.half_open_calls = 0
+                self.counters["half_opened"] += 1
+            case BreakerState.CLOSED:
+                self.counters["closed"] += 1
+
+    def is_open(self) -> bool:
+        """Check if calls are currently being rejected outright."""
+        return self.state is BreakerState.OPEN
+
+    def allow(self) -> bool:
+        """Check if a call may proceed, counting it if rejected."""
+        match self.state:
+            case BreakerState.CLOSED:
+                return True
+            case BreakerState.HALF_OPEN \
+                    if self.half_open_calls < self.half_open_max_calls:
+                self.half_open_calls += 1
+                return True
+        self.counters["rejected"] += 1
+        return False
+
+    def release(self) -> None:
+        """Free the slot of a trial call that ended without an outcome.
+
+        A trial call that is cancelled between allow() & record_*()
+        would otherwise hold its slot, until the next state change.
+        """
+        if self._state is BreakerState.HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def record_success(self) -> None:
+        """Record a successful call."""
+        self.counters["successes"] += 1
+        self.consecutive_failures = 0
+        if self._state is not BreakerState.CLOSED:
+            self._transition(BreakerState.CLOSED)
+
+    def record_failure(self) -> None:
+        """Record a failed call."""
+        self.counters["failures"] += 1
+        self.consecutive_failures += 1
+        if self._state is BreakerState.HALF_OPEN or (
+                self._state is BreakerState.CLOSED
+                and self.consecutive_failures >= self.failure_threshold):
+            self._transition(BreakerState.OPEN)
+
+    def statistics(self) -> dict[str, str | int]:
+        """Get the current state & the counters of the breaker."""
+        return {"state": self.state.value, **self.counters}
+
+
+class BreakerRegistry:
+    """Creates & holds a circuit breaker for each upstream operation."""
+
+    def __init__(
+            self, failure_threshold: int, reset_timeout: float,
+            half_open_max_calls: int) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, operation: str) -> CircuitBreaker:
+        """Get the circuit breaker of an operation."""
+        if operation not in self.breakers:
+            self.breakers[operation] = CircuitBreaker(
+                name=operation,
+                failure_threshold=self.failure_threshold,
+                reset_timeout=self.reset_timeout,
+                half_open_max_calls=self.half_open_max_calls)
+        return self.breakers[operation]
+
+    def is_open(self, *operations: str) -> bool:
+        """Check if the breaker of any of the given operations is open."""
+        return any(self.get(op).is_open() for op in operations)
+
+    def statistics(self) -> dict[str, dict[str, str | int]]:
+        """Get the statistics of every breaker."""
+        return {
+            operation: breaker.statistics()
+            for operation, breaker in self.breakers.items()}
+
+
+def create_breaker_registry() -> BreakerRegistry:
+    """Create a registry configured from the [CIRCUIT_BREAKER] settings."""
+    settings = config.parser["CIRCUIT_BREAKER"]
+    return BreakerRegistry(
+        failure_threshold=settings.getint("failure_threshold"),
+        reset_timeout=settings.getfloat("reset_timeout"),
+        half_open_max_calls=settings.getint("half_open_max_calls"))
+
+
+# Shared by all requests sent to the s-kaupat API
+upstream = create_breaker_registry()
@@ -0,0 +1,141 @@
+"""In-memory cache for parsed upstream responses."""
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+import pydantic
+
+from backend.app.api.skaupat.query_utils import Operation
+from backend.app.core import config
+from backend.app.utils import LoggerManager
+
+logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
+
+# Returned by ResponseCache.get() on a miss, as None may be a cached value
+MISSING: Any = object()
+
+
+def estimate_size(value: Any) -> int:
+    """Estimate the memory used by a value & everything it contains."""
+    size = sys.getsizeof(value)
+    match value:
+        case pydantic.BaseModel():
+            size += estimate_size(value.__dict__)
+        case dict():
+            size += sum(
+                estimate_size(k) + estimate_size(v)
+                for k, v in value.items())
+        case list() | tuple() | set():
+            size += sum(estimate_size(i) for i in value)
+    return size
+
+
+class ResponseCache:
+    """TTL & memory bounded LRU cache, keyed by request key.
+
+    Every entry expires after the TTL of its operation. When the
+    estimated size of all entries exceeds 'max_bytes', the least
+    recently used entries are evicted until the cache fits again.
+    """
+
+    def __init__(
+            self, ttls: dict[str, float], max_bytes: int,
+            enabled: bool = True) -> None:
+        self.ttls = ttls
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.size: int = 0
+        # key -> (expires at, size, value)
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = \
+            OrderedDict()
+        self.counters: dict[str, int] = {
+            "hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: str) -> Any:
+        """Get a cached value, or MISSING if absent or expired."""
+        if not self.enabled:
+            return MISSING
+        if (entry := self._entries.get(key)) is None:
+            self.counters["misses"] += 1
+            return MISSING
+        expires, _, value = entry
+        if expires <= time.monotonic():
+            self._remove(key)
+            self.counters["expirations"] += 1
+            self.counters["misses"] += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return value
+
+    def set(self, key: str, operation: str, value: Any) -> None:
+        """Cache a value for the TTL of the given operation."""
+        if not self.enabled or (ttl := self.ttls.get(operation, 0)) <= 0:
+            return
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            logger.debug("Value for key %s too large to cache.", key)
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        """Remove an entry & release its size."""
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    async def fetch[T](
+            self, key: str, operation: str,
+            func: Callable[[], Awaitable[T]],
+            cacheable: Callable[[T], bool]) -> T:
+        """Get a cached value, or call func & cache its result.
+
+        Args:
+            key (str): The request key of the value.
+            operation (str): The operation, determines the TTL.
+            func (Callable[[], Awaitable[T]]): Called on a miss.
+            cacheable (Callable[[T], bool]):
+                Called with the result of func, the result is
+                only cached if this returns True.
+
+        Returns:
+            T: The cached value or the result of func.
+        """
+        if (value := self.get(key)) is not MISSING:
+            return value
+        value = await func()
+        if cacheable(value):
+            self.set(key, operation, value)
+        return value
+
+    def statistics(self) -> dict[str, int | bool]:
+        """Get the counters, entry count & estimated size of the cache."""
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            **self.counters}
+
+
+def create_response_cache() -> ResponseCache:
+    """Create a cache configured from the [RESPONSE_CACHE] settings."""
+    settings = config.parser["RESPONSE_CACHE"]
+    return ResponseCache(
+        ttls={
+            Operation.PRODUCT_SEARCH.value:
+                settings.getfloat("product_search_ttl"),
+            Operation.STORE_SEARCH.value:
+                settings.getfloat("store_search_ttl")},
+        max_bytes=settings.getint("max_bytes"),
+        enabled=settings.getboolean("enabled"))
+
+
+# Shared by all strategies that send requests to the s-kaupat API
+upstream = create_response_cache()
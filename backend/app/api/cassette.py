@@ -0,0 +1,151 @@
+"""Record & replay upstream request/response pairs.
+
+A cassette is a gzip compressed JSON lines file in data/cassettes,
+each line holding a single request/response pair & its latency.
+Recording appends pairs through the AsyncClient event hooks,
+replaying serves them back through a transport without network access.
+"""
+import gzip
+import json
+import asyncio
+import time
+import hashlib
+import weakref
+from collections import defaultdict, deque
+from pathlib import Path
+
+from httpx import AsyncBaseTransport, Request, Response
+
+from backend.app.core import config
+from backend.app.utils import LoggerManager
+from backend.app.utils import paths
+
+logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
+
+_settings = config.parser["CASSETTE"]
+MODE = _settings["mode"].strip().lower()
+NAME = _settings["name"]
+SPEED = _settings.getfloat("speed")
+
+
+def cassette_path(name: str) -> Path:
+    """Get the path of a cassette file by name."""
+    return paths.Project.cassettes_dir_path() / f"{name}.jsonl.gz"
+
+
+def build_cassette_key(method: str, url: str, content: bytes) -> str:
+    """Build a key that matches a replayed request to a recorded one."""
+    return f"{method} {url} " + hashlib.sha256(content).hexdigest()
+
+
+class CassetteRecorder:
+    """Appends upstream request/response pairs to a cassette file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.recorded: int = 0
+        # Appends run in a thread, one at a time
+        self._lock = asyncio.Lock()
+        self._started: weakref.WeakKeyDictionary[Request, float] = \
+            weakref.WeakKeyDictionary()
+
+    async def start(self, request: Request) -> None:
+        """Request event hook, note when the request was sent."""
+        self._started[request] = time.monotonic()
+
+    async def record(self, response: Response) -> None:
+        """Response event hook, append the request & response."""
+        # Reading the body here is fine, it is cached on the response
+        await response.aread()
+        request = response.request
+        elapsed = time.monotonic() - self._started.pop(
+            request, time.monotonic())
+        entry = {
+            "operation": request.extensions.get("operation"),
+            "method": request.method,
+            "url": str(request.url),
+            "request": request.content.decode(errors="replace"),
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type"),
+            "body": response.content.decode(errors="replace"),
+            "elapsed": elapsed}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        # Kept off the event loop, so it doesn't skew recorded latencies
+        async with self._lock:
+            await asyncio.to_thread(self._append, line)
+        self.recorded += 1
+
+    def _append(self, line: str) -> None:
+        """Append a line to the cassette file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Every append adds a gzip member, gzip.open reads them as one
+        with gzip.open(self.path, "at", encoding="utf-8") as file:
+            file.write(line)
+
+
+def load_cassette(path: Path) -> list[dict]:
+    """Load every recorded entry of a cassette file."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class ReplayTransport(AsyncBaseTransport):
+    """Serves recorded responses instead of sending requests.
+
+    Requests are matched by method, url & body. When a request was
+    recorded more than once, its responses are served in recorded
+    order & the last one is repeated. The recorded latency is
+    reproduced, divided by 'speed'; a speed of 0 disables the delay.
+    Unmatched requests get a 404 response.
+    """
+
+    def __init__(self, entries: list[dict], speed: float = 1.0) -> None:
+        self.speed = speed
+        self._responses: dict[str, deque[dict]] = defaultdict(deque)
+        for entry in entries:
+            key = build_cassette_key(
+                entry["method"], entry["url"], entry["request"].encode())
+            self._responses[key].append(entry)
+        self.counters: dict[str, int] = {"hits": 0, "misses": 0}
+
+    async def handle_async_request(self, request: Request) -> Response:
+        """Get the recorded response of a request."""
+        key = build_cassette_key(
+            request.method, str(request.url), await request.aread())
+        if not (recorded := self._responses.get(key)):
+            self.counters["misses"] += 1
+            logger.warning(
+                "No recorded response for %s %s (operation: %s).",
+                request.method, request.url,
+                request.extensions.get("operation"))
+            return Response(
+                404, json={"errors": [{"message": "Not recorded"}]},
+                request=request)
+        entry = recorded.popleft() if len(recorded) > 1 else recorded[0]
+        self.counters["hits"] += 1
+        if self.speed > 0:
+            await asyncio.sleep(entry["elapsed"] / self.speed)
+        headers = {}
+        if entry["content_type"]:
+            headers["content-type"] = entry["content_type"]
+        return Response(
+            entry["status"], headers=headers,
+            content=entry["body"].encode(), request=request)
+
+
+def create_replay_transport(
+        name: str = NAME, speed: float = SPEED) -> ReplayTransport:
+    """Create a transport replaying the named cassette."""
+    path = cassette_path(name)
+    entries = load_cassette(path)
+    logger.info(
+        "Replaying %s recorded responses from %s at speed %s.",
+        len(entries), path, speed)
+    return ReplayTransport(entries, speed=speed)
+
+
+def create_recorder(name: str = NAME) -> CassetteRecorder:
+    """Create a recorder appending to the named cassette."""
+    path = cassette_path(name)
+    logger.info("Recording upstream responses to %s.", path)
+    return CassetteRecorder(path)
@@ -0,0 +1,79 @@
+"""Single-flight coalescing of identical in-flight upstream requests."""
+import asyncio
+from typing import Awaitable, Callable
+
+from backend.app.utils import LoggerManager
+from backend.app.utils import deadline
+
+logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
+
+
+class SingleFlight:
+    """Share a single in-flight call between concurrent identical callers.
+
+    The first caller for a key starts the call, any caller arriving
+    with the same key while the call is still in-flight awaits that
+    same call instead & receives the same result (or exception).
+    Once the call completes, the key is released so that the next
+    caller starts a fresh call.
+
+    The shared call runs without a deadline (see utils.deadline), as it
+    would otherwise inherit the first caller's. Each caller only waits
+    for the call until its own deadline.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Task] = {}
+        self.calls: int = 0
+        self.coalesced: int = 0
+
+    async def do[T](self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """Execute func once for all concurrent callers with the same key.
+
+        Args:
+            key (str):
+                Identifies calls that are interchangeable.
+            func (Callable[[], Awaitable[T]]):
+                Called to create the shared call if none is in-flight.
+
+        Returns:
+            T: The result of the shared call.
+
+        Raises:
+            TimeoutError: If the caller's deadline passes first,
+                the shared call carries on for the other callers.
+        """
+        if (task := self._calls.get(key)) is not None:
+            self.coalesced += 1
+            logger.debug("Joined in-flight call for key: %s", key)
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(self._detached(func))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._release(key, task))
+        # Shielded, so one cancelled caller doesn't cancel it for the rest
+        return await asyncio.wait_for(
+            asyncio.shield(task), timeout=deadline.remaining())
+
+    @staticmethod
+    async def _detached[T](func: Callable[[], Awaitable[T]]) -> T:
+        """Call func without the deadline of the caller that started it."""
+        with deadline.detached():
+            return await func()
+
+    def _release(self, key: str, task: asyncio.Task) -> None:
+        """Forget the finished call, unless it was already replaced."""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def statistics(self) -> dict[str, int]:
+        """Get counters for started, coalesced & in-flight calls."""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls)
+        }
+
+
+# Shared by all strategies that send requests to the s-kaupat API
+upstream = SingleFlight()
@@ -0,0 +1,241 @@
+"""Rate & concurrency limiting for requests sent to an upstream API."""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from backend.app.core import config
+from backend.app.utils import LoggerManager
+
+logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
+
+
+class TokenBucket:
+    """Token bucket that limits the average rate of acquisitions.
+
+    Tokens are refilled continuously at 'rate' tokens per second,
+    up to 'capacity' tokens, which is the size of the allowed burst.
+    Waiting acquirers are served in FIFO order.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        if rate <= 0 or capacity < 1:
+            raise ValueError(
+                "Rate must be positive & capacity at least 1.")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        """Add the tokens accumulated since the last refill."""
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Wait for & consume a single token.
+
+        Returns:
+            float: The time spent waiting for the token, in seconds.
+        """
+        start = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+        return time.monotonic() - start
+
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency limit adapted by additive-increase, multiplicative-decrease.
+
+    Every healthy completion grows the window by 'increase / window',
+    so the window grows by roughly 'increase' per window's worth of
+    requests. A failure, or a latency above 'latency_tolerance' times
+    the baseline latency, shrinks the window by 'decrease_factor'.
+    Decreases are applied at most once per baseline latency, so that
+    a burst of concurrent failures only counts as a single signal.
+    """
+
+    def __init__(
+            self, initial: int, minimum: int, maximum: int,
+            increase: float = 1.0, decrease_factor: float = 0.7,
+            latency_tolerance: float = 2.0,
+            smoothing: float = 0.1) -> None:
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError(
+                "Limits must satisfy: 1 <= minimum <= initial <= maximum")
+        self.window: float = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline_latency: float | None = None
+        self.in_flight: int = 0
+        self.waiting: int = 0
+        self._last_decrease: float = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        """The current whole number of requests allowed in-flight."""
+        return max(self.minimum, int(self.window))
+
+    async def acquire(self) -> float:
+        """Wait until a request fits within the window.
+
+        Returns:
+            float: The time spent waiting, in seconds.
+        """
+        start = time.monotonic()
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: self.in_flight < self.limit)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+        return time.monotonic() - start
+
+    async def release(self, latency: float, success: bool | None) -> None:
+        """Release a request & adapt the window based on its outcome.
+
+        Args:
+            latency (float): How long the request took, in seconds.
+            success (bool | None): Whether the request succeeded.
+                None releases the slot without adapting the window,
+                e.g. for a cancelled request.
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            if success is not None:
+                self._adapt(latency=latency, success=success)
+            self._condition.notify_all()
+
+    def _adapt(self, latency: float, success: bool) -> None:
+        """Grow or shrink the window."""
+        baseline = self.baseline_latency
+        congested = baseline is not None \
+            and latency > baseline * self.latency_tolerance
+        if success and not congested:
+            self.window = min(
+                self.maximum, self.window + self.increase / self.window)
+        else:
+            now = time.monotonic()
+            if now - self._last_decrease >= (baseline or 0.0):
+                self._last_decrease = now
+                old_limit = self.limit
+                self.window = max(
+                    self.minimum, self.window * self.decrease_factor)
+                logger.info(
+                    "Decreased concurrency limit %s -> %s (%s).",
+                    old_limit, self.limit,
+                    "latency" if success else "failure")
+        if success:
+            self.baseline_latency = latency if baseline is None else \
+                baseline + self.smoothing * (latency - baseline)
+
+
+class Permit:
+    """Handed out for each limited request to report its outcome."""
+    __slots__ = ("failed",)
+
+    def __init__(self) -> None:
+        self.failed = False
+
+
+class UpstreamLimiter:
+    """Combines a token bucket & an adaptive concurrency limiter.
+
+    Usage:
+        async with limiter.limit() as permit:
+            response = await send(...)
+            permit.failed = not ok(response)
+
+    An exception raised within the context also counts as a failure.
+    Cancellation does not, a cancelled request (e.g. a losing hedge)
+    says nothing about the upstream & leaves the window as is.
+    """
+
+    def __init__(
+            self, bucket: TokenBucket,
+            concurrency: AdaptiveConcurrencyLimiter,
+            sample_size: int = 1000) -> None:
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.requests: int = 0
+        self.failures: int = 0
+        self.cancelled: int = 0
+        self._waits: deque[float] = deque(maxlen=sample_size)
+
+    @asynccontextmanager
+    async def limit(self) -> AsyncIterator[Permit]:
+        """Wait for a token & a free slot, then hold the slot."""
+        waited = await self.bucket.acquire()
+        waited += await self.concurrency.acquire()
+        self._waits.append(waited)
+        self.requests += 1
+        permit = Permit()
+        start = time.monotonic()
+        cancelled = False
+        try:
+            yield permit
+        except asyncio.CancelledError:
+            cancelled = True
+            self.cancelled += 1
+            raise
+        except Exception:
+            permit.failed = True
+            raise
+        finally:
+            if permit.failed:
+                self.failures += 1
+            await self.concurrency.release(
+                latency=time.monotonic() - start,
+                success=None if cancelled else not permit.failed)
+
+    def statistics(self) -> dict[str, int | float | None]:
+        """Get the current window, queue depth & recent wait times."""
+        waits = sorted(self._waits)
+        return {
+            "window": round(self.concurrency.window, 2),
+            "limit": self.concurrency.limit,
+            "in_flight": self.concurrency.in_flight,
+            "queue_depth": self.concurrency.waiting,
+            "baseline_latency": self.concurrency.baseline_latency,
+            "tokens": round(self.bucket.tokens, 2),
+            "requests": self.requests,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+            "wait_mean": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+
+def create_upstream_limiter() -> UpstreamLimiter:
+    """Create a limiter configured from the [UPSTREAM_LIMITER] settings."""
+    settings = config.parser["UPSTREAM_LIMITER"]
+    return UpstreamLimiter(
+        bucket=TokenBucket(
+            rate=settings.getfloat("rate"),
+            capacity=settings.getfloat("burst")),
+        concurrency=AdaptiveConcurrencyLimiter(
+            initial=settings.getint("initial_concurrency"),
+            minimum=settings.getint("min_concurrency"),
+            maximum=settings.getint("max_concurrency"),
+            decrease_factor=settings.getfloat("decrease_factor"),
+            latency_tolerance=settings.getfloat("latency_tolerance")))
+
+
+# Shared by all requests sent to the s-kaupat API
+upstream = create_upstream_limiter()
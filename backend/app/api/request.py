@@ -1,7 +1,14 @@
 """HTTPX http functions."""
 import json
+import time
+import random
+import asyncio
+from collections import deque
 from httpx import (
     AsyncClient,
+    AsyncBaseTransport,
+    Limits,
+    Timeout,
     Response,
     Request,
     HTTPError,
@@ -9,12 +16,152 @@ from httpx import (
     ConnectError,
     ConnectTimeout
 )
+from backend.app.api import breaker
+from backend.app.api import cassette
+from backend.app.api import limiter
 from backend.app.core import config
 from backend.app.utils import LoggerManager
+from backend.app.utils import deadline
+from backend.app.utils import exceptions
 
 logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
 DEBUG_FLAG = bool(config.parser["APP"]["debug"])
 
+_client_config = config.parser["HTTP_CLIENT"]
+HTTP2 = _client_config.getboolean("http2")
+POOL_LIMITS = Limits(
+    max_connections=_client_config.getint("max_connections"),
+    max_keepalive_connections=_client_config.getint(
+        "max_keepalive_connections"),
+    keepalive_expiry=_client_config.getfloat("keepalive_expiry"))
+POOL_TIMEOUT = Timeout(
+    connect=_client_config.getfloat("connect_timeout"),
+    read=_client_config.getfloat("read_timeout"),
+    write=_client_config.getfloat("write_timeout"),
+    pool=_client_config.getfloat("pool_timeout"))
+
+# Created & closed by the FastAPI lifespan, see core.process
+async_client: AsyncClient | None = None
+
+
+class LatencyTracker:
+    """Keeps a sliding window of latencies for computing percentiles."""
+
+    def __init__(self, sample_size: int = 500) -> None:
+        self.samples: deque[float] = deque(maxlen=sample_size)
+
+    def record(self, latency: float) -> None:
+        """Record the latency of a successful request, in seconds."""
+        self.samples.append(latency)
+
+    def percentile(self, percentile: float) -> float:
+        """Get the given percentile (0-100) of the recorded latencies."""
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+
+class ResiliencePolicy:
+    """Retry, timeout & hedging policy for idempotent upstream requests.
+
+    Attempts are retried with full-jitter exponential backoff, while
+    staying within a total time budget per call. Once enough latency
+    samples have been recorded for an operation, its read timeout is
+    derived from a latency percentile & a hedged duplicate request is
+    sent if the first one has not answered within another percentile.
+    Hedges are capped to a ratio of all requests to bound extra load.
+    """
+
+    def __init__(
+            self, max_attempts: int, backoff_base: float,
+            backoff_max: float, total_budget: float,
+            min_timeout: float, max_timeout: float,
+            timeout_percentile: float, timeout_multiplier: float,
+            min_samples: int, hedging: bool, hedge_percentile: float,
+            hedge_ratio: float) -> None:
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.total_budget = total_budget
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_percentile = timeout_percentile
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_ratio = hedge_ratio
+        self.trackers: dict[str, LatencyTracker] = {}
+        self.counters: dict[str, int] = {
+            "calls": 0, "attempts": 0, "retries": 0, "hedges": 0,
+            "hedge_wins": 0, "timeouts": 0, "budget_exhausted": 0}
+
+    def tracker(self, operation: str) -> LatencyTracker:
+        """Get the latency tracker of an operation."""
+        if operation not in self.trackers:
+            self.trackers[operation] = LatencyTracker()
+        return self.trackers[operation]
+
+    def backoff(self, attempt: int) -> float:
+        """Get a full-jitter exponential backoff delay for an attempt."""
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def timeout(self, operation: str) -> float:
+        """Get the read timeout for an operation, in seconds."""
+        tracker = self.tracker(operation)
+        if len(tracker.samples) < self.min_samples:
+            return self.max_timeout
+        timeout = tracker.percentile(self.timeout_percentile) \
+            * self.timeout_multiplier
+        return min(self.max_timeout, max(self.min_timeout, timeout))
+
+    def hedge_delay(self, operation: str) -> float | None:
+        """Get the delay before hedging a request, None if not allowed."""
+        tracker = self.tracker(operation)
+        if not self.hedging or len(tracker.samples) < self.min_samples:
+            return None
+        if self.counters["hedges"] >= \
+                self.hedge_ratio * self.counters["calls"]:
+            return None
+        return tracker.percentile(self.hedge_percentile)
+
+    def statistics(self) -> dict[str, dict]:
+        """Get the policy counters & the current per-operation timings."""
+        operations = {}
+        for operation, tracker in self.trackers.items():
+            if not tracker.samples:
+                continue
+            operations[operation] = {
+                "samples": len(tracker.samples),
+                "p50": tracker.percentile(50),
+                "p95": tracker.percentile(95),
+                "p99": tracker.percentile(99),
+                "timeout": self.timeout(operation),
+                "hedge_delay": self.hedge_delay(operation)}
+        return {"counters": dict(self.counters), "operations": operations}
+
+
+def create_resilience_policy() -> ResiliencePolicy:
+    """Create a policy configured from the [RESILIENCE] settings."""
+    settings = config.parser["RESILIENCE"]
+    return ResiliencePolicy(
+        max_attempts=settings.getint("max_attempts"),
+        backoff_base=settings.getfloat("backoff_base"),
+        backoff_max=settings.getfloat("backoff_max"),
+        total_budget=settings.getfloat("total_budget"),
+        min_timeout=settings.getfloat("min_timeout"),
+        max_timeout=settings.getfloat("max_timeout"),
+        timeout_percentile=settings.getfloat("timeout_percentile"),
+        timeout_multiplier=settings.getfloat("timeout_multiplier"),
+        min_samples=settings.getint("min_samples"),
+        hedging=settings.getboolean("hedging"),
+        hedge_percentile=settings.getfloat("hedge_percentile"),
+        hedge_ratio=settings.getfloat("hedge_ratio"))
+
+
+policy = create_resilience_policy()
+
 
 async def log_request(r: Request) -> None:
     """Log a HTTPX Request."""
@@ -32,11 +179,114 @@ async def log_response(r: Response) -> None:
     )
 
 
-async_client = AsyncClient(
-    event_hooks={
+def create_client(
+        transport: AsyncBaseTransport | None = None) -> AsyncClient:
+    """Create an AsyncClient configured from the [HTTP_CLIENT] settings.
+
+    Depending on the [CASSETTE] mode, responses are also recorded to
+    a cassette, or replayed from one instead of using the network.
+    A given transport takes precedence over the cassette mode.
+    """
+    event_hooks = {
         'response': [log_response],
         'request': [log_request]}
-)
+    match cassette.MODE:
+        case _ if transport is not None:
+            pass
+        case "record":
+            recorder = cassette.create_recorder()
+            event_hooks['request'].append(recorder.start)
+            event_hooks['response'].append(recorder.record)
+        case "replay":
+            transport = cassette.create_replay_transport()
+    return AsyncClient(
+        http2=HTTP2,
+        limits=POOL_LIMITS,
+        timeout=POOL_TIMEOUT,
+        transport=transport,
+        event_hooks=event_hooks
+    )
+
+
+async def open_client(
+        transport: AsyncBaseTransport | None = None) -> AsyncClient:
+    """Open the shared AsyncClient if it is not already open."""
+    global async_client  # pylint: disable=global-statement
+    if async_client is None or async_client.is_closed:
+        async_client = create_client(transport=transport)
+        logger.info(
+            "Opened HTTP client (http2: %s, limits: %s, timeout: %s).",
+            HTTP2, POOL_LIMITS, POOL_TIMEOUT)
+    return async_client
+
+
+async def close_client() -> None:
+    """Close the shared AsyncClient & release its pooled connections."""
+    global async_client  # pylint: disable=global-statement
+    if async_client is not None:
+        await async_client.aclose()
+        logger.info("Closed HTTP client.")
+    async_client = None
+
+
+def get_client() -> AsyncClient:
+    """Get the shared AsyncClient.
+
+    Raises:
+        exceptions.ClientNotOpenError:
+            Raised if called outside of the application lifespan.
+    """
+    if async_client is None or async_client.is_closed:
+        raise exceptions.ClientNotOpenError(
+            "The HTTP client must be opened with open_client() first.")
+    return async_client
+
+
+def pool_statistics() -> dict[str, int | float | bool | None]:
+    """Get a snapshot of the shared client's connection pool.
+
+    Reads the state of the underlying httpcore connection pool.
+    Counts are zero if the client is not open, or if the client
+    uses a transport that does not pool connections.
+
+    Returns:
+        dict[str, int | float | bool | None]:
+            The configured limits alongside the current number of
+            open, idle & active connections and queued requests.
+    """
+    stats: dict[str, int | float | bool | None] = {
+        "open": async_client is not None and not async_client.is_closed,
+        "http2": HTTP2,
+        "max_connections": POOL_LIMITS.max_connections,
+        "max_keepalive_connections": POOL_LIMITS.max_keepalive_connections,
+        "keepalive_expiry": POOL_LIMITS.keepalive_expiry,
+        "connections": 0,
+        "idle_connections": 0,
+        "active_connections": 0,
+        "http2_connections": 0,
+        "queued_requests": 0,
+    }
+    if not stats["open"]:
+        return stats
+    # pylint: disable=protected-access
+    pool = getattr(async_client._transport, "_pool", None)
+    if pool is None:
+        return stats
+    connections = list(pool.connections)
+    stats["connections"] = len(connections)
+    stats["idle_connections"] = sum(
+        1 for conn in connections if conn.is_idle())
+    stats["active_connections"] = sum(
+        1 for conn in connections
+        if not conn.is_idle() and not conn.is_closed())
+    stats["http2_connections"] = sum(
+        1 for conn in connections
+        if type(getattr(conn, "_connection", None)).__name__
+        == "AsyncHTTP2Connection")
+    stats["queued_requests"] = sum(
+        1 for req in getattr(pool, "_requests", [])
+        if getattr(req, "connection", None) is None)
+    return stats
 
 
 def handle_response(response: Response) -> bool:
@@ -71,16 +321,195 @@ def handle_response(response: Response) -> bool:
     return False
 
 
-async def send_request(params: dict) -> Response | None:  # TODO: Proper typehint for async
+def handle_request_error(err: RequestError) -> None:
+    """Log a httpx exception raised while sending a request."""
+    match err:
+        case ConnectTimeout():
+            logger.info(
+                "Connection timed out: %s %s",
+                err.request.method, err.request.url)
+        case ConnectError():
+            logger.info(
+                "Could not establish connection to: %s %s",
+                err.request.method, err.request.url)
+        case _:
+            logger.info(
+                "Request failed (%s): %s %s", type(err).__name__,
+                err.request.method, err.request.url)
+
+
+def is_retryable(response: Response | None) -> bool:
+    """Check if a failed attempt is worth retrying.
+
+    Transport errors (no response), server errors &
+    throttling are retryable, other client errors are not.
+    """
+    if response is None:
+        return True
+    return response.status_code >= 500 or response.status_code == 429
+
+
+async def send_attempt(
+        params: dict, operation: str,
+        timeout: float) -> tuple[Response | None, bool]:
+    """Send a single attempt of a request through the upstream limiter.
+
+    The timeout bounds the whole attempt, including the wait for the
+    limiter, which may be long while the limiter is saturated.
+
+    Returns:
+        tuple[Response | None, bool]:
+            The response if the attempt succeeded, otherwise None.
+            The second item indicates whether the attempt may be retried.
+    """
+    response: Response | None = None
+    policy.counters["attempts"] += 1
+    if "timeout" not in params:
+        params = {**params, "timeout": Timeout(
+            connect=min(timeout, POOL_TIMEOUT.connect or timeout),
+            read=timeout,
+            write=POOL_TIMEOUT.write,
+            pool=POOL_TIMEOUT.pool)}
+    start = time.monotonic()
+    try:
+        async with asyncio.timeout(timeout), \
+                limiter.upstream.limit() as permit:
+            start = time.monotonic()
+            try:
+                response = await get_client().request(**params)
+            except RequestError as err:
+                handle_request_error(err)
+                permit.failed = True
+            else:
+                permit.failed = not handle_response(response)
+    except TimeoutError:
+        policy.counters["timeouts"] += 1
+        logger.info("Attempt of %s request timed out after %.3fs.",
+                    operation, time.monotonic() - start)
+        return None, True
+    if permit.failed:
+        return None, is_retryable(response)
+    policy.tracker(operation).record(time.monotonic() - start)
+    return response, False
+
+
+async def send_hedged(
+        params: dict, operation: str,
+        timeout: float) -> tuple[Response | None, bool]:
+    """Send an attempt, hedging it with a duplicate if it is slow.
+
+    If the first attempt has not completed within the operation's hedge
+    delay, a duplicate is sent & whichever succeeds first is used.
+    """
+    first = asyncio.create_task(send_attempt(params, operation, timeout))
+    pending: set[asyncio.Task] = {first}
+    try:
+        delay = policy.hedge_delay(operation)
+        if delay is not None and delay < timeout:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                policy.counters["hedges"] += 1
+                logger.debug("Hedging %s request after %.3fs.",
+                             operation, delay)
+                pending.add(asyncio.create_task(
+                    send_attempt(params, operation, timeout - delay)))
+        result: tuple[Response | None, bool] = (None, True)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result[0] is not None:
+                    if task is not first:
+                        policy.counters["hedge_wins"] += 1
+                    return result
+        return result
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def send_request(
+        params: dict, idempotent: bool = True
+        ) -> Response | None:  # TODO: Proper typehint for async
     """Sends a request & raises the for status on the response.
 
+    Each attempt waits for the shared upstream limiter (see api.limiter),
+    and its outcome is reported back to adapt the concurrency window.
+    Idempotent requests are retried & hedged following the shared
+    resilience policy, within the policy's total time budget.
+    Requests are rejected outright while the operation's circuit
+    breaker (see api.breaker) is open. All attempts end by the
+    caller's deadline, if one is set (see utils.deadline).
     Returns an httpx.Response upon successful request.
     If an httpx exception occurred, returns None instead.
     """
     if DEBUG_FLAG:
         logger.debug("Sending request: %s", json.dumps(
-            params, indent=4))
-    response = await async_client.request(**params)
-    if not handle_response(response):
+            params, indent=4, default=str))
+    operation = params.get("extensions", {}).get("operation", "default")
+    if deadline.expired():
+        logger.debug("Deadline exceeded before sending %s request.",
+                     operation)
+        return None
+    circuit = breaker.upstream.get(operation)
+    if not circuit.allow():
+        logger.debug("Circuit open, rejected %s request.", operation)
         return None
+    trial = circuit.state is breaker.BreakerState.HALF_OPEN
+    try:
+        return await send_allowed(params, idempotent, operation, circuit)
+    finally:
+        if trial and circuit.state is breaker.BreakerState.HALF_OPEN:
+            # Cancelled or failed before recording an outcome
+            circuit.release()
+
+
+async def send_allowed(
+        params: dict, idempotent: bool, operation: str,
+        circuit: breaker.CircuitBreaker) -> Response | None:
+    """Send a request the circuit breaker allowed, see send_request()."""
+    budget = policy.total_budget
+    if (caller_budget := deadline.remaining()) is not None \
+            and caller_budget < budget:
+        # The caller's deadline (see utils.deadline) is sooner
+        budget = caller_budget
+    expires = time.monotonic() + budget
+    policy.counters["calls"] += 1
+    attempts = policy.max_attempts if idempotent else 1
+    response: Response | None = None
+    retryable = True
+    for attempt in range(attempts):
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            break
+        timeout = min(policy.timeout(operation), remaining)
+        if idempotent:
+            response, retryable = await send_hedged(
+                params, operation, timeout)
+        else:
+            response, retryable = await send_attempt(
+                params, operation, timeout)
+        if response is not None or not retryable:
+            break
+        if attempt + 1 == attempts:
+            break
+        delay = policy.backoff(attempt)
+        if time.monotonic() + delay >= expires:
+            policy.counters["budget_exhausted"] += 1
+            logger.info("Retry budget exhausted for %s request.", operation)
+            break
+        policy.counters["retries"] += 1
+        logger.debug("Retrying %s request in %.3fs (attempt %s/%s).",
+                     operation, delay, attempt + 2, attempts)
+        await asyncio.sleep(delay)
+    if response is None and deadline.expired() \
+            and circuit.state is not breaker.BreakerState.HALF_OPEN:
+        # Cut short by the caller's deadline, says nothing of the upstream
+        logger.info("Deadline exceeded for %s request.", operation)
+    # Non-retryable failures are client errors, the upstream itself is up
+    elif response is None and retryable:
+        circuit.record_failure()
+    else:
+        circuit.record_success()
     return response
@@ -1,28 +1,135 @@
 """API routes for product retrieval."""
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import json
+import time
+from typing import AsyncIterator, Literal
+
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 
 from backend.app.core import config
 from backend.app.core import product_search
 from backend.app.core import search_context as search
 from backend.app.core.orm import schemas
+from backend.app.core import parse
+from backend.app.core import query_plan
+from backend.app.core.typedefs import ProductSearchResultT
+from backend.app.utils import deadline
 
 
 router = APIRouter()
 MAX_REQUESTS_PER_QUERY = int(config.parser["API"]["max_requests_per_query"])
 
 
-@router.post("/products/")
-async def get_products(
-        query: schemas.ProductQuery, background_tasks: BackgroundTasks):
-    """
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"}
+
+
+def check_request_count(query: schemas.ProductQuery) -> None:
+    """Reject queries that would need too many upstream requests.
+
+    Queries differing only in letter case or whitespace count once,
+    as both /products/ & /products/stream/ fetch them once (see
+    core.query_plan).
     """
-    if MAX_REQUESTS_PER_QUERY < len(query.stores) * len(query.queries):
+    if MAX_REQUESTS_PER_QUERY < len(query.stores) * len(
+            query_plan.unique_queries(query.queries)):
         raise HTTPException(
             detail="Too many item requests per query.",
             status_code=400)
-    strategies = [product_search.APIProductSearchStrategy()]
 
-    for _ in range(0, len(strategies)):
-        context = search.SearchContext(strategy=strategies.pop(0))
-        return await context.execute(query=query,
-                                     tasks=background_tasks)
+
+def encode_frame(
+        event: str, data: dict, fmt: Literal["ndjson", "sse"]) -> str:
+    """Encode a single frame of a streamed response."""
+    payload = jsonable_encoder(data)
+    if fmt == "sse":
+        content = json.dumps(payload, ensure_ascii=False)
+        return f"event: {event}\ndata: {content}\n\n"
+    return json.dumps(
+        {"event": event, **payload}, ensure_ascii=False) + "\n"
+
+
+@router.post("/products/")
+async def get_products(
+        query: schemas.ProductQuery, background_tasks: BackgroundTasks,
+        timeout_ms: int | None = Header(
+            default=None, alias="X-Timeout-Ms", gt=0)):
+    """Search for products in stores.
+
+    Pairs with fresh enough data in the database are answered from it,
+    only the remaining pairs are sent to the external API. Stale data
+    may be served while it is refreshed in the background, see
+    [FRESHNESS]. The details of each result tell its 'source': 'db',
+    'api' or 'cache' & its 'age' in seconds, database items also
+    carry their own age.
+
+    The search can be bounded by 'timeout_ms' in the query or by an
+    'X-Timeout-Ms' header, the shorter one applies. Once the time is
+    up, the results gathered so far are returned, with the details
+    of the pairs left unanswered as the third item.
+    """
+    check_request_count(query)
+    with deadline.scope(deadline.from_milliseconds(
+            query.timeout_ms, timeout_ms)):
+        fresh, pairs = await product_search.search_saved_products(
+            query=query, background_tasks=background_tasks)
+        if len(pairs) == 0:
+            return fresh, [], []
+        context = product_search.create_fetch_context()
+        successful: ProductSearchResultT
+        failed: ProductSearchResultT
+        successful, failed = await context.execute(
+            query=query, tasks=background_tasks, pairs=pairs)
+    incomplete = [
+        {**parse.build_product_details(pair_query), "store_id": store_id}
+        for store_id, pair_query in context.incomplete]
+    return fresh + successful, failed, incomplete
+
+
+@router.post("/products/stream/")
+async def stream_products(
+        query: schemas.ProductQuery, background_tasks: BackgroundTasks,
+        fmt: Literal["ndjson", "sse"] = "ndjson",
+        timeout_ms: int | None = Header(
+            default=None, alias="X-Timeout-Ms", gt=0)
+        ) -> StreamingResponse:
+    """Search for products, streaming each result as soon as it is ready.
+
+    Sources results like /products/. Each (store, query) pair that
+    succeeds is sent as a 'result' frame with its details & items,
+    in the order they complete. A final 'summary' frame lists the
+    details of the failed pairs & of the pairs left 'incomplete' by
+    the timeout, set like in /products/. Frames are sent as NDJSON
+    lines, or as server-sent events with 'fmt=sse'.
+    """
+    check_request_count(query)
+    timeout = deadline.from_milliseconds(query.timeout_ms, timeout_ms)
+
+    async def frames() -> AsyncIterator[str]:
+        start = time.monotonic()
+        failed: list[dict] = []
+        incomplete: list[dict] = []
+        succeeded = 0
+        async for state, (details, items) in \
+                product_search.stream_product_search(
+                    query=query, background_tasks=background_tasks,
+                    timeout=timeout):
+            if state is search.SearchState.TIMEOUT:
+                incomplete.append(details)
+                continue
+            if state is not search.SearchState.SUCCESS:
+                failed.append(details)
+                continue
+            succeeded += 1
+            yield encode_frame(
+                "result", {"details": details, "items": items}, fmt)
+        yield encode_frame("summary", {
+            "succeeded": succeeded,
+            "failed": failed,
+            "incomplete": incomplete,
+            "elapsed": round(time.monotonic() - start, 3)}, fmt)
+
+    return StreamingResponse(
+        frames(), media_type=STREAM_MEDIA_TYPES[fmt])
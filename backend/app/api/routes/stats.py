@@ -0,0 +1,31 @@
+"""API routes for internal runtime statistics."""
+from fastapi import APIRouter
+
+from backend.app.api import request
+from backend.app.api import breaker
+from backend.app.api import cache
+from backend.app.api import coalesce
+from backend.app.api import limiter
+from backend.app.core import query_plan
+from backend.app.core import store_search
+from backend.app.core import write_buffer
+from backend.app.core.orm import database
+
+router = APIRouter()
+
+
+@router.get("/stats/")
+async def get_stats() -> dict[str, dict]:
+    """Get a snapshot of runtime statistics used for capacity tuning."""
+    return {
+        "http_pool": request.pool_statistics(),
+        "coalescing": coalesce.upstream.statistics(),
+        "upstream_limiter": limiter.upstream.statistics(),
+        "resilience": request.policy.statistics(),
+        "circuit_breakers": breaker.upstream.statistics(),
+        "response_cache": cache.upstream.statistics(),
+        "query_planner": query_plan.planner.statistics(),
+        "db_pool": database.pool_statistics(),
+        "write_buffer": write_buffer.buffer.statistics(),
+        "store_ingestion": store_search.ingestion.statistics()
+    }
@@ -1,42 +1,91 @@
 """API routes for store retrieval."""
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import asyncio
 
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header
+
+from backend.app.api.skaupat.query_utils import StoreBrand
 from backend.app.core import config
 from backend.app.core import store_search
 from backend.app.core import search_context as search
 from backend.app.core.orm import schemas
 from backend.app.core.orm import models
+from backend.app.utils import deadline
 from backend.app.utils import exceptions
 
 router = APIRouter()
 MAX_REQUESTS_PER_QUERY = int(config.parser["API"]["max_requests_per_query"])
+STORE_SEARCH_GRACE = config.parser["API"].getfloat("store_search_grace_period")
+
+
+@router.post("/stores/refresh/", status_code=202)
+async def refresh_stores(
+        partition: bool = True,
+        brand: StoreBrand | None = None) -> dict:
+    """Start loading the whole store catalog from the API into the DB.
+
+    The catalog is loaded in the background, responding with 409 if
+    a load is already running. See /stats/ for the load's summary.
+    """
+    brands: list[StoreBrand] | None = None
+    if brand is not None:
+        brands = [brand]
+    elif not partition:
+        brands = []
+    if not store_search.ingestion.start(brands=brands):
+        raise HTTPException(
+            detail="A store catalog refresh is already running.",
+            status_code=409)
+    return {"detail": "Store catalog refresh started."}
 
 
 @router.get("/stores/{store_name}", response_model=list[schemas.Store])
 async def get_stores(
-        store_name: str, background_tasks: BackgroundTasks
+        store_name: str, background_tasks: BackgroundTasks,
+        timeout_ms: int | None = Header(
+            default=None, alias="X-Timeout-Ms", gt=0)
         ) -> list[models.Store] | list[schemas.StoreBase] | list:
-    strategies = [store_search.DBStoreSearchStrategy(),
-                  store_search.APIStoreSearchStrategy()]
-    # Looping over strategies as the match-case syntax is the same for both
-    while strategies:
-        context = search.SearchContext(strategy=strategies.pop(0))
-        match await context.execute(query=store_name.strip(),
-                                    tasks=background_tasks):
-            case [search.SearchState.SUCCESS, list()] as result:
-                return result[1]  # Return the retrieved items
-            case [search.SearchState.FAIL | search.SearchState.NO_RESPONSE,
-                  list()]:
-                if len(strategies) != 0:
-                    continue  # Skip to the next strategy as this one failed.
-                raise HTTPException(
-                    detail="Unable to retrieve items.",
-                    status_code=404)
-            case [search.SearchState.PARSE_ERROR, list()]:
-                raise HTTPException(
-                    detail="Can't parse results from external API response.",
-                    status_code=500)
-            case _ as data:
-                raise exceptions.InvalidMatchCaseError(
-                    f"Could not match value: {data} to a predefined case.")
-    return []  # Linter appeasement procedure
+    """Search for stores by name or id.
+
+    The DB & API strategies are raced, the API strategy is only started
+    if the DB has not found the stores within the grace period.
+    An 'X-Timeout-Ms' header bounds the search, responding with
+    504 if no stores were found within it.
+    """
+    timeout = deadline.from_milliseconds(timeout_ms)
+    try:
+        with deadline.scope(timeout):
+            async with asyncio.timeout(timeout):
+                result = await search.race(
+                    strategies=[
+                        (store_search.DBStoreSearchStrategy(), 0.0),
+                        (store_search.APIStoreSearchStrategy(),
+                         STORE_SEARCH_GRACE)],
+                    accept=lambda result:
+                        result[0] is search.SearchState.SUCCESS,
+                    query=store_name.strip(),
+                    tasks=background_tasks)
+    except TimeoutError:
+        result = search.SearchState.TIMEOUT, []
+    match result:
+        case [search.SearchState.SUCCESS, list()]:
+            return result[1]  # Return the retrieved items
+        case [search.SearchState.FAIL | search.SearchState.NO_RESPONSE,
+              list()]:
+            raise HTTPException(
+                detail="Unable to retrieve items.",
+                status_code=404)
+        case [search.SearchState.TIMEOUT, list()]:
+            raise HTTPException(
+                detail="Search did not finish within the timeout.",
+                status_code=504)
+        case [search.SearchState.CIRCUIT_OPEN, list()]:
+            raise HTTPException(
+                detail="External API is currently unavailable.",
+                status_code=503)
+        case [search.SearchState.PARSE_ERROR, list()]:
+            raise HTTPException(
+                detail="Can't parse results from external API response.",
+                status_code=500)
+        case _ as data:
+            raise exceptions.InvalidMatchCaseError(
+                f"Could not match value: {data} to a predefined case.")
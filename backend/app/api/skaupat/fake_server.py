@@ -0,0 +1,341 @@
+"""Local stand-in for the s-kaupat GraphQL API, used for load testing.
+
+Serves the GetProductByName & StoreSearch operations (and batched
+documents built from them) from a deterministic synthetic catalog,
+with configurable latency, error rate & throttling.
+
+Run from the project root:
+    python -m backend.app.api.skaupat.fake_server
+
+Then point [SKAUPAT_URLS] api_graphql in settings.cfg to the server,
+e.g. http://127.0.0.1:8081/graphql. See [FAKE_SKAUPAT] for settings.
+"""
+import math
+import time
+import random
+import asyncio
+import zlib
+from typing import Any
+
+import uvicorn
+from ariadne import QueryType, ObjectType, graphql, make_executable_schema
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from backend.app.core import config
+from backend.app.core.parse import slugify
+from backend.app.utils import LoggerManager
+
+logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
+
+SETTINGS = config.parser["FAKE_SKAUPAT"]
+
+TYPE_DEFS = """
+    enum StoreBrand { ALEPA PRISMA S_MARKET SALE }
+    enum SearchProvider { elasticsearch loop }
+
+    type Query {
+        store(id: ID!): Store
+        searchStores(
+            brand: StoreBrand, cursor: String, query: String
+        ): StoreSearchResult!
+    }
+
+    type StoreSearchResult {
+        totalCount: Int!
+        cursor: String
+        stores: [StoreInfo!]!
+    }
+
+    type StoreInfo {
+        id: ID!
+        slug: String!
+        name: String!
+        brand: String!
+        location: StoreLocation
+    }
+
+    type StoreLocation { address: StoreAddress }
+
+    type StoreAddress {
+        street: LocalizedText
+        postcode: String
+        postcodeName: LocalizedText
+    }
+
+    type LocalizedText { default: String }
+
+    type Store {
+        id: ID!
+        name: String!
+        brand: String!
+        products(
+            limit: Int
+            from: Int
+            includeAgeLimitedByAlcohol: Boolean
+            searchProvider: SearchProvider
+            queryString: String
+            slug: String
+        ): ProductResult
+    }
+
+    type ProductResult {
+        total: Int!
+        items: [Product!]!
+    }
+
+    type Product {
+        name: String!
+        ean: String!
+        price: Float!
+        basicQuantityUnit: String!
+        comparisonPrice: Float!
+        comparisonUnit: String!
+        brandName: String
+        slug: String!
+        hierarchyPath: [HierarchyItem!]!
+    }
+
+    type HierarchyItem {
+        id: ID!
+        name: String!
+        slug: String!
+    }
+"""
+
+BRANDS = ("prisma", "s-market", "sale", "alepa")
+PLACES = (
+    "Olari", "Kamppi", "Itis", "Sello", "Tikkurila", "Kannelmäki",
+    "Lippulaiva", "Ratina", "Hervanta", "Kaleva", "Linnanmaa", "Kupittaa",
+    "Jyväskylä", "Kuopio", "Lahti", "Pori", "Vaasa", "Joensuu", "Rovaniemi",
+    "Seinäjoki", "Kotka", "Hämeenlinna", "Porvoo", "Lohja", "Kerava")
+CATEGORIES = (
+    "Maito, munat ja rasvat", "Leivät, keksit ja leivonnaiset",
+    "Liha ja kasviproteiinit", "Hedelmät ja vihannekset",
+    "Juomat", "Kuivatuotteet ja leivonta", "Pakasteet",
+    "Juustot", "Kala ja merenelävät", "Valmisruoat")
+PRODUCT_BRANDS = (
+    "Valio", "Arla", "Fazer", "Oululainen", "Atria", "HK", "Snellman",
+    "Pirkka", "Rainbow", "Kotimaista", "Saarioinen", "Vaasan", "Apetit")
+PRODUCT_TYPES = (
+    "Maito", "Laktoositon maitojuoma", "Jogurtti", "Rahka", "Voi", "Leipä",
+    "Ruisleipä", "Paahtoleipä", "Jauheliha", "Broilerin fileesuikale",
+    "Kinkku", "Banaani", "Omena", "Tomaatti", "Kahvi", "Appelsiinimehu",
+    "Kaurahiutale", "Vehnäjauho", "Pizza", "Lohifilee", "Juusto",
+    "Makaroni", "Riisi", "Kananmuna", "Perunalastu")
+SIZES = (
+    ("1l", "LTR", "LTR", 1.0), ("500g", "KPL", "KGM", 0.5),
+    ("400g", "KPL", "KGM", 0.4), ("1kg", "KGM", "KGM", 1.0),
+    ("330ml", "KPL", "LTR", 0.33), ("6kpl", "KPL", "KPL", 6.0))
+
+
+class Catalog:
+    """Deterministic synthetic catalog of stores & products."""
+
+    def __init__(self, seed: int, store_count: int,
+                 product_count: int, store_page_size: int,
+                 search_cache_size: int = 4096) -> None:
+        rng = random.Random(seed)
+        self.store_page_size = store_page_size
+        self.search_cache_size = search_cache_size
+        self._searches: dict[tuple[str, str], tuple[int, ...]] = {}
+        self.stores: list[dict[str, Any]] = []
+        self.stores_by_id: dict[str, dict[str, Any]] = {}
+        for index in range(store_count):
+            brand = rng.choice(BRANDS)
+            name = f"{brand.title()} {rng.choice(PLACES)} {index + 1}"
+            store = {
+                "id": str(500000000 + index * 7919),
+                "slug": slugify(name),
+                "name": name,
+                "brand": brand,
+                "location": {"address": {
+                    "street": {"default": f"Katu {rng.randint(1, 99)}"},
+                    "postcode": f"{rng.randint(100, 99999):05d}",
+                    "postcodeName": {"default": name.split()[1]}}}}
+            self.stores.append(store)
+            self.stores_by_id[store["id"]] = store
+
+        self.products: list[dict[str, Any]] = []
+        for index in range(product_count):
+            brand = rng.choice(PRODUCT_BRANDS)
+            size, label_unit, cmp_unit, amount = rng.choice(SIZES)
+            name = f"{brand} {rng.choice(PRODUCT_TYPES)} {size}"
+            category = rng.choice(CATEGORIES)
+            self.products.append({
+                "name": name,
+                "ean": str(6400000000000 + index),
+                "base_price": round(rng.uniform(0.3, 15.0), 2),
+                "amount": amount,
+                "basicQuantityUnit": label_unit,
+                "comparisonUnit": cmp_unit,
+                "brandName": brand,
+                "slug": f"{slugify(name)}-{index}",
+                "hierarchyPath": [{
+                    "id": str(CATEGORIES.index(category)),
+                    "name": category,
+                    "slug": slugify(category)}]})
+        self._names = [p["name"].casefold() for p in self.products]
+
+    def search_products(
+            self, query: str, slug: str) -> tuple[int, ...]:
+        """Get the indexes of products containing every query word."""
+        if (indexes := self._searches.get((query, slug))) is not None:
+            return indexes
+        words = query.casefold().split()
+        indexes = tuple(
+            index for index, name in enumerate(self._names)
+            if all(word in name for word in words)
+            and (not slug
+                 or self.products[index]["hierarchyPath"][0]["slug"]
+                 == slug))
+        if len(self._searches) >= self.search_cache_size:
+            # Evict the oldest search, dicts keep their insertion order
+            del self._searches[next(iter(self._searches))]
+        self._searches[(query, slug)] = indexes
+        return indexes
+
+    @staticmethod
+    def store_product(store_id: str, product: dict) -> dict:
+        """Get a product with the prices of the given store."""
+        # Each store prices products slightly differently
+        variation = zlib.crc32(f"{store_id}:{product['ean']}".encode())
+        price = round(
+            product["base_price"] * (0.9 + (variation % 21) / 100), 2)
+        return {
+            **product,
+            "price": price,
+            "comparisonPrice": round(price / product["amount"], 2)}
+
+    def search_stores(
+            self, query: str | None, brand: str | None,
+            cursor: str | None) -> dict:
+        """Get a single page of stores matching the query & brand."""
+        matches = [
+            store for store in self.stores
+            if (not query or query.casefold() in store["name"].casefold())
+            and (not brand
+                 or store["brand"] == brand.lower().replace("_", "-"))]
+        start = int(cursor) if cursor else 0
+        end = start + self.store_page_size
+        return {
+            "totalCount": len(matches),
+            "cursor": str(end) if end < len(matches) else None,
+            "stores": matches[start:end]}
+
+
+catalog = Catalog(
+    seed=SETTINGS.getint("seed"),
+    store_count=SETTINGS.getint("store_count"),
+    product_count=SETTINGS.getint("product_count"),
+    store_page_size=SETTINGS.getint("store_page_size"))
+
+query_type = QueryType()
+store_type = ObjectType("Store")
+
+
+@query_type.field("store")
+def resolve_store(
+        *_: Any, id: str) -> dict | None:  # pylint: disable=redefined-builtin
+    """Resolve a store by id."""
+    return catalog.stores_by_id.get(str(id))
+
+
+@query_type.field("searchStores")
+def resolve_search_stores(
+        *_: Any, brand: str | None = None, cursor: str | None = None,
+        query: str | None = None) -> dict:
+    """Resolve a page of a store search."""
+    return catalog.search_stores(query=query, brand=brand, cursor=cursor)
+
+
+@store_type.field("products")
+def resolve_products(
+        store: dict, *_: Any, limit: int | None = 24, queryString: str = "",
+        slug: str | None = None, **kwargs: Any) -> dict:
+    """Resolve the products of a store matching the query string."""
+    matches = catalog.search_products(queryString or "", slug or "")
+    start = kwargs.get("from") or 0
+    end = start + (limit or 24)
+    return {
+        "total": len(matches),
+        "items": [
+            catalog.store_product(store["id"], catalog.products[index])
+            for index in matches[start:end]]}
+
+
+schema = make_executable_schema(TYPE_DEFS, query_type, store_type)
+
+
+class FaultInjector:
+    """Adds latency, random errors & throttling to responses."""
+
+    def __init__(self, latency_median: float, latency_sigma: float,
+                 error_rate: float, throttle_rps: float,
+                 seed: int) -> None:
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rps = throttle_rps
+        self._rng = random.Random(seed)
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def latency(self) -> float:
+        """Draw a latency from a log-normal distribution, in seconds."""
+        if self.latency_median <= 0:
+            return 0.0
+        return self.latency_median * math.exp(
+            self.latency_sigma * self._rng.gauss(0, 1))
+
+    def throttled(self) -> bool:
+        """Check if the request exceeds the requests-per-second limit."""
+        if self.throttle_rps <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+        return self._window_count > self.throttle_rps
+
+    def failed(self) -> bool:
+        """Check if the request should fail with a server error."""
+        return self._rng.random() < self.error_rate
+
+
+faults = FaultInjector(
+    latency_median=SETTINGS.getfloat("latency_median_ms") / 1000,
+    latency_sigma=SETTINGS.getfloat("latency_sigma"),
+    error_rate=SETTINGS.getfloat("error_rate"),
+    throttle_rps=SETTINGS.getfloat("throttle_rps"),
+    seed=SETTINGS.getint("seed"))
+
+app = FastAPI()
+
+
+@app.post("/graphql")
+async def execute_graphql(request: Request) -> JSONResponse:
+    """Execute a GraphQL document against the synthetic catalog."""
+    if faults.throttled():
+        return JSONResponse(
+            {"errors": [{"message": "Too many requests"}]}, status_code=429)
+    await asyncio.sleep(faults.latency())
+    if faults.failed():
+        return JSONResponse(
+            {"errors": [{"message": "Internal server error"}]},
+            status_code=500)
+    data = await request.json()
+    success, result = await graphql(schema, data)
+    return JSONResponse(result, status_code=200 if success else 400)
+
+
+if __name__ == "__main__":
+    logger.info(
+        "Serving fake s-kaupat API with %s stores & %s products.",
+        len(catalog.stores), len(catalog.products))
+    uvicorn.run(
+        app,
+        host=SETTINGS["host"],
+        port=SETTINGS.getint("port"),
+        log_level="warning")
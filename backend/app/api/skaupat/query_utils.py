@@ -1,5 +1,9 @@
 """TEMP"""
+import json
 from enum import Enum
+from functools import lru_cache
+from typing import Sequence
+import graphql
 from ariadne import load_schema_from_path
 
 from backend.app.core import config
@@ -7,6 +11,7 @@ from backend.app.utils import paths
 
 USER_AGENT = str(config.parser["API"]["user_agent"])
 GRAPHQL_ENDPOINT = config.parser["SKAUPAT_URLS"]["api_graphql"]
+REQUEST_TEMPLATES = config.parser["API"].getboolean("request_templates")
 
 # Load graphql schema from static files
 PRODUCT_GRAPHQL = load_schema_from_path(
@@ -18,9 +23,28 @@ STORE_GRAPHQL = load_schema_from_path(
 class Operation(str, Enum):
     """Enumeration for graphql operation types."""
     PRODUCT_SEARCH = "GetProductByName"
+    PRODUCT_BATCH_SEARCH = "GetProductBatch"
     STORE_SEARCH = "StoreSearch"
 
 
+class StoreBrand(str, Enum):
+    """Enumeration for the StoreBrand values accepted by store searches."""
+    ALEPA = "ALEPA"
+    PRISMA = "PRISMA"
+    S_MARKET = "S_MARKET"
+    SALE = "SALE"
+
+
+# Default amount of items in a single page of product search results
+PRODUCT_PAGE_LIMIT = 24
+
+# Variables of the product search that are unique to each (store, query) pair
+PRODUCT_PAIR_VARIABLES = ("StoreID", "query", "slugs")
+
+# (store alias, products alias, store id, query)
+BatchAliasT = tuple[str, str, int, dict[str, str]]
+
+
 def build_headers_dict() -> dict:
     """Build the request 'headers' field dict."""
     return {
@@ -33,19 +57,25 @@ def build_headers_dict() -> dict:
     }
 
 
-def build_json_dict(operation: Operation, variables: dict):
-    """Build the request 'json' field dict."""
+def build_json_dict(
+        operation: Operation, variables: dict, query: str | None = None):
+    """Build the request 'json' field dict.
+
+    The query document is picked based on the operation,
+    unless a pre-built query document is given.
+    """
     if not isinstance(operation, Operation):
         raise TypeError(
             "Operation must be of Enum type 'Operation'")
-    match operation:
-        case operation.PRODUCT_SEARCH:
-            query = PRODUCT_GRAPHQL
-        case operation.STORE_SEARCH:
-            query = STORE_GRAPHQL
-        case _:
-            raise ValueError(
-                "Provided operation type was undefined.")
+    if query is None:
+        match operation:
+            case operation.PRODUCT_SEARCH:
+                query = PRODUCT_GRAPHQL
+            case operation.STORE_SEARCH:
+                query = STORE_GRAPHQL
+            case _:
+                raise ValueError(
+                    "Provided operation type was undefined.")
     return {
         "operation_name": operation.value,
         "query": query,
@@ -53,35 +83,246 @@ def build_json_dict(operation: Operation, variables: dict):
     }
 
 
+class RequestTemplate:
+    """Pre-encoded static parts of the requests for a single operation.
+
+    The headers & the JSON body, apart from its variables, are encoded
+    once. Building a request then only encodes the variables & splices
+    them into the pre-encoded body, which is sent as raw bytes.
+    The body is equivalent to the one built by build_json_dict().
+    """
+    __slots__ = "operation", "headers", "prefix", "extensions"
+
+    def __init__(self, operation: Operation, query: str | None = None):
+        body = json.dumps(
+            build_json_dict(operation, variables={}, query=query),
+            separators=(",", ":"), ensure_ascii=False)
+        # The variables are the last key, strip the trailing '{}}'
+        self.prefix: bytes = body.removesuffix("{}}").encode()
+        self.operation = operation
+        self.headers: list[tuple[bytes, bytes]] = [
+            (key.encode(), value.encode())
+            for key, value in build_headers_dict().items()]
+        self.extensions = {"operation": operation.value}
+
+    def build_content(self, variables: dict) -> bytes:
+        """Build the request body for the given variables."""
+        return b"".join((
+            self.prefix,
+            json.dumps(
+                variables, separators=(",", ":"), ensure_ascii=False
+            ).encode(),
+            b"}"))
+
+    def build_params(self, method: str, variables: dict) -> dict:
+        """Build the request parameters dictionary."""
+        return {
+            "method": method,
+            "url": GRAPHQL_ENDPOINT,
+            "headers": self.headers,
+            "content": self.build_content(variables),
+            "extensions": self.extensions
+        }
+
+
+@lru_cache(maxsize=64)
+def get_request_template(
+        operation: Operation, batch_size: int | None = None
+        ) -> RequestTemplate:
+    """Get the request template of an operation (and batch size)."""
+    query = None
+    if batch_size is not None:
+        query = build_product_batch_document(batch_size)
+    return RequestTemplate(operation=operation, query=query)
+
+
 def build_request_params(
         method: str, operation: Operation,
-        variables: dict, timeout: int = 10):
-    """Build the request parameters dictionary."""
-    return {
-        "method": method,
-        "url": GRAPHQL_ENDPOINT,
-        "timeout": timeout,
-        "headers": build_headers_dict(),
-        "json": build_json_dict(operation, variables)
-    }
+        variables: dict, timeout: float | None = None,
+        batch_size: int | None = None):
+    """Build the request parameters dictionary.
+
+    A batch size sends the document of a batched product search,
+    see build_product_batch_query() for its variables.
+    If [API] request_templates is set, the request is built from
+    a pre-encoded RequestTemplate of the operation instead.
+    If no timeout is given, the read timeout is derived from observed
+    latencies by the resilience policy in api.request instead.
+    """
+    if REQUEST_TEMPLATES:
+        params = get_request_template(operation, batch_size).build_params(
+            method=method, variables=variables)
+    else:
+        query = None
+        if batch_size is not None:
+            query = build_product_batch_document(batch_size)
+        params = {
+            "method": method,
+            "url": GRAPHQL_ENDPOINT,
+            "headers": build_headers_dict(),
+            "json": build_json_dict(operation, variables, query),
+            # Identifies the operation for per-operation latency tracking
+            "extensions": {"operation": operation.value}
+        }
+    if timeout is not None:
+        params["timeout"] = timeout
+    return params
+
+
+def build_request_key(operation: Operation, variables: dict) -> str:
+    """Build a key that identifies interchangeable requests.
 
+    Variables are canonicalized by sorting their keys &
+    serializing them without whitespace, so that requests
+    built from equal variables always produce the same key.
+    """
+    return f"{operation.value}:" + json.dumps(
+        variables, sort_keys=True, separators=(",", ":"), default=str)
 
-def build_store_search_vars(value: str) -> dict:
-    """Build the variables dict for use in a store search."""
+
+def build_query_key(query: dict[str, str]) -> str:
+    """Build a key that identifies the results of a product query.
+
+    Stored alongside saved product data, so that the results of a
+    query can be looked up again regardless of which store they
+    came from. Whitespace & letter case of the query are ignored.
+    """
+    return " ".join(query["query"].casefold().split()) \
+        + "|" + query["category"]
+
+
+def build_store_search_vars(
+        value: str | None,
+        brand: StoreBrand | None = None,
+        cursor: str | None = None) -> dict:
+    """Build the variables dict for use in a store search.
+
+    The cursor of a previous page continues that search,
+    a brand limits the search to the stores of that brand.
+    """
     return {
-        "StoreBrand": None,
-        "cursor": None,
+        "brand": brand.value if brand is not None else None,
+        "cursor": cursor,
         "query": value}
 
 
 def build_product_search_vars(
         store_id: int,
         query: dict[str, str],
-        limit: int = 24) -> dict:
-    """Build the variables dict for use in a product search."""
-    return {
+        limit: int = PRODUCT_PAGE_LIMIT,
+        offset: int = 0) -> dict:
+    """Build the variables dict for use in a product search.
+
+    The offset is only included when fetching a later page,
+    so that the variables of a first page stay the same.
+    """
+    variables = {
         "StoreID": store_id,
         "query": query["query"],
         "slugs": query["category"],
         "limit": limit
     }
+    if offset > 0:
+        variables["from"] = offset
+    return variables
+
+
+def _parse_product_document() -> tuple[
+        list[graphql.VariableDefinitionNode], list[graphql.FieldNode],
+        graphql.FieldNode]:
+    """Get the variable definitions, store fields & products field.
+
+    The store fields are the selections of the 'store' field,
+    other than the 'products' field.
+    """
+    definition = graphql.parse(PRODUCT_GRAPHQL).definitions[0]
+    store = definition.selection_set.selections[0]  # type: ignore
+    store_fields = [
+        field for field in store.selection_set.selections
+        if field.name.value != "products"]
+    products = next(
+        field for field in store.selection_set.selections
+        if field.name.value == "products")
+    return (list(definition.variable_definitions),  # type: ignore
+            store_fields, products)
+
+
+@lru_cache(maxsize=64)
+def build_product_batch_document(size: int) -> str:
+    """Build a single aliased document for a batch of product searches.
+
+    Each (store, query) pair of the batch gets its own aliased 'store'
+    field with an aliased 'products' field within it, so the document
+    only depends on the size of the batch & can be reused for any pairs.
+    The arguments & selections are taken from product.graphql, variables
+    that are unique to a pair get suffixed with the pair's index.
+
+    Args:
+        size (int):
+            The amount of (store, query) pairs in the batch.
+
+    Returns:
+        str:
+            The query document, see build_product_batch_query().
+    """
+    var_defs, store_fields, products = _parse_product_document()
+    var_types = {
+        var.variable.name.value: graphql.print_ast(var.type)
+        for var in var_defs}
+    items = graphql.print_ast(products.selection_set)
+    store_items = "".join(
+        f"{graphql.print_ast(field)}\n" for field in store_fields)
+
+    definitions = [
+        f"${name}: {type_}" for name, type_ in var_types.items()
+        if name not in PRODUCT_PAIR_VARIABLES]
+    selections = []
+    for index in range(size):
+        definitions.append(f"$store_{index}: {var_types['StoreID']}")
+        arguments = []
+        for arg in products.arguments:
+            value = graphql.print_ast(arg.value)
+            if isinstance(arg.value, graphql.VariableNode) \
+                    and (name := arg.value.name.value) \
+                    in PRODUCT_PAIR_VARIABLES:
+                value = f"${name}_{index}"
+                definitions.append(f"{value}: {var_types[name]}")
+            arguments.append(f"{arg.name.value}: {value}")
+        selections.append(
+            f"store_{index}: store(id: $store_{index}) {{\n"
+            + store_items
+            + f"products_{index}: products({', '.join(arguments)}) {items}"
+            + "\n}")
+    return (
+        f"query {Operation.PRODUCT_BATCH_SEARCH.value}"
+        f"({', '.join(definitions)}) {{\n" + "\n".join(selections) + "\n}")
+
+
+def build_product_batch_query(
+        pairs: Sequence[tuple[int, dict[str, str]]],
+        limit: int = PRODUCT_PAGE_LIMIT
+        ) -> tuple[str, dict, list[BatchAliasT]]:
+    """Build the document & variables for a batch of product searches.
+
+    Args:
+        pairs (Sequence[tuple[int, dict[str, str]]]):
+            The (store id, query) pairs to search for.
+        limit (int, optional):
+            Max amount of items per pair. Defaults to 24.
+
+    Returns:
+        tuple[str, dict, list[BatchAliasT]]:
+            The query document, the variables for the document
+            and the aliases that each pair's results are found under.
+    """
+    variables: dict = {"limit": limit}
+    aliases: list[BatchAliasT] = []
+    for index, (store_id, query) in enumerate(pairs):
+        pair_vars = build_product_search_vars(store_id=store_id, query=query)
+        variables[f"store_{index}"] = store_id
+        for name in PRODUCT_PAIR_VARIABLES:
+            if name != "StoreID":
+                variables[f"{name}_{index}"] = pair_vars[name]
+        aliases.append(
+            (f"store_{index}", f"products_{index}", store_id, query))
+    return build_product_batch_document(len(pairs)), variables, aliases
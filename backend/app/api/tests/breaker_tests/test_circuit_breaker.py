@@ -0,0 +1,68 @@
+import time
+
+from backend.app.api.breaker import BreakerState, CircuitBreaker
+
+
+def create_breaker(reset_timeout=60.0):
+    return CircuitBreaker(
+        name="test", failure_threshold=3, reset_timeout=reset_timeout)
+
+
+def test_opens_after_threshold():
+    """Test that consecutive failures open the breaker."""
+    breaker = create_breaker()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state is BreakerState.CLOSED
+    breaker.record_failure()
+    assert breaker.state is BreakerState.OPEN
+    assert not breaker.allow()
+    assert breaker.counters["rejected"] == 1
+    assert breaker.counters["opened"] == 1
+
+
+def test_success_resets_failures():
+    """Test that a success in between failures keeps the breaker closed."""
+    breaker = create_breaker()
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state is BreakerState.CLOSED
+
+
+def test_half_open_trial_closes_on_success():
+    """Test that a successful trial call closes the breaker."""
+    breaker = create_breaker(reset_timeout=0.01)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state is BreakerState.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # Only a single trial call at a time
+    breaker.record_success()
+    assert breaker.state is BreakerState.CLOSED
+
+
+def test_half_open_trial_reopens_on_failure():
+    """Test that a failed trial call opens the breaker again."""
+    breaker = create_breaker(reset_timeout=0.01)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert breaker.counters["opened"] == 2
+
+
+def test_released_trial_frees_its_slot():
+    """Test that a trial call ended without an outcome can be retried."""
+    breaker = create_breaker(reset_timeout=0.01)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow() and not breaker.allow()
+    breaker.release()
+    assert breaker.state is BreakerState.HALF_OPEN
+    assert breaker.allow()
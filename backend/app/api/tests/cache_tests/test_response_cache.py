@@ -0,0 +1,44 @@
+import time
+
+from backend.app.api.cache import MISSING, ResponseCache, estimate_size
+
+
+def test_hit_and_miss():
+    """Test that cached values are returned & absent keys miss."""
+    cache = ResponseCache(ttls={"op": 60}, max_bytes=10_000)
+    cache.set("key", "op", ["value"])
+    assert cache.get("key") == ["value"]
+    assert cache.get("other") is MISSING
+    assert cache.statistics()["hits"] == 1
+    assert cache.statistics()["misses"] == 1
+
+
+def test_entries_expire():
+    """Test that entries are dropped once their operation's TTL passes."""
+    cache = ResponseCache(ttls={"op": 0.01}, max_bytes=10_000)
+    cache.set("key", "op", "value")
+    time.sleep(0.02)
+    assert cache.get("key") is MISSING
+    assert cache.statistics()["expirations"] == 1
+    assert cache.statistics()["bytes"] == 0
+
+
+def test_operation_without_ttl_is_not_cached():
+    """Test that values of operations without a TTL are not cached."""
+    cache = ResponseCache(ttls={}, max_bytes=10_000)
+    cache.set("key", "op", "value")
+    assert cache.get("key") is MISSING
+
+
+def test_least_recently_used_is_evicted():
+    """Test LRU eviction once the memory budget is exceeded."""
+    value_size = estimate_size("x" * 100)
+    cache = ResponseCache(ttls={"op": 60}, max_bytes=value_size * 2)
+    cache.set("a", "op", "a" * 100)
+    cache.set("b", "op", "b" * 100)
+    cache.get("a")  # 'b' is now the least recently used
+    cache.set("c", "op", "c" * 100)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") is not MISSING
+    assert cache.get("c") is not MISSING
+    assert cache.statistics()["evictions"] == 1
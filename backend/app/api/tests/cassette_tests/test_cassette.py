@@ -0,0 +1,64 @@
+import asyncio
+
+import httpx
+
+from backend.app.api.cassette import (
+    CassetteRecorder, ReplayTransport, load_cassette)
+
+
+def record(path, bodies: list[bytes]) -> None:
+    """Record a response for each request body to a cassette."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"echo": request.content.decode()})
+
+    async def main():
+        recorder = CassetteRecorder(path)
+        async with httpx.AsyncClient(
+                transport=httpx.MockTransport(handler),
+                event_hooks={
+                    "request": [recorder.start],
+                    "response": [recorder.record]}) as client:
+            for body in bodies:
+                await client.post(
+                    "http://upstream/graphql", content=body,
+                    extensions={"operation": "op"})
+    asyncio.run(main())
+
+
+def test_record_and_replay(tmp_path):
+    """Test that recorded responses are replayed by request body."""
+    path = tmp_path / "test.jsonl.gz"
+    record(path, [b"first", b"second"])
+    entries = load_cassette(path)
+    assert [entry["operation"] for entry in entries] == ["op", "op"]
+
+    async def main():
+        transport = ReplayTransport(entries, speed=0)
+        async with httpx.AsyncClient(transport=transport) as client:
+            second = await client.post(
+                "http://upstream/graphql", content=b"second")
+            missing = await client.post(
+                "http://upstream/graphql", content=b"third")
+        return second, missing, transport.counters
+    second, missing, counters = asyncio.run(main())
+    assert second.json() == {"echo": "second"}
+    assert missing.status_code == 404
+    assert counters == {"hits": 1, "misses": 1}
+
+
+def test_repeated_requests_replay_in_order(tmp_path):
+    """Test that a request recorded twice replays both responses."""
+    path = tmp_path / "test.jsonl.gz"
+    record(path, [b"same", b"same"])
+    entries = load_cassette(path)
+    entries[1]["body"] = '{"echo": "changed"}'
+
+    async def main():
+        transport = ReplayTransport(entries, speed=0)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return [
+                (await client.post(
+                    "http://upstream/graphql", content=b"same")).json()
+                for _ in range(3)]
+    assert asyncio.run(main()) == [
+        {"echo": "same"}, {"echo": "changed"}, {"echo": "changed"}]
@@ -0,0 +1,91 @@
+import asyncio
+
+from backend.app.api.coalesce import SingleFlight
+from backend.app.utils import deadline
+
+
+def test_concurrent_calls_are_coalesced():
+    """Test that concurrent callers with the same key share one call."""
+    flight = SingleFlight()
+    call_count = 0
+
+    async def fetch():
+        nonlocal call_count
+        call_count += 1
+        await asyncio.sleep(0.01)
+        return ["result"]
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do("key", fetch) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert call_count == 1
+    assert all(result is results[0] for result in results)
+    assert flight.statistics() == {
+        "calls": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_different_keys_are_not_coalesced():
+    """Test that callers with different keys get separate calls."""
+    flight = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("a", lambda: asyncio.sleep(0, result="a")),
+            flight.do("b", lambda: asyncio.sleep(0, result="b")))
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert flight.statistics()["coalesced"] == 0
+
+
+def test_key_is_released_after_completion():
+    """Test that a finished call is not reused by later callers."""
+    flight = SingleFlight()
+
+    async def main():
+        first = await flight.do("key", lambda: asyncio.sleep(0, result=1))
+        second = await flight.do("key", lambda: asyncio.sleep(0, result=2))
+        return first, second
+
+    assert asyncio.run(main()) == (1, 2)
+    assert flight.statistics()["calls"] == 2
+
+
+def test_exception_is_shared():
+    """Test that an exception is raised for every coalesced caller."""
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("key", fail), flight.do("key", fail),
+            return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_joined_call_ignores_first_callers_deadline():
+    """Test that each caller is bounded by its own deadline only."""
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "expired" if deadline.expired() else "result"
+
+    async def with_deadline():
+        with deadline.scope(0.01):
+            return await flight.do("key", fetch)
+
+    async def main():
+        return await asyncio.gather(
+            with_deadline(), flight.do("key", fetch),
+            return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, TimeoutError)
+    assert second == "result"
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from backend.app.api.limiter import (
+    TokenBucket,
+    AdaptiveConcurrencyLimiter,
+    UpstreamLimiter
+)
+
+
+def create_limiter(initial=4, minimum=1, maximum=8):
+    return UpstreamLimiter(
+        bucket=TokenBucket(rate=1000, capacity=1000),
+        concurrency=AdaptiveConcurrencyLimiter(
+            initial=initial, minimum=minimum, maximum=maximum))
+
+
+def test_token_bucket_burst_then_waits():
+    """Test that acquisitions beyond the burst have to wait for a refill."""
+    bucket = TokenBucket(rate=100, capacity=2)
+
+    async def main():
+        return [await bucket.acquire() for _ in range(3)]
+
+    waits = asyncio.run(main())
+    assert waits[0] < 0.005 and waits[1] < 0.005
+    assert waits[2] > 0.005
+
+
+def test_invalid_limits():
+    """Test that inconsistent limits are rejected."""
+    with pytest.raises(ValueError):
+        AdaptiveConcurrencyLimiter(initial=10, minimum=1, maximum=5)
+
+
+def test_concurrency_is_bounded_by_window():
+    """Test that no more than the window's worth of requests run at once."""
+    limiter = create_limiter(initial=3, maximum=3)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter.limit():
+            peak = max(peak, limiter.concurrency.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(request() for _ in range(10)))
+
+    asyncio.run(main())
+    assert peak == 3
+    assert limiter.statistics()["requests"] == 10
+    assert limiter.statistics()["in_flight"] == 0
+
+
+def test_window_shrinks_on_failure_and_grows_on_success():
+    """Test the additive-increase/multiplicative-decrease behaviour."""
+    limiter = create_limiter(initial=4)
+
+    async def request(failed: bool):
+        async with limiter.limit() as permit:
+            permit.failed = failed
+
+    async def main():
+        await request(failed=True)
+        shrunk = limiter.concurrency.window
+        for _ in range(20):
+            await request(failed=False)
+        return shrunk, limiter.concurrency.window
+
+    shrunk, grown = asyncio.run(main())
+    assert shrunk < 4
+    assert grown > shrunk
+    assert limiter.statistics()["failures"] == 1
+
+
+def test_exception_counts_as_failure():
+    """Test that an exception within the context shrinks the window."""
+    limiter = create_limiter(initial=4)
+
+    async def main():
+        async with limiter.limit():
+            raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(main())
+    assert limiter.concurrency.window < 4
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_cancellation_keeps_the_window():
+    """Test that a cancelled request releases its slot as neutral."""
+    limiter = create_limiter(initial=4)
+
+    async def main():
+        async def hold():
+            async with limiter.limit():
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert limiter.concurrency.window == 4
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.statistics()["failures"] == 0
+    assert limiter.statistics()["cancelled"] == 1
@@ -0,0 +1,70 @@
+import graphql
+import httpx
+
+from backend.app.api.skaupat import query_utils
+from backend.app.core import parse
+
+MILK = {"query": "maito", "category": ""}
+BREAD = {"query": "leipä", "category": "leivat"}
+
+
+def item(ean: str) -> dict:
+    """Create a product item as returned by the API."""
+    return {
+        "name": f"Product {ean}", "ean": ean, "price": 1.5,
+        "basicQuantityUnit": "KPL", "comparisonPrice": 3.0,
+        "comparisonUnit": "KGM", "brandName": "Brand", "slug": ean,
+        "hierarchyPath": [{"id": "1", "name": "Category", "slug": "cat"}]}
+
+
+def respond(aliases, errors=()) -> httpx.Response:
+    """Create a response with one item per alias, except the errored."""
+    data: dict = {}
+    for index, (store_alias, products_alias, store_id, _) in \
+            enumerate(aliases):
+        store = data.setdefault(store_alias, {
+            "name": f"Store {store_id}", "id": str(store_id),
+            "brand": "prisma"})
+        store[products_alias] = None if index in errors \
+            else {"total": 1, "items": [item(str(index))]}
+    return httpx.Response(200, json={
+        "data": data,
+        "errors": [{"message": "failed", "path": list(aliases[index][:2])}
+                   for index in errors]})
+
+
+def test_batch_aliases_every_pair():
+    """Test that each pair gets its own aliased products field & vars."""
+    pairs = [(1, MILK), (2, MILK), (1, BREAD)]
+    document, variables, aliases = \
+        query_utils.build_product_batch_query(pairs=pairs)
+    graphql.parse(document)  # Raises if the document is invalid
+    assert [(store_id, query) for _, _, store_id, query in aliases] \
+        == pairs
+    assert len({alias[1] for alias in aliases}) == len(pairs)
+    for index, (store_alias, _, store_id, query) in enumerate(aliases):
+        assert variables[store_alias] == store_id
+        assert variables[f"query_{index}"] == query["query"]
+        assert variables[f"slugs_{index}"] == query["category"]
+
+
+def test_batch_response_maps_back_to_pairs():
+    """Test that the results of a batch are found under their pairs."""
+    pairs = [(1, MILK), (2, MILK), (1, BREAD)]
+    _, _, aliases = query_utils.build_product_batch_query(pairs=pairs)
+    results, failed = parse.parse_product_batch_response(
+        response=respond(aliases), aliases=aliases)
+    assert failed == []
+    assert [(details["store_id"], details["query"], items[0][0].ean)
+            for details, items in results] \
+        == [("1", "maito", "0"), ("2", "maito", "1"), ("1", "leipä", "2")]
+
+
+def test_failed_alias_is_returned_for_retry():
+    """Test that an errored pair fails without failing the others."""
+    pairs = [(1, MILK), (2, MILK), (1, BREAD)]
+    _, _, aliases = query_utils.build_product_batch_query(pairs=pairs)
+    results, failed = parse.parse_product_batch_response(
+        response=respond(aliases, errors={1}), aliases=aliases)
+    assert failed == [aliases[1]]
+    assert [items[0][0].ean for _, items in results] == ["0", "2"]
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from backend.app.api.skaupat import query_utils
+
+Operation = query_utils.Operation
+PAIRS = [(1, {"query": "maito", "category": ""}),
+         (2, {"query": "leipä \"täysjyvä\"", "category": "leivat"})]
+
+
+def encode(body: dict) -> bytes:
+    """Encode a request body as compactly as a template does."""
+    return json.dumps(
+        body, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+@pytest.mark.parametrize("operation, variables, batch_size", [
+    (Operation.PRODUCT_SEARCH,
+     query_utils.build_product_search_vars(*PAIRS[1]), None),
+    (Operation.STORE_SEARCH,
+     query_utils.build_store_search_vars("Olari"), None),
+    (Operation.PRODUCT_BATCH_SEARCH,
+     query_utils.build_product_batch_query(PAIRS)[1], len(PAIRS))])
+def test_template_matches_json_dumps(operation, variables, batch_size):
+    """Test that a pre-encoded body equals the json.dumps() of the body."""
+    template = query_utils.get_request_template(operation, batch_size)
+    document = None
+    if batch_size is not None:
+        document = query_utils.build_product_batch_query(PAIRS)[0]
+    assert template.build_content(variables) == encode(
+        query_utils.build_json_dict(operation, variables, document))
+
+
+def test_batch_templates_are_shared_by_size():
+    """Test that batches of the same size share their template."""
+    other = [(3, {"query": "juusto", "category": ""})] * 2
+    assert query_utils.build_product_batch_query(PAIRS)[0] \
+        == query_utils.build_product_batch_query(other)[0]
+    template = query_utils.get_request_template(
+        Operation.PRODUCT_BATCH_SEARCH, 2)
+    assert query_utils.get_request_template(
+        Operation.PRODUCT_BATCH_SEARCH, 2) is template
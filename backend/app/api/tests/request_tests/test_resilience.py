@@ -0,0 +1,117 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from backend.app.api import breaker
+from backend.app.api import limiter
+from backend.app.api import request
+
+PARAMS = {"method": "post", "url": "http://upstream/graphql",
+          "extensions": {"operation": "op"}}
+
+
+def create_policy(**overrides) -> request.ResiliencePolicy:
+    """Create a policy without backoff delays or hedging by default."""
+    settings = {
+        "max_attempts": 3, "backoff_base": 0.0, "backoff_max": 0.0,
+        "total_budget": 5.0, "min_timeout": 0.1, "max_timeout": 2.0,
+        "timeout_percentile": 99, "timeout_multiplier": 2.0,
+        "min_samples": 1, "hedging": False, "hedge_percentile": 50,
+        "hedge_ratio": 1.0}
+    return request.ResiliencePolicy(**{**settings, **overrides})
+
+
+@pytest.fixture(autouse=True)
+def isolate(monkeypatch):
+    """Give each test its own breakers & limiter."""
+    monkeypatch.setattr(breaker, "upstream", breaker.BreakerRegistry(
+        failure_threshold=100, reset_timeout=60.0, half_open_max_calls=1))
+    monkeypatch.setattr(limiter, "upstream", limiter.UpstreamLimiter(
+        bucket=limiter.TokenBucket(rate=1000, capacity=1000),
+        concurrency=limiter.AdaptiveConcurrencyLimiter(
+            initial=8, minimum=1, maximum=8)))
+
+
+def send(monkeypatch, handler, policy: request.ResiliencePolicy):
+    """Send a request to a mock upstream answering with the handler."""
+    monkeypatch.setattr(request, "policy", policy)
+
+    async def main():
+        await request.open_client(transport=httpx.MockTransport(handler))
+        try:
+            return await request.send_request(params=PARAMS)
+        finally:
+            await request.close_client()
+
+    return asyncio.run(main())
+
+
+def test_server_error_is_retried(monkeypatch):
+    """Test that a 5xx response is retried until an attempt succeeds."""
+    statuses = iter([503, 500, 200])
+    policy = create_policy()
+    response = send(
+        monkeypatch, lambda _: httpx.Response(next(statuses), json={}),
+        policy)
+    assert response is not None and response.status_code == 200
+    assert policy.counters["attempts"] == 3
+    assert policy.counters["retries"] == 2
+
+
+def test_client_error_is_not_retried(monkeypatch):
+    """Test that a 4xx response fails without retries or a breaker trip."""
+    policy = create_policy()
+    response = send(
+        monkeypatch, lambda _: httpx.Response(404, json={}), policy)
+    assert response is None
+    assert policy.counters["attempts"] == 1
+    assert breaker.upstream.get("op").counters["failures"] == 0
+
+
+def test_hedge_wins_over_a_slow_attempt(monkeypatch):
+    """Test that a duplicate is sent for a slow attempt & may win."""
+    calls = []
+
+    async def handler(_):
+        calls.append(None)
+        if len(calls) == 1:
+            await asyncio.sleep(1.0)
+            return httpx.Response(200, json={"attempt": "first"})
+        return httpx.Response(200, json={"attempt": "hedge"})
+
+    policy = create_policy(hedging=True)
+    policy.tracker("op").record(0.01)
+    response = send(monkeypatch, handler, policy)
+    assert response is not None and response.json() == {"attempt": "hedge"}
+    assert policy.counters["hedges"] == 1
+    assert policy.counters["hedge_wins"] == 1
+
+
+def test_retries_stop_when_the_budget_is_exhausted(monkeypatch):
+    """Test that no retry is made if its backoff exceeds the budget."""
+    monkeypatch.setattr(request.random, "uniform", lambda _, high: high)
+    policy = create_policy(
+        total_budget=0.5, backoff_base=1.0, backoff_max=1.0)
+    response = send(
+        monkeypatch, lambda _: httpx.Response(500, json={}), policy)
+    assert response is None
+    assert policy.counters["attempts"] == 1
+    assert policy.counters["budget_exhausted"] == 1
+
+
+def test_saturated_limiter_is_bounded_by_the_budget(monkeypatch):
+    """Test that waiting for a permit can not outlast the time budget."""
+
+    @asynccontextmanager
+    async def limit():
+        await asyncio.Event().wait()  # Never gets a permit
+        yield limiter.Permit()
+
+    monkeypatch.setattr(limiter.upstream, "limit", limit)
+    policy = create_policy(total_budget=0.2, max_attempts=2)
+    response = send(
+        monkeypatch, lambda _: httpx.Response(200, json={}), policy)
+    assert response is None
+    assert policy.counters["timeouts"] >= 1
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from fastapi import BackgroundTasks
+
+from backend.app.api.routes import product
+from backend.app.core import product_search
+from backend.app.core import search_context as search
+from backend.app.core.orm import schemas
+
+MILK = {"query": "maito", "category": ""}
+
+
+def create_query() -> schemas.ProductQuery:
+    """Create a query for a single milk search in three stores."""
+    return schemas.ProductQuery(stores={1, 2, 3}, queries=[MILK])
+
+
+def stream(monkeypatch, fmt: str) -> list[str]:
+    """Stream a search with one successful, failed & incomplete pair."""
+    async def stream_product_search(query, background_tasks, timeout=None):
+        yield search.SearchState.SUCCESS, ({**MILK, "store_id": 1}, [])
+        yield search.SearchState.FAIL, ({**MILK, "store_id": 2}, [])
+        yield search.SearchState.TIMEOUT, ({**MILK, "store_id": 3}, [])
+
+    monkeypatch.setattr(
+        product_search, "stream_product_search", stream_product_search)
+
+    async def collect():
+        response = await product.stream_products(
+            query=create_query(), background_tasks=BackgroundTasks(),
+            fmt=fmt, timeout_ms=None)
+        return response.media_type, [
+            frame async for frame in response.body_iterator]
+
+    media_type, frames = asyncio.run(collect())
+    assert media_type == product.STREAM_MEDIA_TYPES[fmt]
+    return frames
+
+
+def test_ndjson_frame_is_a_json_line():
+    """Test that an NDJSON frame is one JSON object tagged by event."""
+    frame = product.encode_frame("result", {"name": "maitö"}, "ndjson")
+    assert frame == '{"event": "result", "name": "maitö"}\n'
+
+
+def test_sse_frame_is_an_event():
+    """Test that an SSE frame has an event line & a JSON data line."""
+    frame = product.encode_frame("summary", {"failed": []}, "sse")
+    assert frame == 'event: summary\ndata: {"failed": []}\n\n'
+
+
+def test_ndjson_summary_lists_failed_and_incomplete(monkeypatch):
+    """Test that the summary frame lists failed & incomplete pairs."""
+    frames = [json.loads(frame) for frame in stream(monkeypatch, "ndjson")]
+    assert [frame["event"] for frame in frames] == ["result", "summary"]
+    assert frames[0]["details"]["store_id"] == 1
+    summary = frames[1]
+    assert summary["succeeded"] == 1
+    assert [details["store_id"] for details in summary["failed"]] == [2]
+    assert [details["store_id"]
+            for details in summary["incomplete"]] == [3]
+
+
+def test_sse_summary_lists_failed_and_incomplete(monkeypatch):
+    """Test that the summary event lists failed & incomplete pairs."""
+    frames = stream(monkeypatch, "sse")
+    assert [frame.split("\n")[0] for frame in frames] == [
+        "event: result", "event: summary"]
+    summary = json.loads(frames[1].split("\n")[1].removeprefix("data: "))
+    assert summary["succeeded"] == 1
+    assert summary["failed"] == [{**MILK, "store_id": 2}]
+    assert summary["incomplete"] == [{**MILK, "store_id": 3}]
@@ -0,0 +1,68 @@
+"""Freshness policies for serving saved data instead of fetching it."""
+from enum import Enum
+
+from backend.app.core import config
+
+
+class Freshness(str, Enum):
+    """Enumeration for how fresh saved data is.
+
+    Values:
+        FRESH  |  STALE  |  EXPIRED
+    """
+    FRESH = "FRESH"
+    STALE = "STALE"
+    EXPIRED = "EXPIRED"
+
+
+class FreshnessPolicy:
+    """Soft & hard max age of the saved data served by an endpoint.
+
+    Data younger than 'soft_max_age' is served as is. Data between the
+    soft & hard max age is stale; with 'stale_while_revalidate' set it
+    is served while a refresh runs in the background, otherwise it is
+    fetched again. Data older than 'hard_max_age' is never served.
+    """
+
+    def __init__(
+            self, soft_max_age: float, hard_max_age: float,
+            stale_while_revalidate: bool = True) -> None:
+        if hard_max_age < soft_max_age:
+            raise ValueError(
+                "hard_max_age must not be less than soft_max_age.")
+        self.soft_max_age = soft_max_age
+        self.hard_max_age = hard_max_age
+        self.stale_while_revalidate = stale_while_revalidate
+
+    def classify(self, age: float) -> Freshness:
+        """Get the freshness of data of the given age, in seconds."""
+        if age <= self.soft_max_age:
+            return Freshness.FRESH
+        if age <= self.hard_max_age:
+            return Freshness.STALE
+        return Freshness.EXPIRED
+
+    def servable(self, age: float) -> bool:
+        """Check if data of the given age may be served right away."""
+        match self.classify(age):
+            case Freshness.FRESH:
+                return True
+            case Freshness.STALE:
+                return self.stale_while_revalidate
+        return False
+
+
+def create_policy(endpoint: str) -> FreshnessPolicy:
+    """Create the policy of an endpoint from the [FRESHNESS] settings.
+
+    Args:
+        endpoint (str):
+            The prefix of the endpoint's settings, e.g. 'products'
+            reads 'products_soft_max_age' & 'products_hard_max_age'.
+    """
+    settings = config.parser["FRESHNESS"]
+    return FreshnessPolicy(
+        soft_max_age=settings.getfloat(f"{endpoint}_soft_max_age"),
+        hard_max_age=settings.getfloat(f"{endpoint}_hard_max_age"),
+        stale_while_revalidate=settings.getboolean(
+            f"{endpoint}_stale_while_revalidate"))
@@ -1,4 +1,4 @@
 """Module containing an SQLAlchemy ORM implementation."""
-from . import models, schemas, crud, database
+from . import models, schemas, crud, async_crud, database
 
-__all__ = ["models", "schemas", "crud", "database"]
+__all__ = ["models", "schemas", "crud", "async_crud", "database"]
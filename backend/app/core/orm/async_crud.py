@@ -0,0 +1,212 @@
+"""Contains asynchronous CRUD operations for interaction with the database.
+
+The counterparts of the operations in crud.py, run in an AsyncDBContext
+so that they can be awaited without blocking the event loop. The select
+statements themselves are shared with crud.py.
+"""
+from typing import Type, Sequence
+from datetime import timedelta
+from sqlalchemy.sql import Select
+
+from backend.app.core.typedefs import SchemaInOrDict
+from backend.app.core.typedefs import SchemaOut
+from backend.app.core.typedefs import OrmModel
+
+from backend.app.utils import LoggerManager
+
+from . import models
+from . import schemas
+from . import database
+from . import crud
+
+logger = LoggerManager().get_logger(__name__, sh=0, fh=10)
+
+# ---- GENERAL CREATION FUNCTIONS ----
+
+
+async def create_record(
+        record: SchemaInOrDict, model: Type[OrmModel]) -> bool:
+    """Add a new record to the database.
+
+    Args:
+        record (SchemaInOrDict):
+            A Pydantic Schema (IN type only, see typedefs.py) or a dict.
+        model (Type[OrmModelT]):
+            The type for an ORM model defined in models.py
+
+    Returns:
+        bool:
+            Returns True if the operation was successful.
+            If an SQLAlchemy error was raised, or any other exception
+            occurred inside the context (AsyncDBContext), returns False.
+    """
+    db_model: OrmModel = model(**dict(record))
+    async with database.AsyncDBContext() as context:
+        logger.debug(
+            "Adding a single '%s' record to the database...",
+            record.__class__.__name__)
+        context.session.add(db_model)
+    if context.status is database.CommitState.SUCCESS:
+        return True
+    logger.debug(
+        "Unable to add record %s (%s) to the database.",
+        model, record.__class__.__name__)
+    return False
+
+
+async def bulk_create_records(
+        records: Sequence[SchemaInOrDict],
+        model: Type[OrmModel],
+        on_conflict: crud.OnConflict = crud.OnConflict.FAIL) -> bool:
+    """Add records to the database using a bulk insert.
+
+    Args:
+        records (list[SchemaInOrDict]):
+        The batch of items to be added to the database.
+        Items must be Pydantic Schemas (IN type only, see typedefs.py).
+        Alternatively dicts may also be passed
+        on_conflict (crud.OnConflict):
+        How records that already exist are handled, see crud.OnConflict.
+
+    Returns:
+        bool:
+        A boolean indicating if the operation was successful.
+    """
+    stmt, items = crud.build_insert_stmt(
+        items=[dict(record) for record in records], model=model,
+        on_conflict=on_conflict)
+    async with database.AsyncDBContext() as context:
+        logger.debug(
+            "Adding batch of %s '%s' records to the database...",
+            len(items), records[0].__class__.__name__)
+        await context.session.execute(stmt, items)
+    if context.status is database.CommitState.SUCCESS:
+        return True
+    logger.debug(
+        "Unable to add batch of records (%s) to the database.",
+        records[0].__class__.__name__)
+    return False
+
+
+# ---- GENERAL READING FUNCTIONS ----
+# Validating ORM objects may load their relationships, which an
+# AsyncSession can only do implicitly within run_sync()
+
+async def select_one[SchemaT: SchemaOut](
+        stmt: Select, cast: Type[SchemaT]
+        ) -> SchemaT | None:
+    """Get a single item from the database using the given select query.
+
+    The resulting ORM-object is casted to the specified
+    Pydantic schema before being returned from the function.
+
+    Args:
+        stmt (Select):
+            A previously constructed SQLAlchemy Select object.
+            This is used in the call to session.scalars.
+        cast (Type[SchemaOut]):
+            The type of the Pydantic schema to cast the result to.
+            The upper bound is defined by SchemaOut (see typedefs).
+
+    Returns:
+        SchemaOut | None:
+            The validated instance of the given SchemaT type.
+            Returns None if the item could not be retrieved.
+    """
+    result: SchemaT | None = None
+    async with database.AsyncDBContext(read_only=True) as context:
+        item: OrmModel | None = \
+            (await context.session.scalars(stmt)).one_or_none()
+        if item is not None:
+            result = await context.session.run_sync(
+                lambda _: cast.model_validate(item))
+    return result
+
+
+async def select_all[SchemaT: SchemaOut](
+        stmt: Select, cast: Type[SchemaT]
+        ) -> list[SchemaT]:
+    """Get a list of items from the database using the given select query.
+
+    The resulting ORM-objects are casted to the specified
+    Pydantic schema before being returned from the function.
+
+    Args:
+        stmt (Select):
+            A previously constructed SQLAlchemy Select object.
+            This is used in the call to session.scalars.
+        cast (Type[SchemaT]):
+            The type of the Pydantic schema to cast the results to.
+            The upper bound is defined by SchemaOut (see typedefs).
+
+    Returns:
+        list[SchemaT]:
+            A list of validated instances of the given SchemaT type.
+            The list may be empty if no items could be retrieved.
+    """
+    result: list[SchemaT] = []
+    async with database.AsyncDBContext(read_only=True) as context:
+        items: Sequence[OrmModel] = \
+            (await context.session.scalars(stmt)).all()
+        result = await context.session.run_sync(
+            lambda _: [cast.model_validate(item) for item in items])
+    return result
+
+
+# ---- STORE GET FUNCTIONS ----
+
+
+async def get_store_by_id(store_id: int) -> schemas.StoreDB | None:
+    """Get a store by id."""
+    stmt = crud.build_store_by_id_stmt(store_id)
+    return await select_one(stmt=stmt, cast=schemas.StoreDB)
+
+
+async def get_stores_by_name(
+        name: str, brand: str | None = None) -> list[schemas.StoreDB]:
+    """Get stores by name."""
+    stmt = crud.build_stores_by_name_stmt(name=name, brand=brand)
+    return await select_all(stmt=stmt, cast=schemas.StoreDB)
+
+
+# ---- PRODUCT GET FUNCTIONS ----
+
+
+async def select_product_snapshots(
+        stmt: Select
+        ) -> list[tuple[schemas.Product, schemas.ProductDataSnapshot]]:
+    """Get product data items & their products using the given query."""
+    result: list[tuple[schemas.Product, schemas.ProductDataSnapshot]] = []
+    async with database.AsyncDBContext(read_only=True) as context:
+        items: Sequence[models.ProductData] = \
+            (await context.session.scalars(stmt)).all()
+        result = await context.session.run_sync(
+            lambda _: crud.validate_product_snapshots(items))
+    return result
+
+
+async def get_latest_store_products(
+        store_id: int, name: str, category: str | None = None,
+        limit: int = 24
+        ) -> list[tuple[schemas.Product, schemas.ProductDataSnapshot]]:
+    """Get the latest product data of a store for products matching a name.
+
+    See crud.get_latest_store_products().
+    """
+    return await select_product_snapshots(
+        crud.build_latest_store_products_stmt(
+            store_id=store_id, name=name, category=category, limit=limit))
+
+
+async def get_fresh_query_products(
+        store_id: int, query_key: str, max_age: timedelta,
+        limit: int = 24
+        ) -> list[tuple[schemas.Product, schemas.ProductDataSnapshot]]:
+    """Get the latest product data saved for a query in a store.
+
+    See crud.get_fresh_query_products().
+    """
+    return await select_product_snapshots(
+        crud.build_fresh_query_products_stmt(
+            store_id=store_id, query_key=query_key, max_age=max_age,
+            limit=limit))
@@ -1,7 +1,15 @@
 """Contains CRUD operations for interaction with the database."""
-from typing import Type, Sequence
-from sqlalchemy import select, insert
-from sqlalchemy.sql import Select
+import csv
+import io
+from enum import Enum
+from itertools import chain
+from typing import Any, Iterable, Type, Sequence
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, insert, and_, column, table, text
+from sqlalchemy.dialects.postgresql import distinct_on
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.sql import Insert, Select
 
 
 from backend.app.core.typedefs import SchemaInOrDict
@@ -16,11 +24,63 @@ from . import database
 
 logger = LoggerManager().get_logger(__name__, sh=0, fh=10)
 
-# TODO: Implement asynchronous database operations
+# Asynchronous counterparts of these operations are in async_crud.py
 
 # ---- GENERAL CREATION FUNCTIONS ----
 
 
+class OnConflict(str, Enum):
+    """How a bulk insert handles records that already exist.
+
+    Values:
+        FAIL  |  NOTHING  |  UPDATE
+    """
+    FAIL = "FAIL"  # The whole batch fails with an IntegrityError
+    NOTHING = "NOTHING"  # Existing rows are kept as is
+    UPDATE = "UPDATE"  # Existing rows are updated, see NATURAL_KEYS
+
+
+# The columns that identify a record of a model outside of the DB,
+# used as the conflict target of OnConflict.UPDATE
+NATURAL_KEYS: dict[Type[OrmModel], tuple[str, ...]] = {
+    models.Store: ("store_id",),
+    models.Product: ("ean",),
+}
+
+
+def build_insert_stmt(
+        items: list[dict], model: Type[OrmModel],
+        on_conflict: OnConflict = OnConflict.FAIL
+        ) -> tuple[Insert, list[dict]]:
+    """Build a bulk insert statement for the given items.
+
+    The conflict handling uses PostgreSQL's INSERT ... ON CONFLICT.
+    An upsert can only affect each row once per statement, so for
+    OnConflict.UPDATE items are deduplicated by their natural key,
+    the last item of each key being kept.
+
+    Returns:
+        tuple[Insert, list[dict]]:
+            The statement & the items to execute it with.
+    """
+    match on_conflict:
+        case OnConflict.FAIL:
+            return insert(model), items
+        case OnConflict.NOTHING:
+            return pg_insert(model).on_conflict_do_nothing(), items
+        case OnConflict.UPDATE:
+            key = NATURAL_KEYS[model]
+            unique = list({
+                tuple(item[column] for column in key): item
+                for item in items}.values())
+            stmt = pg_insert(model)
+            return stmt.on_conflict_do_update(
+                index_elements=list(key),
+                set_={column: stmt.excluded[column]
+                      for column in unique[0] if column not in key}
+            ), unique
+
+
 def create_record(record: SchemaInOrDict, model: Type[OrmModel]) -> bool:
     """Add a new record to the database.
 
@@ -53,7 +113,8 @@ def create_record(record: SchemaInOrDict, model: Type[OrmModel]) -> bool:
 
 def bulk_create_records(
         records: Sequence[SchemaInOrDict],
-        model: Type[OrmModel]) -> bool:
+        model: Type[OrmModel],
+        on_conflict: OnConflict = OnConflict.FAIL) -> bool:
     """Add records to the database using a bulk insert.
 
     Args:
@@ -61,6 +122,10 @@ def bulk_create_records(
         The batch of items to be added to the database.
         Items must be Pydantic Schemas (IN type only, see typedefs.py).
         Alternatively dicts may also be passed
+        on_conflict (OnConflict):
+        How records that already exist are handled, see OnConflict.
+        With NOTHING or UPDATE, the batch is saved in one statement
+        regardless of existing records.
 
     Returns:
         bool:
@@ -70,13 +135,15 @@ def bulk_create_records(
         items: list[dict] = [dict(i) for i in records]  # Convert to dicts
     else:
         # Assuming the entire Sequence is a list of dicts
-        items = records  # type: ignore
+        items = list(records)  # type: ignore
+    stmt, items = build_insert_stmt(
+        items=items, model=model, on_conflict=on_conflict)
     with database.DBContext() as context:
         logger.debug(
             "Adding batch of %s '%s' records records to the database...",
             len(items), records[0].__class__.__name__)
         context.session.execute(
-            insert(model),
+            stmt,
             [*items]  # Unpack dicts into statement
         )
     if context.status is database.CommitState.SUCCESS:
@@ -87,6 +154,152 @@ def bulk_create_records(
     return False
 
 
+# ---- BULK COPY FUNCTIONS ----
+# For large volumes of records, e.g. a catalog-wide refresh
+
+
+class CopyStream:
+    """A file-like object reading rows as the CSV of a COPY FROM STDIN.
+
+    Rows are only converted as the COPY reads them, so the whole
+    CSV is never held in memory. None values are written unquoted,
+    which COPY reads as NULL, all other values are quoted.
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]]) -> None:
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(
+            self._buffer, quoting=csv.QUOTE_NOTNULL, lineterminator="\n")
+        self.row_count = 0
+
+    def read(self, size: int = -1) -> str:
+        """Read up to 'size' characters, or all of them if negative."""
+        while size < 0 or self._buffer.tell() < size:
+            if (row := next(self._rows, None)) is None:
+                break
+            self._writer.writerow(row)
+            self.row_count += 1
+        data = self._buffer.getvalue()
+        if size < 0 or len(data) <= size:
+            chunk, rest = data, ""
+        else:
+            chunk, rest = data[:size], data[size:]
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffer.write(rest)
+        return chunk
+
+
+def build_merge_stmt(
+        staging: str, columns: Sequence[str], model: Type[OrmModel],
+        on_conflict: OnConflict = OnConflict.FAIL) -> Insert:
+    """Build the statement merging a staging table into a model's table.
+
+    Works like build_insert_stmt(), with the staging table's rows as
+    the items. For OnConflict.UPDATE only one row per natural key is
+    merged, which one is undefined.
+    """
+    source = table(staging, *(column(name) for name in columns))
+    rows = select(*source.c)
+    stmt = pg_insert(model)
+    match on_conflict:
+        case OnConflict.NOTHING:
+            stmt = stmt.on_conflict_do_nothing()
+        case OnConflict.UPDATE:
+            key = NATURAL_KEYS[model]
+            rows = rows.ext(distinct_on(*(source.c[name] for name in key)))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key),
+                set_={name: stmt.excluded[name]
+                      for name in columns if name not in key})
+    return stmt.from_select(list(columns), rows)
+
+
+def copy_records(
+        records: Iterable[SchemaInOrDict],
+        model: Type[OrmModel],
+        staging: bool = False,
+        on_conflict: OnConflict = OnConflict.FAIL) -> bool:
+    """Add records to the database by streaming them with COPY FROM STDIN.
+
+    Much faster than bulk_create_records() for large volumes, as the
+    rows are sent as a single CSV stream instead of as statements.
+    Requires PostgreSQL with the psycopg2 driver. Every record must
+    have the same fields, with scalar values.
+
+    Args:
+        records (Iterable[SchemaInOrDict]):
+        The records to be added to the database, which may be
+        a generator. Pydantic Schemas (IN type only) or dicts.
+        staging (bool):
+        Copy the records into a temporary table first & then merge them
+        into the model's table in a single INSERT ... SELECT.
+        on_conflict (OnConflict):
+        How records that already exist are handled, see OnConflict.
+        COPY can not skip or update existing rows, so anything but FAIL
+        always uses a staging table.
+
+    Returns:
+        bool:
+        A boolean indicating if the operation was successful.
+    """
+    iterator = iter(records)
+    if (first := next(iterator, None)) is None:
+        return True
+    columns = list(dict(first))
+    stream = CopyStream(
+        [values[name] for name in columns]
+        for values in map(dict, chain((first,), iterator)))
+    staging = staging or on_conflict is not OnConflict.FAIL
+    target = model.__table__.name
+    if staging:
+        target = f"staging_{target}"
+    try:
+        with database.DBContext() as context:
+            dialect = context.session.get_bind().dialect
+            quote = dialect.identifier_preparer.quote
+            if staging:
+                context.session.execute(text(
+                    f"CREATE TEMP TABLE {quote(target)} "
+                    f"(LIKE {quote(model.__table__.name)}) ON COMMIT DROP"))
+            copy_sql = (
+                f"COPY {quote(target)} "
+                f"({', '.join(quote(name) for name in columns)}) "
+                "FROM STDIN WITH (FORMAT csv)")
+            cursor = context.session.connection().connection.cursor()
+            try:
+                cursor.copy_expert(copy_sql, stream)
+            except dialect.loaded_dbapi.Error as err:
+                # Raised as an SQLAlchemy error, as DBContext handles those
+                raise DBAPIError.instance(
+                    copy_sql, None, err, dialect.loaded_dbapi.Error) from err
+            finally:
+                cursor.close()
+            logger.debug(
+                "Copied %s '%s' record(s) into '%s'.",
+                stream.row_count, first.__class__.__name__, target)
+            if staging:
+                merged = context.session.execute(build_merge_stmt(
+                    staging=target, columns=columns, model=model,
+                    on_conflict=on_conflict))
+                logger.debug(
+                    "Merged %s record(s) from '%s'.", merged.rowcount, target)
+    except SQLAlchemyError as err:
+        # Only an IntegrityError is handled by DBContext, but any failed
+        # COPY (e.g. invalid data) is left for the caller to fall back on
+        logger.debug(
+            "Unable to copy %s '%s' record(s) to the database: %s",
+            stream.row_count, first.__class__.__name__, err)
+        return False
+    if context.status is database.CommitState.SUCCESS:
+        return True
+    logger.debug(
+        "Unable to copy %s '%s' record(s) to the database.",
+        stream.row_count, first.__class__.__name__)
+    return False
+
+
 # ---- GENERAL READING FUNCTIONS ----
 
 def select_one[SchemaT: SchemaOut](
@@ -151,12 +364,17 @@ def select_all[SchemaT: SchemaOut](
 # ---- STORE GET FUNCTIONS ----
 
 
-def get_store_by_id(store_id: int) -> schemas.StoreDB | None:
-    """Get a store by id."""
-    stmt = (
+def build_store_by_id_stmt(store_id: int) -> Select:
+    """Build the select statement of get_store_by_id()."""
+    return (
         select(models.Store)
         .where(models.Store.store_id == store_id)
     )
+
+
+def get_store_by_id(store_id: int) -> schemas.StoreDB | None:
+    """Get a store by id."""
+    stmt = build_store_by_id_stmt(store_id)
     return select_one(stmt=stmt, cast=schemas.StoreDB)
 
 
@@ -169,9 +387,9 @@ def get_store_by_slug(slug: str) -> schemas.StoreDB | None:
     return select_one(stmt=stmt, cast=schemas.StoreDB)
 
 
-def get_stores_by_name(
-        name: str, brand: str | None = None) -> list[schemas.StoreDB]:
-    """Get stores by name."""
+def build_stores_by_name_stmt(
+        name: str, brand: str | None = None) -> Select:
+    """Build the select statement of get_stores_by_name()."""
     stmt = (
         select(models.Store)
         .where(models.Store.store_name.ilike(
@@ -179,7 +397,13 @@ def get_stores_by_name(
     )
     if brand is not None:
         stmt = stmt.where(models.Store.brand == brand)
-    stmt = stmt.order_by(models.Store.store_name)
+    return stmt.order_by(models.Store.store_name)
+
+
+def get_stores_by_name(
+        name: str, brand: str | None = None) -> list[schemas.StoreDB]:
+    """Get stores by name."""
+    stmt = build_stores_by_name_stmt(name=name, brand=brand)
     return select_all(stmt=stmt, cast=schemas.StoreDB)
 
 # ---- PRODUCT GET FUNCTIONS ----
@@ -216,3 +440,96 @@ def get_products_by_name(
         stmt = stmt.where(models.Product.category == category)
     stmt = stmt.order_by(models.Product.name)
     return select_all(stmt=stmt, cast=schemas.ProductDB)
+
+
+def build_latest_store_products_stmt(
+        store_id: int, name: str, category: str | None = None,
+        limit: int = 24) -> Select:
+    """Build the select statement of get_latest_store_products()."""
+    stmt = (
+        select(models.ProductData)
+        .join(models.ProductData.product)
+        .where(models.ProductData.store_id == store_id)
+        .where(and_(*(
+            models.Product.name.ilike(f"%{word}%")
+            for word in name.split()
+        )))
+    )
+    if category:
+        stmt = stmt.where(models.Product.category == category)
+    return (
+        stmt.order_by(
+            models.ProductData.product_ean,
+            models.ProductData.timestamp.desc())
+        .ext(distinct_on(models.ProductData.product_ean))
+        .limit(limit)
+    )
+
+
+def validate_product_snapshots(
+        items: Sequence[models.ProductData]
+        ) -> list[tuple[schemas.Product, schemas.ProductDataSnapshot]]:
+    """Validate product data items & their products into schemas."""
+    return [
+        (schemas.Product.model_validate(item.product),
+         schemas.ProductDataSnapshot.model_validate(item))
+        for item in items
+    ]
+
+
+def get_latest_store_products(
+        store_id: int, name: str, category: str | None = None,
+        limit: int = 24
+        ) -> list[tuple[schemas.Product, schemas.ProductDataSnapshot]]:
+    """Get the latest product data of a store for products matching a name.
+
+    Every whitespace separated word in the name must be
+    contained in the product name (case-insensitive).
+    """
+    stmt = build_latest_store_products_stmt(
+        store_id=store_id, name=name, category=category, limit=limit)
+    result: list[tuple[schemas.Product, schemas.ProductDataSnapshot]] = []
+    with database.DBContext(read_only=True) as context:
+        items: list[models.ProductData] = \
+            context.session.scalars(stmt).all()
+        result = validate_product_snapshots(items)
+    return result
+
+
+def build_fresh_query_products_stmt(
+        store_id: int, query_key: str, max_age: timedelta,
+        limit: int = 24) -> Select:
+    """Build the select statement of get_fresh_query_products()."""
+    cutoff = datetime.now(timezone.utc) - max_age
+    return (
+        select(models.ProductData)
+        .join(models.ProductData.product)
+        .where(models.ProductData.store_id == store_id)
+        .where(models.ProductData.query_key == query_key)
+        .where(models.ProductData.timestamp >= cutoff)
+        .order_by(
+            models.ProductData.product_ean,
+            models.ProductData.timestamp.desc())
+        .ext(distinct_on(models.ProductData.product_ean))
+        .limit(limit)
+    )
+
+
+def get_fresh_query_products(
+        store_id: int, query_key: str, max_age: timedelta,
+        limit: int = 24
+        ) -> list[tuple[schemas.Product, schemas.ProductDataSnapshot]]:
+    """Get the latest product data saved for a query in a store.
+
+    Only product data saved within 'max_age' is considered, for each
+    product the newest row is returned. See query_utils.build_query_key.
+    """
+    stmt = build_fresh_query_products_stmt(
+        store_id=store_id, query_key=query_key, max_age=max_age,
+        limit=limit)
+    result: list[tuple[schemas.Product, schemas.ProductDataSnapshot]] = []
+    with database.DBContext(read_only=True) as context:
+        items: list[models.ProductData] = \
+            context.session.scalars(stmt).all()
+        result = validate_product_snapshots(items)
+    return result
@@ -2,14 +2,20 @@
 from enum import Enum
 from typing_extensions import Self
 from sqlalchemy import create_engine
+from sqlalchemy import text, TextClause
+from sqlalchemy import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import Engine
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy.orm import DeclarativeBase
 
 from backend.app.core import config
+from backend.app.core.orm import pool
 from backend.app.utils import LoggerManager
+from backend.app.utils import deadline
 from backend.app.utils.exceptions import ExceptionInContext
 
 logger = LoggerManager().get_logger(__name__, sh=0, fh=10)
@@ -34,14 +40,106 @@ class CommitState(str, Enum):
     PENDING = "PENDING"
 
 
-class DBContext:
-    """Context manager for managing database sessions."""
+def get_statement_timeout_ms() -> int | None:
+    """Get the statement_timeout that the current deadline calls for.
+
+    Returns None if there is no deadline, or if the default
+    statement_timeout of the connections is already shorter.
+    """
+    if (remaining := deadline.remaining()) is None:
+        return None
+    timeout_ms = max(1, int(remaining * 1000))
+    if 0 < pool.STATEMENT_TIMEOUT_MS <= timeout_ms:
+        return None
+    return timeout_ms
+
+
+def build_statement_timeout_stmt() -> TextClause | None:
+    """Build the statement bounding a transaction by the current deadline.
+
+    Returns None if the transaction needs no statement_timeout of its
+    own, see get_statement_timeout_ms().
+    """
+    if (timeout_ms := get_statement_timeout_ms()) is None:
+        return None
+    return text(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+def pool_statistics() -> dict[str, dict]:
+    """Get a snapshot of the sync & async connection pools."""
+    return {
+        "sync": DBContext.monitor.statistics(),
+        "async": AsyncDBContext.monitor.statistics()
+    }
+
+
+class TransactionContext:
+    """Status & error handling shared by DBContext & AsyncDBContext.
+
+    The contexts only differ in how they talk to their session,
+    deciding the outcome of a transaction is left to this base.
+    """
 
     status: CommitState
+    read_only: bool
+
+    def __init__(self, read_only: bool = False):
+        self.read_only = read_only
+
+    def resolve_exit(
+            self, error: BaseException | None, in_context: bool,
+            session_id: int) -> bool:
+        """Set the status of a finished transaction from its error.
+
+        An IntegrityError is suppressed, as are other SQLAlchemy errors
+        raised by the commit. Any other error raised within the context
+        propagates further.
+
+        Args:
+            error (BaseException | None):
+                The error raised within the context or by the commit.
+            in_context (bool):
+                Whether the error was raised within the context.
+            session_id (int):
+                The hash key of the session, used for logging.
+
+        Returns:
+            bool:
+                False if the error should propagate, see __exit__().
+        """
+        if error is None:
+            self.status = CommitState.SUCCESS
+            logger.debug(
+                "[Session ID: %s] Transaction successfully committed.",
+                session_id)
+            return True
+        self.status = CommitState.FAIL
+        if isinstance(error, IntegrityError):
+            logger.debug(
+                "[ID: %s] Transaction raised an IntegrityError.", session_id)
+        elif in_context:
+            logger.debug(ExceptionInContext(error))
+            return False
+        else:
+            logger.error(
+                "[ID: %s] Transaction raised an error: %s",
+                session_id, error, exc_info=error)
+        return True
+
+    def log_rollback(self, session_id: int) -> None:
+        """Log the rollback of a failed transaction."""
+        logger.debug(
+            "[ID: %s] Transaction was rolled back due to an error.",
+            session_id)
+
+
+class DBContext(TransactionContext):
+    """Context manager for managing database sessions."""
+
     session: Session
     _engine: Engine
     _sessionmaker: sessionmaker
-    read_only: bool
+    monitor: pool.PoolMonitor = pool.PoolMonitor()
 
     @classmethod
     def prepare_context(cls, url: str, _purge: bool = False):
@@ -50,7 +148,9 @@ class DBContext:
 
         Must be called before the context manager is used for the first time.
         """
-        cls._engine = create_engine(url=url)
+        cls._engine = create_engine(
+            url=url, **pool.create_engine_options())
+        cls.monitor.attach(cls._engine)
         cls._sessionmaker = sessionmaker(bind=cls._engine)
 
         # as a safeguard, DEBUG must also be True in app config
@@ -59,15 +159,27 @@ class DBContext:
             logger.info(
                 "Purged all existing database tables. _purge was set to True")
         Base.metadata.create_all(bind=cls._engine)
+        # Imported here, as migrations are only needed once on startup
+        from backend.app.core.orm import migrations
+        migrations.run_migrations(cls._engine)
         logger.info("Successfully prepared the database context.")
 
-    def __init__(self, read_only: bool = False):
-        self.read_only = read_only
-
     def __enter__(self) -> Self:
         """Create a session and return it."""
         self.session: Session = self._sessionmaker()
         self.status = CommitState.PENDING
+        try:
+            # Check out the connection up front, so that pool waits show up
+            with self.monitor.measure_checkout():
+                self.session.connection()
+            if (stmt := build_statement_timeout_stmt()) is not None:
+                # Bound the queries of this transaction by the deadline
+                self.session.execute(stmt)
+        except BaseException:
+            # __exit__ is not called when __enter__ raises
+            self.status = CommitState.FAIL
+            self.session.close()
+            raise
         logger.debug(
             "[Session ID: %s] Opened the database session.",
             self.session.hash_key)
@@ -75,48 +187,115 @@ class DBContext:
 
     def __exit__(self, exc_type, exc_value, traceback) -> bool:
         """Commit or rollback changes, close the session."""
-        # Set status to FAIL, must thus be explicitly set later on
-        self.status = CommitState.FAIL
-        propagate_exc = False  # <-- Only relevant if an exception occurred
+        session_id = self.session.hash_key
+        error = exc_value
         try:
-            # Check if an exception occurred within the context
-            if exc_type is None:
-                if not self.read_only:
+            if error is None and not self.read_only:
+                try:
                     self.session.commit()
-            else:
-                # An IntegrityError within context is re-raised
-                if exc_type is IntegrityError:
-                    raise exc_value
-                # All other "unknown" exceptions propagate further
-                raise ExceptionInContext(exc_value)
-        except IntegrityError:
+                except SQLAlchemyError as err:
+                    error = err
+            suppress = self.resolve_exit(
+                error, in_context=exc_value is not None,
+                session_id=session_id)
+            # Perform rollback as commit was not successful
+            if self.status is CommitState.FAIL:
+                self.session.rollback()
+                self.log_rollback(session_id)
+        finally:
+            self.session.close()
             logger.debug(
-                "[ID: %s] Transaction raised an IntegrityError.",
-                self.session.hash_key)
-        except SQLAlchemyError as err:
-            logger.exception(
-                "[ID: %s] Transaction raised an error: %s",
-                self.session.hash_key, err)
-        except ExceptionInContext as err:
-            logger.debug(err)
-            propagate_exc = True
-        else:
-            # As no exception occurred -> set status to SUCCESS
-            self.status = CommitState.SUCCESS
-            logger.debug(
-                "[Session ID: %s] Transaction successfully committed.",
-                self.session.hash_key)
-        # Perform rollback as commit was not successful
-        if self.status is CommitState.FAIL:
-            self.session.rollback()
-            logger.debug(
-                "[ID: %s] Transaction was rolled back due to an error.",
-                self.session.hash_key)
-        self.session.close()
+                "[Session ID: %s] Closed the database session.", session_id)
+        return suppress
+
+
+def create_async_url(url: str) -> str:
+    """Get the URL of a PostgreSQL database with the asyncpg driver."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
+class AsyncDBContext(TransactionContext):
+    """Async context manager for managing database sessions.
+
+    The counterpart of DBContext built on an AsyncEngine, so that
+    queries do not block the event loop. Commits, rollbacks &
+    exceptions are handled the same way, see TransactionContext.
+    """
+
+    session: AsyncSession
+    _engine: AsyncEngine
+    _sessionmaker: async_sessionmaker[AsyncSession]
+    monitor: pool.PoolMonitor = pool.PoolMonitor()
+
+    @classmethod
+    def prepare_context(cls, url: str) -> None:
+        """
+        Create the async engine and sessionmaker.
+
+        Must be called before the context manager is used for the first time.
+        Tables are created by DBContext.prepare_context(), call it first.
+        The driver of a PostgreSQL URL is replaced with asyncpg.
+        """
+        cls._engine = create_async_engine(
+            url=create_async_url(url),
+            **pool.create_engine_options(asynchronous=True))
+        cls.monitor.attach(cls._engine.sync_engine)
+        # Items are validated into schemas right after the queries,
+        # expiring them on commit would only cause implicit reloads
+        cls._sessionmaker = async_sessionmaker(
+            bind=cls._engine, expire_on_commit=False)
+        logger.info("Successfully prepared the async database context.")
+
+    @classmethod
+    async def dispose(cls) -> None:
+        """Close every pooled connection of the async engine."""
+        if getattr(cls, "_engine", None) is not None:
+            await cls._engine.dispose()
+            logger.info("Disposed of the async database engine.")
+
+    async def __aenter__(self) -> Self:
+        """Create a session and return it."""
+        self.session = self._sessionmaker()
+        self.status = CommitState.PENDING
+        try:
+            # Check out the connection up front, so that pool waits show up
+            with self.monitor.measure_checkout():
+                await self.session.connection()
+            if (stmt := build_statement_timeout_stmt()) is not None:
+                # Bound the queries of this transaction by the deadline
+                await self.session.execute(stmt)
+        except BaseException:
+            # __aexit__ is not called when __aenter__ raises
+            self.status = CommitState.FAIL
+            await self.session.close()
+            raise
         logger.debug(
-            "[Session ID: %s] Closed the database session.",
-            self.session.hash_key)
-        if self.status is not CommitState.SUCCESS:
-            if propagate_exc:
-                return False
-        return True
+            "[Session ID: %s] Opened the async database session.",
+            self.session.sync_session.hash_key)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> bool:
+        """Commit or rollback changes, close the session."""
+        session_id = self.session.sync_session.hash_key
+        error = exc_value
+        try:
+            if error is None and not self.read_only:
+                try:
+                    await self.session.commit()
+                except SQLAlchemyError as err:
+                    error = err
+            suppress = self.resolve_exit(
+                error, in_context=exc_value is not None,
+                session_id=session_id)
+            # Perform rollback as commit was not successful
+            if self.status is CommitState.FAIL:
+                await self.session.rollback()
+                self.log_rollback(session_id)
+        finally:
+            await self.session.close()
+            logger.debug(
+                "[Session ID: %s] Closed the database session.", session_id)
+        return suppress
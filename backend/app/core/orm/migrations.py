@@ -0,0 +1,90 @@
+"""Idempotent schema migrations for databases created by older versions.
+
+DBContext.prepare_context() creates missing tables, but it does not
+alter existing ones. The migrations here bring existing tables up to
+date & change nothing on a database that already is, so they are
+simply run on every start, in order.
+"""
+from typing import Callable
+
+from sqlalchemy import Connection, Engine
+from sqlalchemy import inspect, text
+
+from backend.app.utils import LoggerManager
+
+logger = LoggerManager().get_logger(__name__, sh=0, fh=10)
+
+
+def get_column_names(connection: Connection, table: str) -> set[str]:
+    """Get the names of the columns of a table."""
+    return {column["name"]
+            for column in inspect(connection).get_columns(table)}
+
+
+def add_product_data_query_key(connection: Connection) -> None:
+    """Add the query_key column & its lookup index to ProductData."""
+    connection.execute(text(
+        'ALTER TABLE "ProductData" '
+        'ADD COLUMN IF NOT EXISTS query_key VARCHAR'))
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS "ix_ProductData_store_query_timestamp" '
+        'ON "ProductData" (store_id, query_key, timestamp)'))
+
+
+def convert_product_data_prices(connection: Connection) -> None:
+    """Replace the whole & decimal price columns with integer cents.
+
+    The old decimal columns held the digits after the decimal point
+    as an integer, so 1.05 & 1.5 were both saved with a decimal part
+    of 5. Rows with a decimal part of 1-9 can not be converted reliably
+    & are deleted, the next search for them fetches them again. The
+    other rows convert exactly: 0 means a whole price, 10-99 are cents.
+    """
+    if "eur_unit_price_whole" not in get_column_names(
+            connection, "ProductData"):
+        return
+    connection.execute(text(
+        'ALTER TABLE "ProductData" '
+        'ADD COLUMN IF NOT EXISTS unit_price_cents INTEGER, '
+        'ADD COLUMN IF NOT EXISTS cmp_price_cents INTEGER'))
+    deleted = connection.execute(text(
+        'DELETE FROM "ProductData" '
+        'WHERE eur_unit_price_decimal BETWEEN 1 AND 9 '
+        'OR eur_cmp_price_decimal BETWEEN 1 AND 9')).rowcount
+    converted = connection.execute(text(
+        'UPDATE "ProductData" SET '
+        'unit_price_cents = '
+        'eur_unit_price_whole * 100 + eur_unit_price_decimal, '
+        'cmp_price_cents = '
+        'eur_cmp_price_whole * 100 + eur_cmp_price_decimal')).rowcount
+    connection.execute(text(
+        'ALTER TABLE "ProductData" '
+        'ALTER COLUMN unit_price_cents SET NOT NULL, '
+        'ALTER COLUMN cmp_price_cents SET NOT NULL, '
+        'DROP COLUMN eur_unit_price_whole, '
+        'DROP COLUMN eur_unit_price_decimal, '
+        'DROP COLUMN eur_cmp_price_whole, '
+        'DROP COLUMN eur_cmp_price_decimal'))
+    for column in ("unit_price_cents", "cmp_price_cents"):
+        connection.execute(text(
+            f'CREATE INDEX IF NOT EXISTS "ix_ProductData_{column}" '
+            f'ON "ProductData" ({column})'))
+    logger.info(
+        "Converted %s ProductData row(s) to integer cents, deleted %s "
+        "row(s) with ambiguous prices.", converted, deleted)
+
+
+# In the order they must be run in
+MIGRATIONS: tuple[Callable[[Connection], None], ...] = (
+    add_product_data_query_key,
+    convert_product_data_prices,
+)
+
+
+def run_migrations(engine: Engine) -> None:
+    """Run every migration, all in a single transaction."""
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            logger.debug("Running migration '%s'.", migration.__name__)
+            migration(connection)
+    logger.info("Database schema is up to date.")
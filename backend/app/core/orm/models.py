@@ -4,6 +4,7 @@ from datetime import datetime
 
 from sqlalchemy import func
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy.types import DateTime, ARRAY, String
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
@@ -64,18 +65,24 @@ class Product(Base):
 class ProductData(Base):
     """An SQLAlchemy ORM mapping for a product data item."""
     __tablename__ = "ProductData"
+    __table_args__ = (
+        # Supports looking up the latest results of a query in a store
+        Index("ix_ProductData_store_query_timestamp",
+              "store_id", "query_key", "timestamp"),
+    )
 
     # Unique identifiers
     id: Mapped[int] = mapped_column(primary_key=True)
 
-    eur_unit_price_whole: Mapped[int] = mapped_column()
-    eur_unit_price_decimal: Mapped[int] = mapped_column()
-    eur_cmp_price_whole: Mapped[int] = mapped_column()
-    eur_cmp_price_decimal: Mapped[int] = mapped_column()
+    # Prices in integer cents, see migrations.py for older rows
+    unit_price_cents: Mapped[int] = mapped_column(index=True)
+    cmp_price_cents: Mapped[int] = mapped_column(index=True)
     label_unit: Mapped[str] = mapped_column()
     comparison_unit: Mapped[str] = mapped_column()
     timestamp: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now())
+    # The query the data was fetched for, see query_utils.build_query_key
+    query_key: Mapped[str | None] = mapped_column(nullable=True)
 
     # Foreign keys for parent store id & parent product id
     store_id: Mapped[int] = mapped_column(ForeignKey("Stores.store_id"))
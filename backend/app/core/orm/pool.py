@@ -0,0 +1,121 @@
+"""Configuration & monitoring of the database connection pools."""
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from backend.app.core import config
+
+_settings = config.parser["DATABASE"]
+POOL_SIZE = _settings.getint("pool_size")
+MAX_OVERFLOW = _settings.getint("max_overflow")
+POOL_TIMEOUT = _settings.getfloat("pool_timeout")
+POOL_RECYCLE = _settings.getint("pool_recycle")
+POOL_PRE_PING = _settings.getboolean("pool_pre_ping")
+# Default statement_timeout of every connection, 0 disables the timeout
+STATEMENT_TIMEOUT_MS = _settings.getint("statement_timeout_ms")
+
+
+def create_engine_options(asynchronous: bool = False) -> dict[str, Any]:
+    """Get the engine keyword arguments set in the [DATABASE] settings.
+
+    Args:
+        asynchronous (bool):
+            Whether the options are for an asyncpg engine instead of
+            a psycopg2 one, the drivers take session settings differently.
+    """
+    options: dict[str, Any] = {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+    }
+    if STATEMENT_TIMEOUT_MS > 0:
+        timeout = str(STATEMENT_TIMEOUT_MS)
+        if asynchronous:
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+class PoolMonitor:
+    """Tracks the connection pool of an engine through pool events.
+
+    The checkout wait is the time a DB context waits for its connection:
+    waiting for a connection to be returned to the pool, or for a new
+    one to be opened. Overflow checkouts are checkouts made while more
+    than 'pool_size' connections are in use.
+    """
+
+    def __init__(self, sample_size: int = 1000) -> None:
+        self.pool: QueuePool | None = None
+        self.connects = 0
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self._waits: deque[float] = deque(maxlen=sample_size)
+
+    def attach(self, engine: Engine) -> None:
+        """Start tracking the pool of a (sync) engine."""
+        if isinstance(engine.pool, QueuePool):
+            self.pool = engine.pool
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, *_: Any) -> None:
+        self.connects += 1
+
+    def _on_checkout(self, *_: Any) -> None:
+        self.checkouts += 1
+        pool = self.pool
+        if pool is not None and pool.checkedout() > pool.size():
+            self.overflow_checkouts += 1
+
+    def _on_invalidate(self, *_: Any) -> None:
+        self.invalidations += 1
+
+    @contextmanager
+    def measure_checkout(self) -> Iterator[None]:
+        """Time the checkout of a connection within the context."""
+        start = time.perf_counter()
+        try:
+            yield
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        self._waits.append(time.perf_counter() - start)
+
+    def statistics(self) -> dict[str, int | float | None]:
+        """Get the current pool usage & counters, with recent waits."""
+        waits = sorted(self._waits)
+        usage: dict[str, int | None] = dict.fromkeys(
+            ("pool_size", "checked_out", "idle", "overflow"))
+        if (pool := self.pool) is not None:
+            usage = {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                # Negative while fewer than pool_size connections exist
+                "overflow": max(0, pool.overflow())}
+        return {
+            **usage,
+            "max_overflow": MAX_OVERFLOW,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "overflow_checkouts": self.overflow_checkouts,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "wait_mean": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
@@ -1,6 +1,6 @@
 """Contains Pydantic schema definitions."""
 from typing import TypeVar, Generic
-from datetime import datetime
+from datetime import datetime, timezone
 
 import pydantic
 
@@ -79,11 +79,9 @@ class ProductDB(Product, Generic[ProductDataT]):
 
 
 class ProductData(pydantic.BaseModel):
-    """ProductData schema."""
-    eur_unit_price_whole: int
-    eur_unit_price_decimal: int
-    eur_cmp_price_whole: int
-    eur_cmp_price_decimal: int
+    """ProductData schema, prices are in integer cents."""
+    unit_price_cents: int
+    cmp_price_cents: int
     label_unit: str
     comparison_unit: str
 
@@ -91,6 +89,17 @@ class ProductData(pydantic.BaseModel):
         from_attributes=True)
 
 
+class ProductDataSnapshot(ProductData):
+    """ProductData read back from the DB, with the time it was saved."""
+    timestamp: datetime
+
+    @pydantic.computed_field  # type: ignore[misc]
+    @property
+    def age(self) -> float:
+        """Seconds since the data was saved."""
+        return (datetime.now(timezone.utc) - self.timestamp).total_seconds()
+
+
 class ProductDataDB(ProductData):
     """Complete schema for ProductData, equivalent to DB ProductData Model"""
     id: int
@@ -106,9 +115,19 @@ class ProductDataDB(ProductData):
 
 
 class ProductQuery(pydantic.BaseModel):
-    """Schema for how product searches should look like."""
+    """Schema for how product searches should look like.
+
+    With 'deep_fetch' set, results are fetched beyond the first page,
+    up to 'max_pages' pages per (store, query) pair. All the requests
+    together are still limited by [API] max_requests_per_query.
+    With 'timeout_ms' set, the search answers within that many
+    milliseconds with the results it has by then.
+    """
     stores: set[int]
     queries: list[dict[str, str]]
+    deep_fetch: bool = False
+    max_pages: int = pydantic.Field(default=4, ge=1)
+    timeout_ms: int | None = pydantic.Field(default=None, gt=0)
 
     model_config = pydantic.ConfigDict(
         from_attributes=True,
@@ -1,10 +1,15 @@
 """Parsing functions for parsing/modifying various responses/strings."""
 import re
 import json
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Annotated, NotRequired, Sequence, TypedDict
 import httpx
 import pydantic
 
+from backend.app.api.skaupat.query_utils import BatchAliasT
 from backend.app.core.orm import schemas
+from backend.app.core.typedefs import ProductSearchResultT
+from backend.app.core.typedefs import ProductQueryResultT
 from backend.app.utils.logging import LoggerManager
 
 logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
@@ -89,8 +94,9 @@ def prepare_response_dict(response: httpx.Response | None) -> dict | None:
     if response is None:
         return None
     try:
-        content = json.loads(response.text)
-    except json.JSONDecodeError:
+        # Decoding the bytes to str first is left to the json module
+        content = json.loads(response.content)
+    except (json.JSONDecodeError, UnicodeDecodeError):
         return None
     return content
 
@@ -113,6 +119,8 @@ def parse_store_response(
             Returns a list of pydantic StoreBase instances.
             Returns None if an error occurred during parsing.
     """
+    if (stores := parse_store_response_fast(response)) is not None:
+        return stores
     content = prepare_response_dict(response)
     if content is None:
         logger.debug(
@@ -145,6 +153,76 @@ def parse_store_response(
     return stores
 
 
+def parse_store_response_fast(
+        response: httpx.Response | None) -> list[schemas.Store] | None:
+    """Parse stores by validating the whole response body in one pass.
+
+    Validates straight from the response bytes into schemas.Store
+    instances (see StoreResponse). If any part of the response fails
+    validation, returns None so that the caller can fall back to the
+    lenient item-by-item path.
+    """
+    if response is None:
+        return None
+    try:
+        envelope = STORE_RESPONSE.validate_json(response.content)
+    except pydantic.ValidationError:
+        logger.debug("Bulk store validation failed, parsing leniently.")
+        return None
+    stores: list[schemas.Store] = \
+        envelope["data"]["searchStores"]["stores"]  # type: ignore
+    stores.sort(key=lambda i: i.store_name)
+    return stores
+
+
+def parse_store_page(
+        response: httpx.Response,
+        query: str | None
+        ) -> tuple[list[schemas.Store] | None, str | None, int | None]:
+    """Parse a single page of a paginated store search.
+
+    Args:
+        response (httpx.Response):
+            Response instance received from the API.
+        query (str | None):
+            The query string that resulted in the response.
+            Used for creating logging messages.
+
+    Returns:
+        tuple[list[schemas.Store] | None, str | None, int | None]:
+            The stores of the page (None if they could not be parsed),
+            the cursor to the next page (None on the last page)
+            and the total count of stores matching the search.
+    """
+    try:
+        envelope = STORE_RESPONSE.validate_json(response.content)
+    except pydantic.ValidationError:
+        stores = parse_store_response(response, str(query))
+        content = prepare_response_dict(response) or {}
+        page = (content.get("data") or {}).get("searchStores") or {}
+        return stores, page.get("cursor"), page.get("totalCount")
+    page = envelope["data"]["searchStores"]
+    return (
+        page["stores"],  # type: ignore
+        page.get("cursor"),
+        page.get("totalCount"))
+
+
+def price_to_cents(price: float | str) -> int:
+    """Convert a price in euros into integer cents.
+
+    Half a cent & more rounds up, e.g. 1.05 -> 105 & 1.5 -> 150.
+
+    Raises:
+        ValueError: If the price is not a finite number.
+    """
+    try:
+        return int(
+            (Decimal(str(price)) * 100).to_integral_value(ROUND_HALF_UP))
+    except (ArithmeticError, ValueError) as err:
+        raise ValueError(f"Invalid price: {price!r}") from err
+
+
 def parse_product_to_schema(
         data: dict) -> tuple[schemas.Product, schemas.ProductData] | None:
     """Parse a product item dict into two pydantic product schemas.
@@ -165,18 +243,14 @@ def parse_product_to_schema(
             slug=data["slug"],
             brand=data["brandName"],
         )
-        unit_prices_eur = str(float(data["price"])).split(".")
-        cmp_prices_eur = str(float(data["comparisonPrice"])).split(".")
-
         product_data = schemas.ProductData(
-            eur_unit_price_whole=int(unit_prices_eur[0]),
-            eur_unit_price_decimal=int(unit_prices_eur[1]),
-            eur_cmp_price_whole=int(cmp_prices_eur[0]),
-            eur_cmp_price_decimal=int(cmp_prices_eur[1]),
+            unit_price_cents=price_to_cents(data["price"]),
+            cmp_price_cents=price_to_cents(data["comparisonPrice"]),
             label_unit=reformat_unit_string(data["basicQuantityUnit"]),
             comparison_unit=reformat_unit_string(data["comparisonUnit"]),
         )
-    except (KeyError, TypeError, pydantic.ValidationError) as err:
+    except (KeyError, TypeError, ValueError,
+            pydantic.ValidationError) as err:
         logger.debug("Failed to validate a product schema: %s", err)
     else:
         return product, product_data
@@ -218,26 +292,101 @@ def parse_product_response(
         The second item is a list with all the parsed product items inside it.
         Each parsed item is a tuple containing two different pydantic schemas.
     """
+    if (result := parse_product_response_fast(response, query)) is not None:
+        return result
+    if (content := prepare_response_dict(response)) is None:
+        return build_product_details(query), []
+    try:
+        store = content["data"]["store"]
+    except (KeyError, TypeError) as err:
+        logger.debug(err)
+        return build_product_details(query), []
+    return parse_product_store(store=store, query=query)
+
+
+def parse_product_response_fast(
+        response: httpx.Response | None,
+        query: dict[str, str]
+        ) -> ProductQueryResultT | None:
+    """Parse product items by validating the whole body in one pass.
+
+    Validates straight from the response bytes into pairs of product
+    schemas (see ProductResponse). If any part of the response fails
+    validation, returns None so that the caller can fall back to the
+    lenient item-by-item path of parse_product_response().
+    """
+    if response is None:
+        return None
+    try:
+        envelope = PRODUCT_RESPONSE.validate_json(response.content)
+    except pydantic.ValidationError:
+        logger.debug("Bulk product validation failed, parsing leniently.")
+        return None
+    store = envelope["data"]["store"]
+    details = build_product_details(query)
+    if (total := store["products"].get("total")) is not None:
+        details["total"] = total
+    details["store_id"] = store["id"]
+    if len(items := store["products"]["items"]) == 0:
+        logger.debug(
+            "Key 'items' was empty for store response: ('%s', %s)",
+            store["name"], store["id"])
+        return details, []
+    return details, items  # type: ignore
+
+
+def build_product_details(query: dict[str, str]) -> dict[str, str | int]:
+    """Build the query details dict of a product search result."""
     # Creating new return dict to appease the linter
-    details: dict[str, str | int] = {
+    return {
         "query": query["query"],
         "category": query["category"]
     }
-    if (content := prepare_response_dict(response)) is None:
-        return details, []
+
+
+def parse_product_store(
+        store: dict,
+        query: dict[str, str],
+        products_key: str = "products"
+        ) -> tuple[
+            dict[str, str | int],
+            list[
+                tuple[
+                    schemas.Product,
+                    schemas.ProductData
+                ]
+            ]
+        ]:
+    """Parse product items from the 'store' object of a response.
+
+    Args:
+        store (dict):
+            The (possibly aliased) 'store' object of a response.
+        query (dict[str, str]):
+            A dict containing the store id, query string & query category.
+        products_key (str, optional):
+            The (possibly aliased) key of the products field.
+            Defaults to "products".
+
+    Returns:
+        tuple[...]: See parse_product_response().
+    """
+    details = build_product_details(query)
     try:
-        response_items = content["data"]["store"]["products"]["items"]
-        store_name = content["data"]["store"]["name"]
-        store_id = content["data"]["store"]["id"]
-    except KeyError as err:
+        response_items = store[products_key]["items"]
+        store_name = store["name"]
+        store_id = store["id"]
+    except (KeyError, TypeError) as err:
         logger.debug(err)
         return details, []
+    if isinstance(total := store[products_key].get("total"), int):
+        details["total"] = total
+    details["store_id"] = store_id
     if len(response_items) == 0:
         logger.debug(
             "Key 'items' was empty for store response: ('%s', %s)",
             store_name, store_id)
         return details, []
-    details["store_id"] = store_id
     items: list[tuple[schemas.Product, schemas.ProductData]] = []
     for i in response_items:
         item = parse_product_to_schema(i)
@@ -245,3 +394,133 @@ def parse_product_response(
             continue
         items.append(item)
     return details, items
+
+
+def parse_product_batch_response(
+        response: httpx.Response | None,
+        aliases: Sequence[BatchAliasT]
+        ) -> tuple[ProductSearchResultT, list[BatchAliasT]]:
+    """Split a batched product search response into per-pair results.
+
+    A pair is considered failed if the response contains an error
+    for the pair's aliased fields, or if its fields are missing.
+    An empty list of items is not considered a failure.
+
+    Args:
+        response (httpx.Response | None):
+            The response to a query built by build_product_batch_query().
+        aliases (Sequence[BatchAliasT]):
+            The aliases returned by build_product_batch_query().
+
+    Returns:
+        tuple[ProductSearchResultT, list[BatchAliasT]]:
+            The results of the pairs that could be parsed,
+            and the aliases of the pairs that failed.
+    """
+    if (content := prepare_response_dict(response)) is None:
+        return [], list(aliases)
+    data = content.get("data") or {}
+    failed_paths: set[tuple[str, ...]] = set()
+    for error in content.get("errors") or []:
+        # Only the store & products aliases of the path are relevant
+        failed_paths.add(tuple(str(i) for i in error.get("path") or [])[:2])
+    results: ProductSearchResultT = []
+    failed: list[BatchAliasT] = []
+    for alias in aliases:
+        store_alias, products_alias, _, query = alias
+        store = data.get(store_alias)
+        if store is None \
+                or (store_alias,) in failed_paths \
+                or (store_alias, products_alias) in failed_paths \
+                or store.get(products_alias) is None:
+            failed.append(alias)
+            continue
+        results.append(parse_product_store(
+            store=store, query=query, products_key=products_alias))
+    if failed:
+        logger.debug(
+            "%s out of %s pair(s) failed in batched response.",
+            len(failed), len(aliases))
+    return results, failed
+
+
+# ---- BULK VALIDATION MODELS ----
+# Describe the shape of whole API responses, so that a response can be
+# validated straight from bytes in one pass. The item models subclass
+# the app schemas & read their fields from the API field names, so the
+# validated items can be used as is.
+
+PriceCents = Annotated[int, pydantic.BeforeValidator(price_to_cents)]
+Unit = Annotated[str, pydantic.BeforeValidator(reformat_unit_string)]
+
+
+class ProductItem(schemas.Product):
+    """schemas.Product validated from a GetProductByName item."""
+    category: str = pydantic.Field(
+        validation_alias=pydantic.AliasPath("hierarchyPath", 0, "name"))
+    brand: str = pydantic.Field(validation_alias="brandName")
+
+
+class ProductDataItem(schemas.ProductData):
+    """schemas.ProductData validated from a GetProductByName item."""
+    unit_price_cents: PriceCents = pydantic.Field(validation_alias="price")
+    cmp_price_cents: PriceCents = pydantic.Field(
+        validation_alias="comparisonPrice")
+    label_unit: Unit = pydantic.Field(validation_alias="basicQuantityUnit")
+    comparison_unit: Unit = pydantic.Field(validation_alias="comparisonUnit")
+
+
+# Both schemas of a pair are validated from the same item dict
+ProductPair = Annotated[
+    tuple[ProductItem, ProductDataItem],
+    pydantic.BeforeValidator(lambda item: (item, item))]
+
+
+class ProductItems(TypedDict):
+    """The products field of a GetProductByName response."""
+    items: list[ProductPair]
+    total: NotRequired[int | None]
+
+
+class ProductStore(TypedDict):
+    """The store field of a GetProductByName response."""
+    name: str
+    id: str
+    products: ProductItems
+
+
+class ProductData(TypedDict):
+    """The data field of a GetProductByName response."""
+    store: ProductStore
+
+
+class ProductResponse(TypedDict):
+    """A complete GetProductByName response."""
+    data: ProductData
+
+
+class StoreItem(schemas.Store):
+    """schemas.Store validated from a StoreSearch store item."""
+    store_name: str = pydantic.Field(validation_alias="name")
+    store_id: int = pydantic.Field(validation_alias="id")
+
+
+class SearchStores(TypedDict):
+    """The searchStores field of a StoreSearch response."""
+    stores: list[StoreItem]
+    totalCount: NotRequired[int]
+    cursor: NotRequired[str | None]
+
+
+class StoreData(TypedDict):
+    """The data field of a StoreSearch response."""
+    searchStores: SearchStores
+
+
+class StoreResponse(TypedDict):
+    """A complete StoreSearch response."""
+    data: StoreData
+
+
+PRODUCT_RESPONSE = pydantic.TypeAdapter(ProductResponse)
+STORE_RESPONSE = pydantic.TypeAdapter(StoreResponse)
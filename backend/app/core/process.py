@@ -1,15 +1,21 @@
 """Contains a process singleton class for managing the application."""
 import os
 import sys
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.app.core import config
+from backend.app.core import store_search
+from backend.app.core import write_buffer
 from backend.app.core.orm import database
+from backend.app.api import request
 from backend.app.api.routes import store as store_route
 from backend.app.api.routes import product as product_route
 from backend.app.api.routes import index as index_route
+from backend.app.api.routes import stats as stats_route
 from backend.app.utils import patterns
 from backend.app.utils import exceptions
 from backend.app.utils.logging import LoggerManager
@@ -20,6 +26,22 @@ load_dotenv()  # Load environment variables from .env file
 DEBUG = bool(config.parser["APP"]["debug"])
 
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Open shared resources on startup & close them on shutdown."""
+    await request.open_client()
+    write_buffer.buffer.start()
+    try:
+        yield
+    finally:
+        # A store catalog ingestion would keep fetching until finished
+        await store_search.ingestion.close()
+        # Drained first, the background saves may still be adding to it
+        await write_buffer.buffer.close()
+        await request.close_client()
+        await database.AsyncDBContext.dispose()
+
+
 class Process(metaclass=patterns.SingletonMeta):
     """Singleton for managing the execution of the entire app."""
     postgres_user: str
@@ -27,7 +49,7 @@ class Process(metaclass=patterns.SingletonMeta):
     postgres_db: str
     postgres_port: str | None
     container: bool = False
-    app: FastAPI = FastAPI()
+    app: FastAPI = FastAPI(lifespan=lifespan)
 
     def __init__(self) -> None:
         """Fetch environment variables & include FastAPI routers"""
@@ -54,6 +76,7 @@ class Process(metaclass=patterns.SingletonMeta):
         self.app.include_router(index_route.router)
         self.app.include_router(store_route.router)
         self.app.include_router(product_route.router)
+        self.app.include_router(stats_route.router)
 
         # Enable CORS for frontend
         origins = ["http://localhost:5173"]
@@ -75,6 +98,8 @@ class Process(metaclass=patterns.SingletonMeta):
         else:
             database.DBContext.prepare_context(
                 url=self.create_database_url())
+        database.AsyncDBContext.prepare_context(
+            url=self.create_database_url())
         logger.info("FastAPI statup complete.")
 
     def create_database_url(self) -> str:
@@ -1,69 +1,592 @@
+import math
+import time
 import asyncio
-from typing import Any
+from datetime import timedelta
+from itertools import batched
+from typing import Any, AsyncIterator, Sequence
+
+from fastapi import BackgroundTasks
+from sqlalchemy.exc import SQLAlchemyError
 
 from backend.app.api import request
+from backend.app.api import breaker
+from backend.app.api import cache
+from backend.app.api import coalesce
 from backend.app.api.skaupat import query_utils
 
+from backend.app.core import config
+from backend.app.core import freshness
 from backend.app.core import parse
-from backend.app.core import tasks
+from backend.app.core import query_plan
+from backend.app.core import write_buffer
 from backend.app.core.search_context import SearchContext
+from backend.app.core.search_context import SearchState
 from backend.app.core.orm import schemas
+from backend.app.core.orm import async_crud
 from backend.app.core.typedefs import ProductSearchResultT
+from backend.app.core.typedefs import ProductQueryResultT
 
+from backend.app.utils import deadline
 from backend.app.utils import patterns
 from backend.app.utils.logging import LoggerManager
 
 
 logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
 
+# Max (store, query) pairs per batched request, 1 or less disables batching
+PRODUCT_BATCH_SIZE = int(config.parser["API"]["product_batch_size"])
+MAX_REQUESTS_PER_QUERY = int(config.parser["API"]["max_requests_per_query"])
+DEEP_FETCH_MAX_PAGES = int(config.parser["API"]["deep_fetch_max_pages"])
+# Concurrent DB lookups per search, see DBProductSearchStrategy
+DB_LOOKUP_CONCURRENCY = config.parser["DATABASE"].getint(
+    "lookup_concurrency")
+# How old saved product data the /products/ endpoint may serve
+PRODUCTS_POLICY = freshness.create_policy("products")
+
+# Seconds after which a refresh that never finished may be scheduled again
+REFRESH_TIMEOUT = config.parser["FRESHNESS"].getfloat("refresh_timeout")
+
+# Request keys of the pairs with a background refresh pending or running,
+# with the time the refresh was scheduled at
+refreshing: dict[str, float] = {}
+
 
 # TODO: Might do good with some refactoring in this file
 
 
 class DBProductSearchStrategy(patterns.Strategy):
+    """Answer product searches from the product data saved in the DB.
+
+    With a freshness policy, a pair is answered from the data saved for
+    that exact query if the policy allows serving data of its age. Stale
+    data that is served gets refreshed in the background. Other pairs
+    are returned as failed, so that they can be sent on to the API.
+    Without a policy, the latest data of any matching products is
+    served regardless of its age, used while the API is unavailable.
+    The pairs are looked up concurrently, at most [DATABASE]
+    lookup_concurrency at a time. Pairs that the deadline leaves
+    no time for are returned as failed.
+    """
+
+    def __init__(
+            self,
+            policy: freshness.FreshnessPolicy | None = PRODUCTS_POLICY
+            ) -> None:
+        self.policy = policy
 
     @staticmethod
-    async def execute(context: SearchContext) -> None:
-        # TODO: This function
-        pass
+    async def execute(
+            context: SearchContext
+            ) -> tuple[ProductSearchResultT, ProductSearchResultT]:
+        user_query: schemas.ProductQuery = context.query
+        policy: freshness.FreshnessPolicy | None = context.strategy.policy
+        limit = query_utils.PRODUCT_PAGE_LIMIT
+        if user_query.deep_fetch:
+            limit *= min(user_query.max_pages, DEEP_FETCH_MAX_PAGES)
+        successful_queries: ProductSearchResultT = []
+        failed_queries: ProductSearchResultT = []
+        stale_pairs: list[tuple[int, dict[str, str]]] = []
+        pairs = build_pairs(context)
+        semaphore = asyncio.Semaphore(DB_LOOKUP_CONCURRENCY)
+        lookups = await asyncio.gather(*(
+            select_saved_products(
+                store_id=store_id, query=query, policy=policy, limit=limit,
+                semaphore=semaphore)
+            for store_id, query in pairs))
+        for (store_id, query), items in zip(pairs, lookups):
+            details = parse.build_product_details(query)
+            details["store_id"] = store_id
+            if len(items) == 0:
+                failed_queries.append((details, []))
+                continue
+            age = min(item[1].age for item in items)
+            if policy is not None:
+                if not policy.servable(age):
+                    failed_queries.append((details, []))
+                    continue
+                if policy.classify(age) is freshness.Freshness.STALE:
+                    stale_pairs.append((store_id, query))
+            details["source"] = "db"
+            details["age"] = round(age, 1)
+            successful_queries.append((details, items))
+        if stale_pairs:
+            schedule_refresh(context=context, pairs=stale_pairs)
+        logger.info("DB: Got results for %s out of %s queries, %s stale.",
+                    len(successful_queries),
+                    len(successful_queries) + len(failed_queries),
+                    len(stale_pairs))
+        return successful_queries, failed_queries
+
+
+async def select_saved_products(
+        store_id: int, query: dict[str, str],
+        policy: freshness.FreshnessPolicy | None, limit: int,
+        semaphore: asyncio.Semaphore
+        ) -> list[tuple[schemas.Product, schemas.ProductDataSnapshot]]:
+    """Get the product data saved for a pair, see DBProductSearchStrategy.
+
+    Waits for the semaphore before checking out a connection. Returns
+    an empty list if the deadline passes first or the query failed.
+    """
+    if deadline.expired():
+        return []
+    try:
+        # Also bounds the waits for the semaphore & the pool
+        async with asyncio.timeout(deadline.remaining()), semaphore:
+            if policy is None:
+                return await async_crud.get_latest_store_products(
+                    store_id=store_id,
+                    name=query["query"],
+                    category=query["category"],
+                    limit=limit)
+            return await async_crud.get_fresh_query_products(
+                store_id=store_id,
+                query_key=query_utils.build_query_key(query),
+                max_age=timedelta(seconds=policy.hard_max_age),
+                limit=limit)
+    except TimeoutError:
+        logger.info("DB: Deadline exceeded for store %s.", store_id)
+        return []
+    except SQLAlchemyError as err:
+        # E.g. a pool timeout, or cancelled by the statement_timeout
+        logger.warning("DB: Query for store %s failed: %s", store_id, err)
+        return []
 
 
 class APIProductSearchStrategy(patterns.Strategy):
+    """Answer product searches from the response cache & the API.
+
+    See fetch_product_results(), which is also used to stream the
+    results of a search. Results are returned in the order of the
+    pairs, with the queries as they were given. Pairs still unanswered
+    when the deadline runs out are listed in the context's 'incomplete'
+    pairs, the rest of the results are returned as usual.
+    """
+    operations = (
+        query_utils.Operation.PRODUCT_SEARCH.value,
+        query_utils.Operation.PRODUCT_BATCH_SEARCH.value)
 
     @staticmethod
     async def execute(
             context: SearchContext
             ) -> tuple[ProductSearchResultT, ProductSearchResultT]:
-        async_tasks = []
-        user_query: schemas.ProductQuery = context.query
-        for store_id in user_query.stores:
-            for query in user_query.queries:
-                params = query_utils.build_request_params(
-                    method="post",
-                    operation=query_utils.Operation.PRODUCT_SEARCH,
-                    variables=query_utils.build_product_search_vars(
-                        store_id=store_id, query=query),
-                    timeout=10)
-                logger.debug(
-                    "Creating task for: (store_id: %s, query: %s)",
-                    store_id, query)
-                async_tasks.append(asyncio.create_task(
-                    send_product_query(query=query, params=params)))
-        results = await asyncio.gather(*async_tasks)
-        successful_queries = []
-        failed_queries = []
-        for result in results:
-            if len(result[1]) == 0:
-                failed_queries.append(result)
-            else:
-                successful_queries.append(result)
-        context.background_tasks.add_task(
-            tasks.save_product_results, results=successful_queries)
+        pairs = build_pairs(context)
+        successful_queries: ProductSearchResultT = []
+        failed_queries: ProductSearchResultT = []
+        async for state, result in fetch_product_results(
+                query=context.query, pairs=pairs,
+                background_tasks=context.background_tasks,
+                timeout=deadline.remaining()):
+            match state:
+                case SearchState.SUCCESS:
+                    successful_queries.append(result)
+                case SearchState.TIMEOUT:
+                    context.incomplete.append(result_pair(result))
+                case _:
+                    failed_queries.append(result)
+        # Results are fetched in the order they complete
+        positions: dict[tuple[int, str, str], int] = {}
+        for index, (store_id, query) in enumerate(pairs):
+            positions.setdefault(
+                (store_id, query["query"], query["category"]), index)
+
+        def position(result: ProductQueryResultT) -> int:
+            store_id, query = result_pair(result)
+            return positions.get(
+                (store_id, query["query"], query["category"]), len(pairs))
+
+        successful_queries.sort(key=position)
+        failed_queries.sort(key=position)
         return successful_queries, failed_queries
 
 
+def create_pair_tasks(
+        pairs: Sequence[tuple[int, dict[str, str]]]
+        ) -> dict[
+            asyncio.Task[ProductSearchResultT],
+            Sequence[tuple[int, dict[str, str]]]]:
+    """Create tasks fetching the first page of results of each pair.
+
+    Pairs are sent in batches of PRODUCT_BATCH_SIZE, or each
+    on its own if batching is disabled or there is only one pair.
+    Each task returns the results of the pairs it was given.
+
+    Returns:
+        dict[asyncio.Task, Sequence[tuple[int, dict[str, str]]]]:
+            The created tasks & the pairs given to each of them.
+    """
+    async_tasks: dict[
+        asyncio.Task[ProductSearchResultT],
+        Sequence[tuple[int, dict[str, str]]]] = {}
+    if PRODUCT_BATCH_SIZE > 1 and len(pairs) > 1:
+        for batch in batched(pairs, PRODUCT_BATCH_SIZE):
+            logger.debug("Creating batched task for %s pair(s)",
+                         len(batch))
+            async_tasks[asyncio.create_task(
+                send_product_batch(pairs=batch))] = batch
+    else:
+        for store_id, query in pairs:
+            logger.debug(
+                "Creating task for: (store_id: %s, query: %s)",
+                store_id, query)
+            async_tasks[asyncio.create_task(
+                send_pair_queries(pairs=[(store_id, query)]))] = \
+                [(store_id, query)]
+    return async_tasks
+
+
+async def send_pairs(
+        pairs: Sequence[tuple[int, dict[str, str]]]
+        ) -> tuple[ProductSearchResultT, list[tuple[int, dict[str, str]]]]:
+    """Fetch the first page of results of each (store id, query) pair.
+
+    Returns:
+        tuple[ProductSearchResultT, list[tuple[int, dict[str, str]]]]:
+            The results of the pairs answered by the current deadline
+            (see utils.deadline), and the pairs that were not. Pairs
+            left without items once the deadline has passed count as
+            not answered, as their requests may have been cut short.
+    """
+    async_tasks = create_pair_tasks(pairs=pairs)
+    if not async_tasks:
+        return [], []
+    done, pending = await asyncio.wait(
+        async_tasks, timeout=deadline.remaining())
+    for task in pending:
+        task.cancel()
+    incomplete = [pair for task in pending for pair in async_tasks[task]]
+    results: ProductSearchResultT = []
+    for task in done:
+        for result in task.result():
+            if len(result[1]) == 0 and deadline.expired():
+                incomplete.append(result_pair(result))
+            else:
+                results.append(result)
+    if incomplete:
+        logger.info("Deadline exceeded, %s out of %s pair(s) incomplete.",
+                    len(incomplete), len(pairs))
+    return results, incomplete
+
+
+async def fetch_product_results(
+        query: schemas.ProductQuery,
+        pairs: Sequence[tuple[int, dict[str, str]]],
+        background_tasks: BackgroundTasks,
+        timeout: float | None = None
+        ) -> AsyncIterator[tuple[SearchState, ProductQueryResultT]]:
+    """Answer pairs from the response cache & the API as results complete.
+
+    The pipeline shared by /products/ (see APIProductSearchStrategy)
+    & /products/stream/. The pairs are planned first (see
+    core.query_plan), so that each distinct search is only fetched once
+    & results are yielded for every pair, with its query as it was
+    given. Batched pairs complete together. With deep fetching, extra
+    pages are handed out from the request budget as first pages come
+    in, and a result is yielded once its extra pages are merged. The
+    fetched results are saved in the background once the search ends,
+    cached results only by their extra items.
+
+    With a timeout, the search ends 'timeout' seconds after it started.
+    Pairs still unanswered by then are yielded without items, results
+    still waiting on extra pages are yielded with their first page.
+
+    Yields:
+        tuple[SearchState, ProductQueryResultT]:
+            SUCCESS, FAIL or TIMEOUT for the pair, and its result.
+    """
+    loop = asyncio.get_running_loop()
+    expires = None if timeout is None else loop.time() + timeout
+
+    def time_left() -> float | None:
+        return None if expires is None else max(0.0, expires - loop.time())
+
+    def failure_state() -> SearchState:
+        if expires is not None and loop.time() >= expires:
+            return SearchState.TIMEOUT
+        return SearchState.FAIL
+
+    plan = plan_pairs(pairs)
+    logger.debug("Got %s cached result(s), fetching %s pair(s).",
+                 len(plan.results), len(plan.fetches))
+    max_pages = min(query.max_pages, DEEP_FETCH_MAX_PAGES)
+    budget = MAX_REQUESTS_PER_QUERY - len(plan.fetches)
+    # Saved once the search ends, cached results only by their extra items
+    fetched: ProductSearchResultT = []
+    # The deep fetches, with the first page each one extends & whether
+    # that page came from the cache
+    extra_tasks: dict[
+        asyncio.Task, tuple[ProductQueryResultT, bool]] = {}
+
+    def fetch_extra(
+            result: ProductQueryResultT, cached: bool) -> asyncio.Task | None:
+        """Start fetching the extra pages of a result, if it has any."""
+        nonlocal budget
+        if not query.deep_fetch or budget <= 0:
+            return None
+        if (pages := min(budget, count_remaining_pages(
+                result, max_pages))) <= 0:
+            return None
+        budget -= pages
+        # Tasks copy the current context & with it, the deadline
+        with deadline.scope(time_left()):
+            task = asyncio.create_task(fetch_remaining_pages(result, pages))
+        extra_tasks[task] = (result, cached)
+        return task
+
+    with deadline.scope(time_left()):
+        async_tasks = create_pair_tasks(pairs=plan.fetches)
+    pending = set(async_tasks)
+    try:
+        for result in plan.results.values():
+            if (task := fetch_extra(result, cached=True)) is not None:
+                pending.add(task)
+                continue
+            for resolved in plan.resolve([result]):
+                yield SearchState.SUCCESS, resolved
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=time_left(),
+                return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task in extra_tasks:
+                    (details, items), cached = extra_tasks[task]
+                    extra = task.result()
+                    result = (details, merge_product_items(items, extra))
+                    if not cached:
+                        fetched.append(result)
+                    elif extra:
+                        fetched.append((details, extra))
+                    for resolved in plan.resolve([result]):
+                        yield SearchState.SUCCESS, resolved
+                    continue
+                for details, items in task.result():
+                    if len(items) == 0:
+                        for resolved in plan.resolve([(details, items)]):
+                            yield failure_state(), resolved
+                        continue
+                    details["source"] = "api"
+                    details["age"] = 0.0
+                    if (extra_task := fetch_extra(
+                            (details, items), cached=False)) is not None:
+                        pending.add(extra_task)
+                        continue
+                    fetched.append((details, items))
+                    for resolved in plan.resolve([(details, items)]):
+                        yield SearchState.SUCCESS, resolved
+        for task in pending:
+            if task in extra_tasks:
+                logger.info("Deadline exceeded, skipping extra pages.")
+                result, cached = extra_tasks[task]
+                if not cached:
+                    fetched.append(result)
+                for resolved in plan.resolve([result]):
+                    yield SearchState.SUCCESS, resolved
+                continue
+            for store_id, pair_query in plan.originals(async_tasks[task]):
+                yield SearchState.TIMEOUT, (
+                    {**parse.build_product_details(pair_query),
+                     "store_id": store_id}, [])
+    finally:
+        for task in [*async_tasks, *extra_tasks]:
+            task.cancel()
+        if fetched:
+            background_tasks.add_task(
+                write_buffer.buffer.add_product_results, results=fetched)
+
+
+async def search_saved_products(
+        query: schemas.ProductQuery, background_tasks: BackgroundTasks,
+        timeout: float | None = None
+        ) -> tuple[ProductSearchResultT, list[tuple[int, dict[str, str]]]]:
+    """Answer the pairs of a product search that the DB can answer.
+
+    The first step of the /products/ & /products/stream/ searches,
+    see DBProductSearchStrategy.
+
+    Returns:
+        tuple[ProductSearchResultT, list[tuple[int, dict[str, str]]]]:
+            The results served from the DB & the pairs left to fetch.
+    """
+    fresh, stale = await SearchContext(
+        strategy=DBProductSearchStrategy()
+    ).execute(query=query, tasks=background_tasks, timeout=timeout)
+    return fresh, [result_pair(result) for result in stale]
+
+
+def create_fetch_context() -> SearchContext:
+    """Create the context that fetches the pairs the DB could not answer.
+
+    The API is used, unless its circuit is open. Then the search fails
+    fast & serves whatever the DB has instead, regardless of its age.
+    """
+    context = SearchContext(strategy=APIProductSearchStrategy())
+    if context.circuit_open():
+        context = SearchContext(
+            strategy=DBProductSearchStrategy(policy=None))
+    return context
+
+
+async def stream_product_search(
+        query: schemas.ProductQuery, background_tasks: BackgroundTasks,
+        timeout: float | None = None
+        ) -> AsyncIterator[tuple[SearchState, ProductQueryResultT]]:
+    """Search for products, yielding each pair's result once it is ready.
+
+    Follows the /products/ route: pairs are answered from the DB first,
+    then from the response cache & the API. API requests are yielded
+    in the order they complete, so the first results do not wait on
+    the slowest store. Batched pairs complete together. With deep
+    fetching, a result is yielded once its extra pages are merged,
+    while the results of other pairs keep streaming.
+
+    With a timeout, the search ends 'timeout' seconds after it started.
+    Pairs still unanswered by then are yielded without items, results
+    still waiting on extra pages are yielded with their first page.
+
+    Yields:
+        tuple[SearchState, ProductQueryResultT]:
+            SUCCESS, FAIL or TIMEOUT for the pair, and its result.
+    """
+    loop = asyncio.get_running_loop()
+    expires = None if timeout is None else loop.time() + timeout
+
+    def time_left() -> float | None:
+        return None if expires is None else max(0.0, expires - loop.time())
+
+    def failure_state() -> SearchState:
+        if expires is not None and loop.time() >= expires:
+            return SearchState.TIMEOUT
+        return SearchState.FAIL
+
+    fresh, pairs = await search_saved_products(
+        query=query, background_tasks=background_tasks, timeout=time_left())
+    for result in fresh:
+        yield SearchState.SUCCESS, result
+    if len(pairs) == 0:
+        return
+    context = create_fetch_context()
+    if not isinstance(context.strategy, APIProductSearchStrategy):
+        successful, failed = await context.execute(
+            query=query, tasks=background_tasks, pairs=pairs,
+            timeout=time_left())
+        for result in successful:
+            yield SearchState.SUCCESS, result
+        for result in failed:
+            yield failure_state(), result
+        return
+
+    async for state, result in fetch_product_results(
+            query=query, pairs=pairs, background_tasks=background_tasks,
+            timeout=time_left()):
+        yield state, result
+
+
+def schedule_refresh(
+        context: SearchContext,
+        pairs: Sequence[tuple[int, dict[str, str]]]) -> None:
+    """Schedule a background refresh of the given pairs.
+
+    Pairs that already have a refresh pending or running are skipped,
+    so that concurrent searches for the same stale data only cause
+    a single refresh. A scheduled refresh may never run, e.g. if the
+    client disconnects first, so pairs are skipped for REFRESH_TIMEOUT
+    seconds at most.
+    """
+    now = time.monotonic()
+    for key in [key for key, scheduled in refreshing.items()
+                if now - scheduled >= REFRESH_TIMEOUT]:
+        del refreshing[key]
+    pending = []
+    for store_id, query in pairs:
+        key = build_pair_key(store_id=store_id, query=query)
+        if key not in refreshing:
+            refreshing[key] = now
+            pending.append((store_id, query))
+    if pending:
+        logger.debug("Scheduling refresh of %s stale pair(s).", len(pending))
+        context.background_tasks.add_task(refresh_pairs, pairs=pending)
+
+
+async def refresh_pairs(
+        pairs: Sequence[tuple[int, dict[str, str]]]) -> None:
+    """Background task for fetching & saving the results of stale pairs."""
+    try:
+        if breaker.upstream.is_open(*APIProductSearchStrategy.operations):
+            logger.info("Circuit open, skipping refresh of %s pair(s).",
+                        len(pairs))
+            return
+        results, _ = await send_pairs(pairs=pairs)
+        results = [result for result in results if len(result[1]) != 0]
+        await write_buffer.buffer.add_product_results(results=results)
+        logger.debug("Refreshed %s out of %s stale pair(s).",
+                     len(results), len(pairs))
+    finally:
+        for store_id, query in pairs:
+            refreshing.pop(
+                build_pair_key(store_id=store_id, query=query), None)
+
+
+def build_pairs(context: SearchContext) -> list[tuple[int, dict[str, str]]]:
+    """Get the (store id, query) pairs that a search should answer.
+
+    These are the pairs given to the context, or otherwise
+    every combination of the stores & queries of the query.
+    """
+    if context.pairs is not None:
+        return list(context.pairs)
+    user_query: schemas.ProductQuery = context.query
+    return [(store_id, query)
+            for store_id in user_query.stores
+            for query in user_query.queries]
+
+
+def result_pair(result: ProductQueryResultT) -> tuple[int, dict[str, str]]:
+    """Get the (store id, query) pair that a result answers."""
+    details, _ = result
+    return (int(details["store_id"]),
+            {"query": str(details["query"]),
+             "category": str(details["category"])})
+
+
+def plan_pairs(
+        pairs: Sequence[tuple[int, dict[str, str]]]
+        ) -> query_plan.ProductSearchPlan:
+    """Plan the fetches of pairs, answering cached pairs from the cache."""
+    return query_plan.planner.plan(pairs=pairs, lookup=lookup_cached_pair)
+
+
+def lookup_cached_pair(
+        pair: tuple[int, dict[str, str]]) -> ProductQueryResultT | None:
+    """Get the cached result of a pair, None if it is not cached."""
+    hit = cache.upstream.get(build_pair_key(*pair))
+    if hit is cache.MISSING:
+        return None
+    details, items = hit
+    return {**details, "source": "cache"}, items
+
+
+def build_pair_key(store_id: int, query: dict[str, str]) -> str:
+    """Build the request key of a single (store id, query) pair."""
+    return query_utils.build_request_key(
+        operation=query_utils.Operation.PRODUCT_SEARCH,
+        variables=query_utils.build_product_search_vars(
+            store_id=store_id, query=query))
+
+
+def cache_product_result(key: str, result: ProductQueryResultT) -> None:
+    """Cache the result of a pair, unless it has no items."""
+    if len(result[1]) != 0:
+        cache.upstream.set(
+            key=key,
+            operation=query_utils.Operation.PRODUCT_SEARCH.value,
+            value=result)
+
+
 async def send_product_query(
-        query: dict[str, str], params: dict[str, Any]
+        query: dict[str, str], params: dict[str, Any],
+        key: str | None = None
         ) -> tuple[
             dict[str, str | int],
             list[
@@ -73,8 +596,155 @@ async def send_product_query(
                 ]
             ]
         ]:
+    """Send a product query & parse the response.
+
+    If a request key is given, the parsed result is cached under it.
+    """
     response = await request.send_request(params=params)
-    return parse.parse_product_response(
+    result = parse.parse_product_response(
         response=response,
         query=query
     )
+    if key is not None:
+        cache_product_result(key=key, result=result)
+    return result
+
+
+async def coalesced_product_query(
+        key: str, query: dict[str, str], params: dict[str, Any],
+        cached: bool = True
+        ) -> ProductQueryResultT:
+    """Send a product query, sharing it with identical in-flight queries.
+
+    The parsed items are shared between the coalesced callers, each
+    caller receives its own copy of the query details dict. If the
+    caller's deadline passes first, the query is returned without
+    items. With 'cached', the result is also cached under the key.
+    """
+    try:
+        details, items = await coalesce.upstream.do(
+            key, lambda: send_product_query(
+                query=query, params=params, key=key if cached else None))
+    except TimeoutError:
+        return parse.parse_product_response(response=None, query=query)
+    return dict(details), items
+
+
+async def send_pair_queries(
+        pairs: Sequence[tuple[int, dict[str, str]]]
+        ) -> ProductSearchResultT:
+    """Send a separate product query for each (store id, query) pair."""
+    async_tasks = []
+    for store_id, query in pairs:
+        variables = query_utils.build_product_search_vars(
+            store_id=store_id, query=query)
+        params = query_utils.build_request_params(
+            method="post",
+            operation=query_utils.Operation.PRODUCT_SEARCH,
+            variables=variables)
+        key = build_pair_key(store_id=store_id, query=query)
+        async_tasks.append(coalesced_product_query(
+            key=key, query=query, params=params))
+    # Failed queries have no store in their response to take the id from
+    return [({**details, "store_id": store_id}, items)
+            for (store_id, _), (details, items)
+            in zip(pairs, await asyncio.gather(*async_tasks))]
+
+
+async def send_product_batch(
+        pairs: Sequence[tuple[int, dict[str, str]]]
+        ) -> ProductSearchResultT:
+    """Send a single batched query for many (store id, query) pairs.
+
+    Pairs that failed within the batched response are retried with
+    a separate query for each pair. If no response was received at
+    all, the pairs are not retried & are returned without items.
+    """
+    _, variables, aliases = \
+        query_utils.build_product_batch_query(pairs=pairs)
+    params = query_utils.build_request_params(
+        method="post",
+        operation=query_utils.Operation.PRODUCT_BATCH_SEARCH,
+        variables=variables,
+        batch_size=len(pairs))
+    key = query_utils.build_request_key(
+        operation=query_utils.Operation.PRODUCT_BATCH_SEARCH,
+        variables=variables)
+    try:
+        response = await coalesce.upstream.do(
+            key, lambda: request.send_request(params=params))
+    except TimeoutError:
+        response = None
+    if response is None:
+        return [({**parse.build_product_details(query), "store_id": store_id},
+                 [])
+                for store_id, query in pairs]
+    results, failed = parse.parse_product_batch_response(
+        response=response, aliases=aliases)
+    failed_ids = {id(alias) for alias in failed}
+    parsed = [alias for alias in aliases if id(alias) not in failed_ids]
+    for (_, _, store_id, query), result in zip(parsed, results):
+        cache_product_result(
+            key=build_pair_key(store_id=store_id, query=query),
+            result=result)
+    if failed:
+        logger.info(
+            "Falling back to separate queries for %s pair(s).", len(failed))
+        results.extend(await send_pair_queries(
+            pairs=[(store_id, query) for _, _, store_id, query in failed]))
+    return results
+
+
+def merge_product_items(
+        *pages: list[tuple[schemas.Product, schemas.ProductData]]
+        ) -> list[tuple[schemas.Product, schemas.ProductData]]:
+    """Merge pages of product items, keeping the first item of each EAN."""
+    seen: set[str] = set()
+    items = []
+    for page in pages:
+        for item in page:
+            if item[0].ean not in seen:
+                seen.add(item[0].ean)
+                items.append(item)
+    return items
+
+
+def count_remaining_pages(result: ProductQueryResultT, max_pages: int) -> int:
+    """Count the pages after the first one that a result has left."""
+    details, items = result
+    total = details.get("total")
+    if len(items) == 0 or not isinstance(total, int) \
+            or total <= len(items):
+        return 0
+    return min(max_pages, math.ceil(
+        total / query_utils.PRODUCT_PAGE_LIMIT)) - 1
+
+
+async def fetch_remaining_pages(
+        result: ProductQueryResultT, pages: int
+        ) -> list[tuple[schemas.Product, schemas.ProductData]]:
+    """Fetch the given amount of pages after the first page of a result.
+
+    The pages are fetched concurrently & coalesced with identical
+    in-flight requests. Unlike first pages, they are not cached.
+    """
+    details, _ = result
+    store_id = int(details["store_id"])
+    query = {"query": str(details["query"]),
+             "category": str(details["category"])}
+    async_tasks = []
+    for page in range(1, pages + 1):
+        variables = query_utils.build_product_search_vars(
+            store_id=store_id, query=query,
+            offset=page * query_utils.PRODUCT_PAGE_LIMIT)
+        params = query_utils.build_request_params(
+            method="post",
+            operation=query_utils.Operation.PRODUCT_SEARCH,
+            variables=variables)
+        key = query_utils.build_request_key(
+            operation=query_utils.Operation.PRODUCT_SEARCH,
+            variables=variables)
+        async_tasks.append(coalesced_product_query(
+            key=key, query=query, params=params, cached=False))
+    return merge_product_items(*(
+        items for _, items in await asyncio.gather(*async_tasks)))
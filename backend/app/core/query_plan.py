@@ -0,0 +1,203 @@
+"""Plan the upstream fetches that answer a product search.
+
+The queries of a ProductQuery are free-form, so the same search may be
+asked for more than once: in a different letter case, with extra
+whitespace, or both with & without a category. Planning canonicalizes
+the (store id, query) pairs of a search into the minimal set of pairs
+to fetch, and maps the results back to the pairs as they were asked.
+"""
+from typing import Callable, Sequence
+
+from backend.app.api.skaupat import query_utils
+from backend.app.core import config
+from backend.app.core.parse import slugify
+from backend.app.core.typedefs import ProductQueryResultT
+from backend.app.core.typedefs import ProductSearchResultT
+from backend.app.utils import LoggerManager
+
+logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
+
+# Answer categorized queries from complete uncategorized results
+DERIVE_CATEGORIES = config.parser["API"].getboolean("plan_derive_categories")
+
+PairT = tuple[int, dict[str, str]]
+PairKeyT = tuple[int, str]
+
+
+def canonicalize_query(query: dict[str, str]) -> dict[str, str]:
+    """Get the canonical form of a product query.
+
+    The query string is case folded & its whitespace collapsed,
+    the category is stripped of surrounding whitespace.
+    """
+    return {"query": " ".join(query["query"].casefold().split()),
+            "category": query["category"].strip()}
+
+
+def build_pair_key(store_id: int, query: dict[str, str]) -> PairKeyT:
+    """Build the key that identical (store id, query) pairs share."""
+    return store_id, query_utils.build_query_key(canonicalize_query(query))
+
+
+def unique_queries(queries: Sequence[dict[str, str]]) -> list[dict[str, str]]:
+    """Get the distinct canonical queries, in order of appearance."""
+    canonical = {}
+    for query in queries:
+        query = canonicalize_query(query)
+        canonical.setdefault(query_utils.build_query_key(query), query)
+    return list(canonical.values())
+
+
+def is_complete(result: ProductQueryResultT) -> bool:
+    """Check if a result holds every product matching its query."""
+    details, items = result
+    total = details.get("total")
+    return isinstance(total, int) and total <= len(items)
+
+
+def filter_category(
+        result: ProductQueryResultT, category: str) -> ProductQueryResultT:
+    """Narrow a result down to the products of a single category."""
+    details, items = result
+    slug = slugify(category)
+    matching = [item for item in items if slugify(item[0].category) == slug]
+    return {**details, "category": category, "total": len(matching)}, matching
+
+
+class ProductSearchPlan:
+    """The minimal set of fetches answering a list of (store id, query) pairs.
+
+    Pairs with the same canonical form are fetched once. Pairs already
+    answered by 'lookup' (e.g. the response cache) are not fetched at
+    all, and with [API] plan_derive_categories set, neither are
+    categorized pairs whose uncategorized variant has a complete
+    result available. Such results are filtered by the category of
+    each item, instead of by the upstream search.
+
+    Attributes:
+        pairs (list[PairT]): The pairs as they were asked.
+        fetches (list[PairT]): The canonical pairs left to fetch.
+        results (dict[PairKeyT, ProductQueryResultT]):
+            The results known without fetching, by pair key.
+        duplicates (int): The amount of pairs sharing another's fetch.
+        derived (int): The amount of pairs answered by filtering.
+    """
+
+    def __init__(
+            self, pairs: Sequence[PairT],
+            lookup: Callable[[PairT], ProductQueryResultT | None]
+            ) -> None:
+        self.pairs = list(pairs)
+        self._groups: dict[PairKeyT, list[int]] = {}
+        unique: list[PairT] = []
+        for index, (store_id, query) in enumerate(self.pairs):
+            key = build_pair_key(store_id, query)
+            if key not in self._groups:
+                self._groups[key] = []
+                unique.append((store_id, canonicalize_query(query)))
+            self._groups[key].append(index)
+        self.duplicates = len(self.pairs) - len(unique)
+        self.derived = 0
+        self.results: dict[PairKeyT, ProductQueryResultT] = {}
+        for pair in unique:
+            if (result := lookup(pair)) is not None:
+                self.results[build_pair_key(*pair)] = result
+        if DERIVE_CATEGORIES:
+            self._derive(unique, lookup)
+        self.fetches = [
+            pair for pair in unique
+            if build_pair_key(*pair) not in self.results]
+
+    def _derive(
+            self, unique: list[PairT],
+            lookup: Callable[[PairT], ProductQueryResultT | None]
+            ) -> None:
+        """Answer categorized pairs from complete uncategorized results."""
+        for store_id, query in unique:
+            key = build_pair_key(store_id, query)
+            if not query["category"] or key in self.results:
+                continue
+            base_pair = (store_id, {"query": query["query"], "category": ""})
+            base = self.results.get(build_pair_key(*base_pair))
+            if base is None:
+                base = lookup(base_pair)
+            if base is not None and is_complete(base):
+                self.results[key] = filter_category(base, query["category"])
+                self.derived += 1
+
+    @property
+    def saved(self) -> int:
+        """The amount of fetches saved by deduplicating & deriving."""
+        return self.duplicates + self.derived
+
+    def originals(self, pairs: Sequence[PairT]) -> list[PairT]:
+        """Get the pairs as they were asked, of the given canonical pairs."""
+        return [
+            self.pairs[index]
+            for store_id, query in pairs
+            for index in self._groups.get(build_pair_key(store_id, query), [])]
+
+    def resolve(self, results: ProductSearchResultT) -> ProductSearchResultT:
+        """Map the results of canonical pairs back to the pairs asked.
+
+        Results are returned in the order of the pairs, each with its
+        own copy of the details & with the query as it was asked.
+        Pairs without a result are left out.
+        """
+        by_key = {
+            build_pair_key(int(details["store_id"]), {
+                "query": str(details["query"]),
+                "category": str(details["category"])}): (details, items)
+            for details, items in results}
+        resolved: ProductSearchResultT = []
+        for store_id, query in self.pairs:
+            if (result := by_key.get(build_pair_key(store_id, query))) \
+                    is None:
+                continue
+            details, items = result
+            resolved.append((
+                {**details, "query": query["query"],
+                 "category": query["category"]},
+                items))
+        return resolved
+
+
+class QueryPlanner:
+    """Creates search plans & counts the fan-out they save."""
+
+    def __init__(self) -> None:
+        self.counters: dict[str, int] = {
+            "plans": 0, "pairs": 0, "fetches": 0,
+            "duplicates": 0, "derived": 0}
+
+    def plan(
+            self, pairs: Sequence[PairT],
+            lookup: Callable[[PairT], ProductQueryResultT | None]
+            ) -> ProductSearchPlan:
+        """Plan the fetches of the given pairs, see ProductSearchPlan."""
+        plan = ProductSearchPlan(pairs=pairs, lookup=lookup)
+        self.counters["plans"] += 1
+        self.counters["pairs"] += len(plan.pairs)
+        self.counters["fetches"] += len(plan.fetches)
+        self.counters["duplicates"] += plan.duplicates
+        self.counters["derived"] += plan.derived
+        logger.debug(
+            "Planned %s fetch(es) for %s pair(s), %s duplicate(s) & "
+            "%s derived.", len(plan.fetches), len(plan.pairs),
+            plan.duplicates, plan.derived)
+        return plan
+
+    def statistics(self) -> dict[str, int | float]:
+        """Get the plan counters & the share of pairs not fetched."""
+        saved = self.counters["duplicates"] + self.counters["derived"]
+        return {
+            **self.counters,
+            "saved": saved,
+            "saved_ratio": round(
+                saved / self.counters["pairs"], 3)
+            if self.counters["pairs"] else 0.0
+        }
+
+
+# Shared by every product search
+planner = QueryPlanner()
@@ -1,8 +1,11 @@
 
+import asyncio
 from enum import Enum
-from typing import TypeVar, Generic, Any, Coroutine
+from typing import TypeVar, Generic, Any, Callable, Coroutine, Sequence
 from fastapi import BackgroundTasks
 
+from backend.app.api import breaker
+from backend.app.utils import deadline
 from backend.app.utils import patterns
 from backend.app.utils.logging import LoggerManager
 
@@ -17,6 +20,8 @@ class SearchState(str, Enum):
     PENDING = "PENDING"
     PARSE_ERROR = "PARSE_ERROR"
     NO_RESPONSE = "NO_RESPONSE"
+    CIRCUIT_OPEN = "CIRCUIT_OPEN"
+    TIMEOUT = "TIMEOUT"
 
 
 class SearchContext(patterns.StrategyContext, Generic[StrategyT]):
@@ -28,15 +33,31 @@ class SearchContext(patterns.StrategyContext, Generic[StrategyT]):
     # TODO: self.execute() *args **kwargs is too unspecific,
     # hard to know what exactly the function expects as an argument.
     query: Any
+    pairs: list[tuple[int, dict[str, str]]] | None
+    incomplete: list[tuple[int, dict[str, str]]]
     background_tasks: BackgroundTasks
     strategy: StrategyT
     status: SearchState
 
-    __slots__ = "query", "strategy", "status"
+    __slots__ = "query", "pairs", "incomplete", "strategy", "status"
 
     def __init__(self, strategy: StrategyT):
         super().__init__(strategy=strategy)
         self.status = SearchState.PENDING
+        self.pairs = None
+        # Pairs left unanswered when the deadline ran out
+        self.incomplete = []
+
+    def circuit_open(self) -> bool:
+        """Check if the upstream used by the strategy is unavailable.
+
+        Strategies that send upstream requests list the operations
+        they use in an 'operations' class attribute. Returns True if
+        the circuit breaker of any of those operations is open.
+        """
+        operations: tuple[str, ...] = getattr(
+            self.strategy, "operations", ())
+        return breaker.upstream.is_open(*operations)
 
     async def execute(self, *args: Any, **kwargs: Any
                       ) -> Coroutine[Any, Any, None]:  # TODO: Proper typehint for async
@@ -45,6 +66,13 @@ class SearchContext(patterns.StrategyContext, Generic[StrategyT]):
             query (Any): a 'query' keyword argument must be provided.
             tasks (BackgroundTasks):
             A 'tasks' keyword argument must be provided.
+            pairs (list[tuple[int, dict[str, str]]] | None):
+            Optionally limits a product search to these
+            (store id, query) pairs instead of every combination.
+            timeout (float | None):
+            Optional deadline in seconds for the strategy, applied to
+            every upstream request & DB query it makes (see
+            utils.deadline). An enclosing deadline that is sooner wins.
 
         # TODO: Improve this docstring....
         Returns:
@@ -56,5 +84,89 @@ class SearchContext(patterns.StrategyContext, Generic[StrategyT]):
             "Executing strategy %s with query %s",
             self.strategy, query)
         self.query = query
+        self.pairs = kwargs.get("pairs")
         self.background_tasks = background_tasks
-        return await self.strategy.execute(context=self)
+        with deadline.scope(kwargs.get("timeout")):
+            return await self.strategy.execute(context=self)
+
+
+async def race(
+        strategies: Sequence[tuple[patterns.Strategy, float]],
+        accept: Callable[[Any], bool],
+        **kwargs: Any) -> Any:
+    """Execute strategies concurrently & return the first acceptable result.
+
+    Strategies are given in priority order, each with a grace period:
+    a strategy is started once its grace period (in seconds, counted
+    from the start of the race) has passed, or right away if every
+    started strategy has finished without an acceptable result. The
+    first acceptable result wins & the strategies still running are
+    cancelled. If results finish at the same time, the strategy with
+    the highest priority wins. A strategy that raises is logged & treated
+    as if it had finished without an acceptable result.
+
+    Args:
+        strategies (Sequence[tuple[patterns.Strategy, float]]):
+            (strategy, grace period) pairs, in priority order.
+            Grace periods should not decrease along the sequence.
+        accept (Callable[[Any], bool]):
+            Called with the result of each strategy, returns
+            True if the result can be returned as is.
+        **kwargs (Any): Passed on to SearchContext.execute().
+
+    Returns:
+        Any:
+            The first acceptable result. If no result was acceptable,
+            the result of the lowest priority strategy instead.
+
+    Raises:
+        Exception: The error of the lowest priority strategy,
+            if every strategy raised.
+    """
+    contexts = [SearchContext(strategy=strategy) for strategy, _ in strategies]
+    grace_periods = [grace for _, grace in strategies]
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    running: dict[asyncio.Task, int] = {}
+    results: dict[int, Any] = {}
+    errors: dict[int, Exception] = {}
+    started = 0
+    try:
+        while True:
+            while started < len(contexts) and (
+                    not running
+                    or loop.time() - start >= grace_periods[started]):
+                logger.debug("Race: starting %s after %.3fs.",
+                             contexts[started].strategy,
+                             loop.time() - start)
+                running[asyncio.create_task(
+                    contexts[started].execute(**kwargs))] = started
+                started += 1
+            if not running:
+                break
+            timeout = None
+            if started < len(contexts):
+                timeout = max(
+                    0.0, start + grace_periods[started] - loop.time())
+            done, _ = await asyncio.wait(
+                running, timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED)
+            finished = {running.pop(task): task for task in done}
+            for index in sorted(finished):
+                if (error := finished[index].exception()) is not None:
+                    logger.error("Race: %s raised an error.",
+                                 contexts[index].strategy, exc_info=error)
+                    errors[index] = error
+                    continue
+                results[index] = finished[index].result()
+                if accept(results[index]):
+                    logger.debug("Race: %s won after %.3fs.",
+                                 contexts[index].strategy,
+                                 loop.time() - start)
+                    return results[index]
+    finally:
+        for task in running:
+            task.cancel()
+    if not results:
+        raise errors[max(errors)]
+    return results[max(results)]
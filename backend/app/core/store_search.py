@@ -1,21 +1,32 @@
-from typing import Callable
+import asyncio
+from typing import Any, AsyncIterator, Callable, Coroutine, Sequence
+
+from sqlalchemy.exc import SQLAlchemyError
 
 from backend.app.api import request
+from backend.app.api import cache
+from backend.app.api import coalesce
 from backend.app.api.skaupat import query_utils
 
+from backend.app.core import config
 from backend.app.core import parse
 from backend.app.core import tasks
+from backend.app.core import write_buffer
 from backend.app.core.search_context import SearchContext
 from backend.app.core.search_context import SearchState
 from backend.app.core.orm import schemas
-from backend.app.core.orm import crud
+from backend.app.core.orm import async_crud
 
+from backend.app.utils import deadline
 from backend.app.utils import patterns
 from backend.app.utils import exceptions
 from backend.app.utils.logging import LoggerManager
 
 logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
 
+STORE_CATALOG_MAX_PAGES = int(
+    config.parser["API"]["store_catalog_max_pages"])
+
 # TODO: Might do good with some refactoring in this file
 
 
@@ -27,15 +38,28 @@ class DBStoreSearchStrategy(patterns.Strategy):
             context: SearchContext
             ) -> tuple[SearchState, list[schemas.StoreDB]]:  # TODO: Proper typehint for async
         query: str | int
-        crud_func: Callable
+        crud_func: Callable[[Any], Coroutine[Any, Any, Any]]
         try:
             query = int(context.query)
-            crud_func = crud.get_store_by_id
+            crud_func = async_crud.get_store_by_id
         except ValueError:
             query = str(context.query)
-            crud_func = crud.get_stores_by_name
+            crud_func = async_crud.get_stores_by_name
+        try:
+            data = await crud_func(query)
+        except SQLAlchemyError as err:
+            if deadline.expired():
+                # The deadline's statement_timeout cancelled the query
+                context.status = SearchState.TIMEOUT
+                logger.info("DB: Deadline exceeded for query '%s'.",
+                            context.query)
+                return context.status, []
+            # E.g. the DB is down, leaves the search to the API
+            context.status = SearchState.FAIL
+            logger.warning("DB: Query '%s' failed: %s", context.query, err)
+            return context.status, []
         # This is too hard to read, rework this function
-        match crud_func(query):
+        match data:
             case [] | None:
                 context.status = SearchState.FAIL
                 logger.info("DB: Failed to find items for query '%s'.",
@@ -57,27 +81,44 @@ class DBStoreSearchStrategy(patterns.Strategy):
 
 class APIStoreSearchStrategy(patterns.Strategy):
     """TODO: DOCSTRING"""
+    operations = (query_utils.Operation.STORE_SEARCH.value,)
 
     @staticmethod
     async def execute(
             context: SearchContext
             ) -> tuple[SearchState, list[schemas.Store]]:  # TODO: Proper typehint for async
+        if context.circuit_open():
+            context.status = SearchState.CIRCUIT_OPEN
+            logger.info(
+                "API: Circuit open, skipping query '%s'.", context.query)
+            return context.status, []
+        variables = query_utils.build_store_search_vars(str(context.query))
         params = query_utils.build_request_params(
             method="post",
             operation=query_utils.Operation.STORE_SEARCH,
-            variables=query_utils.build_store_search_vars(
-                str(context.query)),
-            timeout=10)
+            variables=variables)
+        key = query_utils.build_request_key(
+            operation=query_utils.Operation.STORE_SEARCH,
+            variables=variables)
         logger.debug("Awaiting request for query '%s'", context.query)
-        response = await request.send_request(params=params)
-        if response is None:
+        received, stores = await cache.upstream.fetch(
+            key=key,
+            operation=query_utils.Operation.STORE_SEARCH.value,
+            func=lambda: coalesced_store_query(
+                key=key, query=str(context.query), params=params),
+            cacheable=lambda result: result[1] is not None)
+        if not received:
+            if deadline.expired():
+                context.status = SearchState.TIMEOUT
+                logger.info(
+                    "API: Deadline exceeded for query '%s'.", context.query)
+                return context.status, []
             context.status = SearchState.NO_RESPONSE
             logger.error(
                 "Received no API response to parse.")
             return context.status, []
 
-        logger.debug("Parsing response for query '%s'", context.query)
-        match parse.parse_store_response(response, str(context.query)):
+        match stores:
             case None:
                 context.status = SearchState.PARSE_ERROR
                 logger.error("Could not parse stores from API response.")
@@ -93,8 +134,238 @@ class APIStoreSearchStrategy(patterns.Strategy):
                             len(data), context.query)
                 context.status = SearchState.SUCCESS
                 context.background_tasks.add_task(
-                    tasks.save_store_results, results=data)
+                    write_buffer.buffer.add_stores, results=data)
                 return context.status, data
             case _ as data:
                 raise exceptions.InvalidMatchCaseError(
                     f"Could not match value: {data} to a predefined case.")
+
+
+async def coalesced_store_query(
+        key: str, query: str, params: dict[str, Any]
+        ) -> tuple[bool, list[schemas.Store] | None]:
+    """Send a store query, sharing it with identical in-flight queries.
+
+    See send_store_query(), counts as no response received if the
+    caller's deadline passes first.
+    """
+    try:
+        return await coalesce.upstream.do(
+            key, lambda: send_store_query(query=query, params=params))
+    except TimeoutError:
+        return False, None
+
+
+async def send_store_query(
+        query: str, params: dict[str, Any]
+        ) -> tuple[bool, list[schemas.Store] | None]:
+    """Send a store search request & parse the stores from the response.
+
+    Returns:
+        tuple[bool, list[schemas.Store] | None]:
+            The first item indicates whether a response was received.
+            The second item is the result of parse.parse_store_response(),
+            or None if no response was received.
+    """
+    response = await request.send_request(params=params)
+    if response is None:
+        return False, None
+    logger.debug("Parsing response for query '%s'", query)
+    return True, parse.parse_store_response(response, query)
+
+
+async def fetch_store_pages(
+        brand: query_utils.StoreBrand | None = None,
+        query: str | None = None,
+        max_pages: int = STORE_CATALOG_MAX_PAGES
+        ) -> AsyncIterator[list[schemas.Store]]:
+    """Fetch the pages of a store search, following its cursors.
+
+    Pages are yielded as they arrive, so that the caller does not
+    have to hold every page in memory.
+
+    Args:
+        brand (query_utils.StoreBrand | None, optional):
+            Limits the search to a single brand. Defaults to None.
+        query (str | None, optional):
+            The search string, None matches every store. Defaults to None.
+        max_pages (int, optional):
+            Max amount of pages to follow.
+            Defaults to [API] store_catalog_max_pages.
+
+    Raises:
+        exceptions.PaginationError:
+            Raised if a page could not be fetched or parsed.
+
+    Yields:
+        list[schemas.Store]: The stores of each page.
+    """
+    cursor: str | None = None
+    for page in range(max_pages):
+        variables = query_utils.build_store_search_vars(
+            query, brand=brand, cursor=cursor)
+        params = query_utils.build_request_params(
+            method="post",
+            operation=query_utils.Operation.STORE_SEARCH,
+            variables=variables)
+        response = await request.send_request(params=params)
+        if response is None:
+            raise exceptions.PaginationError(
+                f"No response for page {page} (brand: {brand}).")
+        stores, cursor, total = parse.parse_store_page(response, query)
+        if stores is None:
+            raise exceptions.PaginationError(
+                f"Could not parse page {page} (brand: {brand}).")
+        logger.debug("Fetched store page %s with %s store(s), total: %s.",
+                     page, len(stores), total)
+        yield stores
+        if not cursor or len(stores) == 0:
+            return
+    logger.warning(
+        "Stopped store search after %s pages (brand: %s).",
+        max_pages, brand)
+
+
+async def ingest_store_partition(
+        brand: query_utils.StoreBrand | None,
+        query: str | None,
+        save: Callable[..., None]) -> dict[str, int | str | None]:
+    """Fetch & save every page of a single store search partition.
+
+    Each page is saved in a worker thread while the next page is
+    fetched, at most one page per partition waits to be saved.
+    """
+    summary: dict[str, int | str | None] = {
+        "pages": 0, "stores": 0, "error": None}
+    saving: asyncio.Task | None = None
+    try:
+        async for stores in fetch_store_pages(brand=brand, query=query):
+            if saving is not None:
+                await saving
+            saving = asyncio.create_task(
+                asyncio.to_thread(save, results=stores))
+            summary["pages"] += 1  # type: ignore
+            summary["stores"] += len(stores)  # type: ignore
+    except exceptions.PaginationError as err:
+        logger.error("Store ingestion failed: %s", err.message)
+        summary["error"] = err.message
+    finally:
+        if saving is not None:
+            await saving
+    return summary
+
+
+async def ingest_store_catalog(
+        query: str | None = None,
+        brands: Sequence[query_utils.StoreBrand] | None = None,
+        save: Callable[..., None] = tasks.save_store_results
+        ) -> dict[str, Any]:
+    """Fetch the whole store catalog & stream its pages into the DB.
+
+    The search is partitioned by brand so that the cursors of each
+    partition can be followed concurrently.
+
+    Args:
+        query (str | None, optional):
+            The search string, None matches every store. Defaults to None.
+        brands (Sequence[query_utils.StoreBrand] | None, optional):
+            The brands to partition by, every brand if None.
+            An empty sequence disables partitioning. Defaults to None.
+        save (Callable[..., None], optional):
+            Called with the stores of each page.
+            Defaults to tasks.save_store_results.
+
+    Returns:
+        dict[str, Any]:
+            The total page & store counts alongside a summary
+            of each partition, including its error if it failed.
+    """
+    partitions: list[query_utils.StoreBrand | None] = \
+        list(query_utils.StoreBrand) if brands is None else list(brands)
+    if len(partitions) == 0:
+        partitions = [None]
+    results = await asyncio.gather(*(
+        ingest_store_partition(brand=brand, query=query, save=save)
+        for brand in partitions))
+    summary = {
+        (brand.value if brand is not None else "ALL"): result
+        for brand, result in zip(partitions, results)}
+    logger.info("Ingested %s store(s) from %s page(s).",
+                sum(r["stores"] for r in results),  # type: ignore
+                sum(r["pages"] for r in results))  # type: ignore
+    return {
+        "pages": sum(r["pages"] for r in results),  # type: ignore
+        "stores": sum(r["stores"] for r in results),  # type: ignore
+        "failed": sum(1 for r in results if r["error"] is not None),
+        "partitions": summary}
+
+
+class CatalogIngestion:
+    """Runs the store catalog ingestion in the background, once at a time.
+
+    A full ingestion follows the cursors of every partition, so runs are
+    never started while one is already running. Otherwise repeated
+    requests would each start a crawl of the whole catalog upstream.
+    """
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self.last_summary: dict[str, Any] | None = None
+        self.counters: dict[str, int] = {
+            "started": 0, "rejected": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        """Whether an ingestion is currently running."""
+        return self._task is not None and not self._task.done()
+
+    def start(self,
+              brands: Sequence[query_utils.StoreBrand] | None = None
+              ) -> bool:
+        """Start an ingestion, see ingest_store_catalog().
+
+        Must be called within the event loop.
+
+        Returns:
+            bool:
+                False if an ingestion was already running,
+                in which case no new one is started.
+        """
+        if self.running:
+            self.counters["rejected"] += 1
+            return False
+        self.counters["started"] += 1
+        self._task = asyncio.create_task(self._run(brands=brands))
+        return True
+
+    async def _run(
+            self, brands: Sequence[query_utils.StoreBrand] | None) -> None:
+        """Ingest the catalog & keep its summary."""
+        try:
+            self.last_summary = await ingest_store_catalog(brands=brands)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # Nothing awaits the task, so the error is only logged
+            self.counters["failed"] += 1
+            logger.exception("Store catalog ingestion failed.")
+
+    async def close(self) -> None:
+        """Cancel a running ingestion & wait for it to stop."""
+        if (task := self._task) is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def statistics(self) -> dict[str, Any]:
+        """Get whether an ingestion is running, counters & last summary."""
+        return {
+            "running": self.running,
+            **self.counters,
+            "last_summary": self.last_summary}
+
+
+# Shared by every request to refresh the store catalog
+ingestion = CatalogIngestion()
@@ -1,10 +1,14 @@
 """Contains background tasks used in the app."""
+from datetime import datetime, timezone
 from typing import Type, Sequence
 from itertools import batched
 
+from backend.app.api.skaupat import query_utils
+from backend.app.core import config
 from backend.app.core.orm import schemas
 from backend.app.core.orm import models
 from backend.app.core.orm import crud
+from backend.app.core.typedefs import ProductDataRowT
 from backend.app.core.typedefs import ProductSearchResultT
 from backend.app.core.typedefs import SchemaInOrDict
 from backend.app.core.typedefs import OrmModel
@@ -12,6 +16,9 @@ from backend.app.utils import LoggerManager
 
 logger = LoggerManager().get_logger(__name__, sh=0, fh=10)
 
+# Saving this many items or more uses COPY, see copy_items()
+COPY_THRESHOLD = config.parser["DATABASE"].getint("copy_threshold")
+
 # TODO: Asynchronous operations
 
 
@@ -38,7 +45,9 @@ def save_one_by_one[ModelT: OrmModel](
 
 def save_in_batches[ModelT: OrmModel](
         items: Sequence[SchemaInOrDict], model: Type[ModelT],
-        batch_size: int = 24) -> list[tuple[SchemaInOrDict, ...]]:
+        batch_size: int = 24,
+        on_conflict: crud.OnConflict = crud.OnConflict.FAIL
+        ) -> list[tuple[SchemaInOrDict, ...]]:
     """Convert a sequence into batches & add each batch to the database.
 
     Args:
@@ -48,6 +57,8 @@ def save_in_batches[ModelT: OrmModel](
             The type of the ORM model that the items will be converted to.
         batch_size (int, optional):
             The size of each batch. Defaults to 24.
+        on_conflict (crud.OnConflict, optional):
+            How existing records are handled, see crud.OnConflict.
 
     Returns:
         list[tuple[SchemaInOrDict, ...]]:
@@ -57,7 +68,8 @@ def save_in_batches[ModelT: OrmModel](
     failed_count: int = 0
     failed_batches: list[tuple[SchemaInOrDict, ...]] = []
     for batch in batched(iterable=items, n=batch_size):
-        if not crud.bulk_create_records(records=batch, model=model):
+        if not crud.bulk_create_records(
+                records=batch, model=model, on_conflict=on_conflict):
             failed_count += len(batch)
             failed_batches.append(batch)
     logger.debug(
@@ -67,13 +79,16 @@ def save_in_batches[ModelT: OrmModel](
     return failed_batches
 
 
-def save_items[ModelT: OrmModel](items: Sequence[SchemaInOrDict],
-               model: Type[ModelT], batch_size: int = 24) -> None:
+def save_items[ModelT: OrmModel](
+        items: Sequence[SchemaInOrDict], model: Type[ModelT],
+        batch_size: int = 24,
+        on_conflict: crud.OnConflict = crud.OnConflict.FAIL) -> None:
     """Background task for saving records into the database.
 
     Attempts to add the records in batches using a bulk insert.
     For each failed batch, attempt to add that batch's records
-    individually.
+    individually. With an upsert (see crud.OnConflict), existing
+    records no longer fail a batch.
 
     Args:
         items (list[SchemaInOrDict]):
@@ -82,7 +97,8 @@ def save_items[ModelT: OrmModel](items: Sequence[SchemaInOrDict],
     logger.debug("Total items to save: %s", len(items))
     logger.debug("Batch size set to %s", batch_size)
     remainder = save_in_batches(
-        items=items, model=model, batch_size=batch_size)
+        items=items, model=model, batch_size=batch_size,
+        on_conflict=on_conflict)
     if len(remainder) != 0:
         total_count: int = 0
         failed_count: int = 0
@@ -96,6 +112,28 @@ def save_items[ModelT: OrmModel](items: Sequence[SchemaInOrDict],
             f"Was unable to add {failed_count} item(s), discarding...")
 
 
+def copy_items[ModelT: OrmModel](
+        items: Sequence[SchemaInOrDict], model: Type[ModelT],
+        batch_size: int = 24) -> None:
+    """Save a large amount of records into the database with COPY.
+
+    Streaming the items with COPY FROM STDIN is much faster than bulk
+    inserts, but a single invalid item fails the whole COPY. In that
+    case, the items are saved with save_items() instead.
+
+    Args:
+        items (Sequence[SchemaInOrDict]):
+            The sequence of items to be saved to the database.
+        batch_size (int, optional):
+            The batch size of save_items(), if the COPY fails.
+    """
+    logger.debug("Copying %s item(s) to the database...", len(items))
+    if crud.copy_records(records=items, model=model):
+        return
+    logger.debug("Unable to copy the items, saving them in batches...")
+    save_items(items=items, model=model, batch_size=batch_size)
+
+
 def save_store_results(results: Sequence[schemas.Store]) -> None:
     """Save store results to the database.
 
@@ -106,33 +144,78 @@ def save_store_results(results: Sequence[schemas.Store]) -> None:
             The parsed store results to be saved.
     """
     logger.debug("Running background task to save store results...")
-    save_items(items=results, model=models.Store, batch_size=50)
+    save_records(stores=results, products=[], product_data=[])
     logger.debug("Saving of store results complete.")
 
 
-def save_product_results(results: ProductSearchResultT) -> None:
-    """Save product results to the database.
-
-    Intended to be used as a FastAPI background task.
+def build_product_rows(
+        results: ProductSearchResultT
+        ) -> tuple[list[schemas.Product], list[ProductDataRowT]]:
+    """Get the products & product data rows of product results.
 
     Args:
         results (ProductSearchResultT):
-            The parsed product results to be saved.
+            The parsed product results.
+
+    Returns:
+        tuple[list[schemas.Product], list[ProductDataRowT]]:
+            The products & the data of each product, with the ids
+            of their store & product, the key of their query and the
+            time they were fetched, as the rows may be saved later on.
     """
-    logger.debug("Running background task to save product results...")
+    fetched = datetime.now(timezone.utc)
     products: list[schemas.Product] = []
-    product_data: list[dict[str, str | int]] = []
+    product_data: list[ProductDataRowT] = []
     for result in results:
+        query_key = query_utils.build_query_key({
+            "query": str(result[0]["query"]),
+            "category": str(result[0]["category"])})
         for item in result[1]:  # Accessing the result tuple
             products.append(item[0])  # item[0] type: schemas.Product
             data = dict(item[1])  # Convert to dict
             data["store_id"] = int(result[0]["store_id"])
             data["product_ean"] = str(item[0].ean)
+            data["query_key"] = query_key
+            data["timestamp"] = fetched
             product_data.append(data)
+    return products, product_data
+
+
+def save_records(
+        stores: Sequence[schemas.Store],
+        products: Sequence[schemas.Product],
+        product_data: Sequence[ProductDataRowT]) -> None:
+    """Save stores, products & product data, in the order of their FKs.
+
+    Stores & products are upserted, product data is copied
+    once there are at least COPY_THRESHOLD rows of it.
+    """
+    if stores:
+        # Keeps the saved stores up to date with the API
+        save_items(items=stores, model=models.Store, batch_size=50,
+                   on_conflict=crud.OnConflict.UPDATE)
+    if products:
+        save_items(items=products, model=models.Product, batch_size=24,
+                   on_conflict=crud.OnConflict.UPDATE)
+    if len(product_data) >= COPY_THRESHOLD:
+        copy_items(items=product_data, model=models.ProductData,
+                   batch_size=50)
+    elif product_data:
+        save_items(
+            items=product_data, model=models.ProductData, batch_size=50)
+
+
+def save_product_results(results: ProductSearchResultT) -> None:
+    """Save product results to the database.
 
-    # Save the Product(s) first
-    save_items(items=products, model=models.Product, batch_size=24)
+    Intended to be used as a FastAPI background task.
 
-    # Save the ProductData second
-    save_items(items=product_data, model=models.ProductData, batch_size=50)
+    Args:
+        results (ProductSearchResultT):
+            The parsed product results to be saved.
+    """
+    logger.debug("Running background task to save product results...")
+    products, product_data = build_product_rows(results)
+    # Products are saved first, as the product data refers to them
+    save_records(stores=[], products=products, product_data=product_data)
     logger.debug("Saving of product results complete.")
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import ARRAY, create_engine
+from sqlalchemy.ext.compiler import compiles
+
+from backend.app.core import store_search
+from backend.app.core.orm import async_crud
+from backend.app.core.orm import database
+from backend.app.core.orm import models
+from backend.app.core.orm import pool
+from backend.app.core.orm import schemas
+from backend.app.core.search_context import SearchContext, SearchState
+
+OLARI = schemas.Store(
+    store_id=1, store_name="Prisma Olari", slug="prisma-olari",
+    brand="prisma")
+
+
+@compiles(ARRAY, "sqlite")
+def compile_array(*_, **__) -> str:
+    """Create the array columns of the tables as JSON in SQLite."""
+    return "JSON"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """An AsyncDBContext on a SQLite database with the app's tables."""
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    database.Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    for name in ("_engine", "_sessionmaker"):
+        monkeypatch.setattr(
+            database.AsyncDBContext, name, None, raising=False)
+    monkeypatch.setattr(
+        database.AsyncDBContext, "monitor", pool.PoolMonitor())
+    database.AsyncDBContext.prepare_context(f"sqlite+aiosqlite:///{path}")
+    yield
+    asyncio.run(database.AsyncDBContext.dispose())
+
+
+def search_store(query: str) -> tuple[SearchState, list]:
+    """Search for a store with the DB strategy."""
+    context = SearchContext(strategy=store_search.DBStoreSearchStrategy())
+    return asyncio.run(context.execute(query=query, tasks=BackgroundTasks()))
+
+
+def test_async_url_uses_asyncpg():
+    """Test that only PostgreSQL URLs get the asyncpg driver."""
+    assert database.create_async_url("postgresql://user:pw@db:5432/app") \
+        == "postgresql+asyncpg://user:pw@db:5432/app"
+    assert database.create_async_url("sqlite+aiosqlite:///app.db") \
+        == "sqlite+aiosqlite:///app.db"
+
+
+def test_records_are_created_and_read_back(db):
+    """Test that a created record can be read with async_crud."""
+    assert asyncio.run(async_crud.create_record(OLARI, models.Store))
+    store = asyncio.run(async_crud.get_store_by_id(1))
+    assert store is not None and store.store_name == "Prisma Olari"
+    assert [store.store_id for store in asyncio.run(
+        async_crud.get_stores_by_name("olari"))] == [1]
+
+
+def test_integrity_error_fails_without_raising(db):
+    """Test that a duplicate record is rolled back & reported as failed."""
+    assert asyncio.run(async_crud.create_record(OLARI, models.Store))
+    assert not asyncio.run(async_crud.create_record(OLARI, models.Store))
+
+
+def test_error_in_context_propagates(db):
+    """Test that other errors propagate after the transaction failed."""
+    context = database.AsyncDBContext()
+
+    async def main():
+        async with context:
+            context.session.add(models.Store(**dict(OLARI)))
+            raise KeyError("store")
+
+    with pytest.raises(KeyError):
+        asyncio.run(main())
+    assert context.status is database.CommitState.FAIL
+    assert asyncio.run(async_crud.get_store_by_id(1)) is None
+
+
+def test_store_strategy_reads_the_db(db):
+    """Test that the DB store strategy finds stores by id & name."""
+    asyncio.run(async_crud.create_record(OLARI, models.Store))
+    state, stores = search_store("1")
+    assert state is SearchState.SUCCESS and stores[0].store_id == 1
+    assert search_store("olari")[0] is SearchState.SUCCESS
+    assert search_store("kamppi") == (SearchState.FAIL, [])
+
+
+def test_store_strategy_fails_if_the_db_is_down(tmp_path, monkeypatch):
+    """Test that a DB error fails the strategy instead of raising."""
+    for name in ("_engine", "_sessionmaker"):
+        monkeypatch.setattr(
+            database.AsyncDBContext, name, None, raising=False)
+    monkeypatch.setattr(
+        database.AsyncDBContext, "monitor", pool.PoolMonitor())
+    # The tables of the app do not exist in this database
+    database.AsyncDBContext.prepare_context(
+        f"sqlite+aiosqlite:///{tmp_path / 'empty.db'}")
+    try:
+        assert search_store("olari") == (SearchState.FAIL, [])
+    finally:
+        asyncio.run(database.AsyncDBContext.dispose())
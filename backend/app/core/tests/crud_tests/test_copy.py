@@ -0,0 +1,43 @@
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DataError
+
+from backend.app.core import tasks
+from backend.app.core.orm import crud
+from backend.app.core.orm import models
+
+
+def test_stream_reads_rows_as_csv():
+    """Test that None is unquoted (NULL) & other values are quoted."""
+    stream = crud.CopyStream([[1, None, 'a,"b'], [2, "", True]])
+    assert stream.read(4) == '"1",'
+    assert stream.read() == ',"a,""b"\n"2","","True"\n'
+    assert stream.read() == "" and stream.row_count == 2
+
+
+def test_merge_keeps_one_row_per_natural_key():
+    """Test that an upserting merge selects distinct natural keys."""
+    stmt = crud.build_merge_stmt(
+        staging="staging_Products", columns=["ean", "name"],
+        model=models.Product, on_conflict=crud.OnConflict.UPDATE)
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert 'SELECT DISTINCT ON ("staging_Products".ean)' in sql
+    assert sql.endswith("ON CONFLICT (ean) DO UPDATE SET name = excluded.name")
+
+
+def test_failed_copy_falls_back_to_batches(monkeypatch):
+    """Test that the items are saved in batches if the COPY fails."""
+    class FailingContext:
+        """A DBContext whose COPY fails with invalid data."""
+        def __enter__(self):
+            raise DataError("COPY", None, Exception("invalid input"))
+
+        def __exit__(self, *_):
+            return False
+
+    saved = []
+    monkeypatch.setattr(crud.database, "DBContext", FailingContext)
+    monkeypatch.setattr(
+        tasks, "save_items", lambda items, **_: saved.extend(items))
+    items = [{"ean": "1", "name": "Product"}]
+    tasks.copy_items(items=items, model=models.Product)
+    assert saved == items
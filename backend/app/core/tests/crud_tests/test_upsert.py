@@ -0,0 +1,33 @@
+from sqlalchemy.dialects import postgresql
+
+from backend.app.core.orm import crud
+from backend.app.core.orm import models
+
+
+def compile_stmt(stmt) -> str:
+    """Compile a statement to PostgreSQL SQL."""
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def test_upsert_updates_by_natural_key():
+    """Test that an upsert targets the natural key & keeps the last item."""
+    items = [{"ean": "1", "name": "Old"}, {"ean": "2", "name": "Other"},
+             {"ean": "1", "name": "New"}]
+    stmt, unique = crud.build_insert_stmt(
+        items=items, model=models.Product,
+        on_conflict=crud.OnConflict.UPDATE)
+    assert unique == [{"ean": "1", "name": "New"},
+                      {"ean": "2", "name": "Other"}]
+    sql = compile_stmt(stmt.values(unique[0]))
+    assert "ON CONFLICT (ean) DO UPDATE SET name = excluded.name" in sql
+
+
+def test_insert_ignores_existing_records():
+    """Test that DO NOTHING applies to every unique constraint."""
+    items = [{"store_id": 1, "store_name": "Store", "slug": "store",
+              "brand": "brand"}]
+    stmt, unique = crud.build_insert_stmt(
+        items=items, model=models.Store,
+        on_conflict=crud.OnConflict.NOTHING)
+    assert unique == items
+    assert "ON CONFLICT DO NOTHING" in compile_stmt(stmt.values(items[0]))
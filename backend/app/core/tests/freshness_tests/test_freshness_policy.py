@@ -0,0 +1,28 @@
+import pytest
+
+from backend.app.core.freshness import Freshness, FreshnessPolicy
+
+
+@pytest.mark.parametrize("age, freshness", [
+    (0.0, Freshness.FRESH), (60.0, Freshness.FRESH),
+    (60.1, Freshness.STALE), (600.0, Freshness.STALE),
+    (600.1, Freshness.EXPIRED)])
+def test_age_is_classified_by_soft_and_hard_max_age(age, freshness):
+    """Test that the max ages are inclusive bounds of each class."""
+    policy = FreshnessPolicy(soft_max_age=60.0, hard_max_age=600.0)
+    assert policy.classify(age) is freshness
+
+
+def test_stale_data_is_only_served_while_revalidating():
+    """Test that stale data is served only with stale_while_revalidate."""
+    revalidating = FreshnessPolicy(60.0, 600.0, stale_while_revalidate=True)
+    strict = FreshnessPolicy(60.0, 600.0, stale_while_revalidate=False)
+    assert revalidating.servable(300.0) and not strict.servable(300.0)
+    assert strict.servable(30.0)
+    assert not revalidating.servable(900.0)
+
+
+def test_hard_max_age_below_soft_max_age_is_rejected():
+    """Test that a policy can not expire data before it goes stale."""
+    with pytest.raises(ValueError):
+        FreshnessPolicy(soft_max_age=600.0, hard_max_age=60.0)
@@ -0,0 +1,18 @@
+import pytest
+
+from backend.app.core import parse
+
+
+@pytest.mark.parametrize("price, cents", [
+    (1.05, 105), (1.5, 150), (1.50, 150), (0.1 + 0.2, 30),
+    ("2.995", 300), (3, 300), (0.01, 1)])
+def test_price_to_cents(price, cents):
+    """Test that prices convert to exact integer cents."""
+    assert parse.price_to_cents(price) == cents
+
+
+@pytest.mark.parametrize("price", ["", "1,05", float("nan"), float("inf")])
+def test_invalid_price_raises_value_error(price):
+    """Test that invalid prices fail validation instead of crashing."""
+    with pytest.raises(ValueError):
+        parse.price_to_cents(price)
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from backend.app.core.orm.pool import PoolMonitor
+
+
+@pytest.fixture
+def engine():
+    """An in-memory SQLite engine with a pool of one & one overflow."""
+    engine = create_engine(
+        "sqlite://", poolclass=QueuePool, pool_size=1, max_overflow=1,
+        pool_timeout=0.01)
+    yield engine
+    engine.dispose()
+
+
+def test_overflow_and_timeouts_are_counted(engine):
+    """Test that checkouts past pool_size & pool timeouts are counted."""
+    monitor = PoolMonitor()
+    monitor.attach(engine)
+    with monitor.measure_checkout():
+        first = engine.connect()
+    with monitor.measure_checkout():
+        second = engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        with monitor.measure_checkout():
+            engine.connect()
+    stats = monitor.statistics()
+    assert stats["checkouts"] == 2 and stats["connects"] == 2
+    assert stats["overflow_checkouts"] == 1 and stats["overflow"] == 1
+    assert stats["checked_out"] == 2 and stats["timeouts"] == 1
+    first.close()
+    second.close()
+    assert monitor.statistics()["checked_out"] == 0
+
+
+def test_waits_are_only_sampled_for_checkouts(engine):
+    """Test that the wait statistics come from successful checkouts."""
+    monitor = PoolMonitor()
+    monitor.attach(engine)
+    assert monitor.statistics()["wait_max"] == 0.0
+    for _ in range(3):
+        with monitor.measure_checkout():
+            engine.connect().close()
+    stats = monitor.statistics()
+    assert stats["checkouts"] == 3 and stats["connects"] == 1
+    assert 0.0 < stats["wait_mean"] <= stats["wait_p95"] <= stats["wait_max"]
@@ -0,0 +1,68 @@
+import asyncio
+
+from fastapi import BackgroundTasks
+
+from backend.app.core import product_search
+from backend.app.core.orm import schemas
+from backend.app.core.search_context import SearchContext
+
+MILK = {"query": "maito", "category": ""}
+
+
+def item(ean: str) -> tuple[schemas.Product, schemas.ProductData]:
+    """Create a product item with the given EAN."""
+    return (
+        schemas.Product(name=ean, category="", ean=ean, slug=ean,
+                        brand=""),
+        schemas.ProductData(unit_price_cents=100, cmp_price_cents=200,
+                            label_unit="kpl", comparison_unit="kg"))
+
+
+def test_results_keep_the_pair_order(monkeypatch):
+    """Test that results are sorted into pair order & split by outcome."""
+    async def send_pair_queries(pairs):
+        (store_id, query), = pairs
+        # Later stores answer first, store 2 finds nothing
+        await asyncio.sleep(0.01 * (4 - store_id))
+        size = 0 if store_id == 2 else 1
+        return [({**query, "store_id": store_id},
+                 [item(f"{store_id}-{i}") for i in range(size)])]
+
+    monkeypatch.setattr(product_search, "PRODUCT_BATCH_SIZE", 1)
+    monkeypatch.setattr(
+        product_search, "send_pair_queries", send_pair_queries)
+    monkeypatch.setattr(
+        product_search, "lookup_cached_pair", lambda pair: None)
+    context = SearchContext(
+        strategy=product_search.APIProductSearchStrategy())
+    successful, failed = asyncio.run(context.execute(
+        query=schemas.ProductQuery(stores={1, 2, 3}, queries=[MILK]),
+        tasks=BackgroundTasks(), pairs=[(1, MILK), (2, MILK), (3, MILK)]))
+    assert [details["store_id"] for details, _ in successful] == [1, 3]
+    assert [details["source"] for details, _ in successful] == ["api"] * 2
+    assert [details["store_id"] for details, _ in failed] == [2]
+    assert context.incomplete == []
+
+
+def test_unanswered_pairs_are_incomplete(monkeypatch):
+    """Test that pairs unanswered by the deadline are listed incomplete."""
+    async def send_pair_queries(pairs):
+        (store_id, query), = pairs
+        if store_id == 2:
+            await asyncio.sleep(10)
+        return [({**query, "store_id": store_id}, [item(str(store_id))])]
+
+    monkeypatch.setattr(product_search, "PRODUCT_BATCH_SIZE", 1)
+    monkeypatch.setattr(
+        product_search, "send_pair_queries", send_pair_queries)
+    monkeypatch.setattr(
+        product_search, "lookup_cached_pair", lambda pair: None)
+    context = SearchContext(
+        strategy=product_search.APIProductSearchStrategy())
+    successful, failed = asyncio.run(context.execute(
+        query=schemas.ProductQuery(stores={1, 2}, queries=[MILK]),
+        tasks=BackgroundTasks(), pairs=[(1, MILK), (2, MILK)],
+        timeout=0.05))
+    assert [details["store_id"] for details, _ in successful] == [1]
+    assert failed == []
+    assert context.incomplete == [(2, MILK)]
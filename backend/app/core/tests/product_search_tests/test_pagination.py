@@ -0,0 +1,91 @@
+import asyncio
+
+from fastapi import BackgroundTasks
+
+from backend.app.core import product_search
+from backend.app.core.orm import schemas
+
+MILK = {"query": "maito", "category": ""}
+
+
+def item(ean: str) -> tuple[schemas.Product, schemas.ProductData]:
+    """Create a product item with the given EAN."""
+    return (
+        schemas.Product(name=ean, category="", ean=ean, slug=ean,
+                        brand=""),
+        schemas.ProductData(unit_price_cents=100, cmp_price_cents=200,
+                            label_unit="kpl", comparison_unit="kg"))
+
+
+def result(store_id: int, total: int | None, size: int = 24):
+    """Create a first page result with the given total of items."""
+    details = {**MILK, "store_id": store_id}
+    if total is not None:
+        details["total"] = total
+    return details, [item(f"{store_id}-{i}") for i in range(size)]
+
+
+def test_merged_pages_are_deduplicated_by_ean():
+    """Test that an item repeated on a later page is only kept once."""
+    first, second = [item("1"), item("2")], [item("2"), item("3")]
+    merged = product_search.merge_product_items(first, second)
+    assert [product.ean for product, _ in merged] == ["1", "2", "3"]
+    assert merged[1] is first[1]
+
+
+def test_remaining_pages_are_capped_by_max_pages():
+    """Test that the remaining pages come from the total & max_pages."""
+    count = product_search.count_remaining_pages
+    assert count(result(1, total=60), max_pages=5) == 2
+    assert count(result(1, total=1000), max_pages=5) == 4
+    assert count(result(1, total=24), max_pages=5) == 0
+
+
+def test_missing_total_has_no_remaining_pages():
+    """Test that a result without a total or items is not paginated."""
+    count = product_search.count_remaining_pages
+    assert count(result(1, total=None), max_pages=5) == 0
+    assert count(result(1, total=100, size=0), max_pages=5) == 0
+
+
+def test_deep_fetch_stays_within_the_budget(monkeypatch):
+    """Test that extra pages are handed out in order until the budget."""
+    fetched = []
+
+    async def send_pair_queries(pairs):
+        return [result(store_id, total=100) for store_id, _ in pairs]
+
+    async def fetch_remaining_pages(first, pages):
+        fetched.append((first[0]["store_id"], pages))
+        return [item(f"extra-{first[0]['store_id']}-{page}")
+                for page in range(pages)]
+
+    def lookup_cached_pair(pair):
+        return result(3, total=100) if pair[0] == 3 else None
+
+    monkeypatch.setattr(product_search, "PRODUCT_BATCH_SIZE", 1)
+    monkeypatch.setattr(product_search, "MAX_REQUESTS_PER_QUERY", 4)
+    monkeypatch.setattr(
+        product_search, "send_pair_queries", send_pair_queries)
+    monkeypatch.setattr(
+        product_search, "fetch_remaining_pages", fetch_remaining_pages)
+    monkeypatch.setattr(
+        product_search, "lookup_cached_pair", lookup_cached_pair)
+    query = schemas.ProductQuery(
+        stores={1, 2, 3}, queries=[MILK], deep_fetch=True, max_pages=3)
+    background_tasks = BackgroundTasks()
+
+    async def collect():
+        return [item async for item in product_search.fetch_product_results(
+            query=query, pairs=[(1, MILK), (2, MILK), (3, MILK)],
+            background_tasks=background_tasks)]
+
+    results = asyncio.run(collect())
+    # The two fetched first pages leave a budget of two extra pages
+    assert fetched == [(3, 2)]
+    sizes = {details["store_id"]: len(items) for _, (details, items)
+             in results}
+    assert sizes == {1: 24, 2: 24, 3: 26}
+    saved = background_tasks.tasks[0].kwargs["results"]
+    assert sorted((details["store_id"], len(items))
+                  for details, items in saved) == [(1, 24), (2, 24), (3, 2)]
@@ -0,0 +1,39 @@
+import time
+from types import SimpleNamespace
+
+from fastapi import BackgroundTasks
+
+from backend.app.core import product_search
+
+MILK = {"query": "maito", "category": ""}
+BREAD = {"query": "leipä", "category": ""}
+
+
+def create_context() -> SimpleNamespace:
+    """Create the part of a search context that schedules refreshes."""
+    return SimpleNamespace(background_tasks=BackgroundTasks())
+
+
+def scheduled(context: SimpleNamespace) -> list:
+    """Get the pairs of every refresh scheduled in the context."""
+    return [task.kwargs["pairs"] for task in context.background_tasks.tasks]
+
+
+def test_pending_refresh_is_not_scheduled_again(monkeypatch):
+    """Test that concurrent searches of a stale pair refresh it once."""
+    monkeypatch.setattr(product_search, "refreshing", {})
+    first, second = create_context(), create_context()
+    product_search.schedule_refresh(first, [(1, MILK)])
+    product_search.schedule_refresh(second, [(1, MILK), (2, BREAD)])
+    assert scheduled(first) == [[(1, MILK)]]
+    assert scheduled(second) == [[(2, BREAD)]]
+
+
+def test_expired_refresh_is_scheduled_again(monkeypatch):
+    """Test that a refresh that never ran stops blocking its pair."""
+    key = product_search.build_pair_key(store_id=1, query=MILK)
+    monkeypatch.setattr(product_search, "refreshing", {
+        key: time.monotonic() - product_search.REFRESH_TIMEOUT})
+    context = create_context()
+    product_search.schedule_refresh(context, [(1, MILK)])
+    assert scheduled(context) == [[(1, MILK)]]
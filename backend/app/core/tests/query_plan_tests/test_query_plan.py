@@ -0,0 +1,60 @@
+from backend.app.core import query_plan
+from backend.app.core.orm import schemas
+
+
+def product(ean: str, category: str) -> schemas.Product:
+    """Create a product of the given category."""
+    return schemas.Product(
+        name=f"Product {ean}", category=category, ean=ean,
+        slug=f"product-{ean}", brand="Brand")
+
+
+def result(store_id: int, query: str, category: str, items: list,
+           total: int | None = None):
+    """Create a result for a pair, its items paired with no data."""
+    return ({"store_id": store_id, "query": query, "category": category,
+             "total": len(items) if total is None else total},
+            [(item, None) for item in items])
+
+
+def test_duplicates_are_fetched_once():
+    """Test that pairs differing in case & whitespace share a fetch."""
+    pairs = [(1, {"query": "Maito 1L", "category": ""}),
+             (1, {"query": "  maito   1l ", "category": ""}),
+             (2, {"query": "MAITO 1L", "category": ""})]
+    plan = query_plan.ProductSearchPlan(pairs, lookup=lambda pair: None)
+    assert plan.fetches == [(1, {"query": "maito 1l", "category": ""}),
+                            (2, {"query": "maito 1l", "category": ""})]
+    assert plan.duplicates == 1
+
+    resolved = plan.resolve([
+        result(2, "maito 1l", "", [product("2", "Maito")]),
+        result(1, "maito 1l", "", [product("1", "Maito")])])
+    assert [(details["store_id"], details["query"])
+            for details, _ in resolved] == [
+        (1, "Maito 1L"), (1, "  maito   1l "), (2, "MAITO 1L")]
+    assert resolved[0][0] is not resolved[1][0]
+
+
+def test_category_is_derived_from_complete_result():
+    """Test that a categorized pair is filtered from a complete result."""
+    cached = result(1, "maito", "", [
+        product("1", "Maito, munat ja rasvat"), product("2", "Juomat")])
+    pairs = [(1, {"query": "maito", "category": "Maito, munat ja rasvat"})]
+    plan = query_plan.ProductSearchPlan(
+        pairs, lookup=lambda pair: cached
+        if pair[1]["category"] == "" else None)
+    assert plan.fetches == [] and plan.derived == 1
+    (details, items), = plan.resolve(list(plan.results.values()))
+    assert details["category"] == "Maito, munat ja rasvat"
+    assert [item[0].ean for item in items] == ["1"]
+
+
+def test_category_is_fetched_for_partial_result():
+    """Test that a result missing later pages is not filtered."""
+    cached = result(1, "maito", "", [product("1", "Juomat")], total=50)
+    pairs = [(1, {"query": "maito", "category": "Juomat"})]
+    plan = query_plan.ProductSearchPlan(
+        pairs, lookup=lambda pair: cached
+        if pair[1]["category"] == "" else None)
+    assert plan.fetches == pairs and plan.derived == 0
@@ -0,0 +1,42 @@
+import asyncio
+
+from fastapi import BackgroundTasks
+
+from backend.app.core.search_context import SearchContext
+from backend.app.utils import deadline
+from backend.app.utils import patterns
+
+
+class DeadlineStrategy(patterns.Strategy):
+    """Reports the deadline seen by a task it creates."""
+
+    @staticmethod
+    async def execute(context):
+        return await asyncio.create_task(asyncio.to_thread(deadline.remaining))
+
+
+def execute(timeout: float | None, outer: float | None = None):
+    """Execute the strategy with a timeout, within an outer deadline."""
+    async def run():
+        with deadline.scope(outer):
+            return await SearchContext(strategy=DeadlineStrategy()).execute(
+                query="query", tasks=BackgroundTasks(), timeout=timeout)
+    return asyncio.run(run())
+
+
+def test_timeout_reaches_tasks_and_threads():
+    """Test that the deadline propagates into tasks & threads."""
+    assert execute(timeout=None) is None
+    assert 0 < execute(timeout=5.0) <= 5.0
+
+
+def test_sooner_outer_deadline_wins():
+    """Test that a timeout cannot extend an enclosing deadline."""
+    assert execute(timeout=5.0, outer=1.0) <= 1.0
+    assert 1.0 < execute(timeout=2.0, outer=10.0) <= 2.0
+
+
+def test_from_milliseconds_picks_shortest():
+    """Test that the shortest given timeout is used."""
+    assert deadline.from_milliseconds(None, None) is None
+    assert deadline.from_milliseconds(1500, None, 250) == 0.25
@@ -0,0 +1,93 @@
+import time
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks
+
+from backend.app.core.search_context import SearchState, race
+from backend.app.utils import patterns
+
+
+class DelayedStrategy(patterns.Strategy):
+    """Finishes with the given state after a delay."""
+
+    def __init__(self, delay: float, state: SearchState) -> None:
+        self.delay = delay
+        self.state = state
+        self.started = False
+        self.cancelled = False
+
+    @staticmethod
+    async def execute(context):
+        strategy = context.strategy
+        strategy.started = True
+        try:
+            await asyncio.sleep(strategy.delay)
+        except asyncio.CancelledError:
+            strategy.cancelled = True
+            raise
+        return strategy.state, [repr(strategy.state)]
+
+
+def run_race(*strategies: tuple[DelayedStrategy, float]):
+    """Race the strategies & get the winning result."""
+    return asyncio.run(race(
+        strategies=strategies,
+        accept=lambda result: result[0] is SearchState.SUCCESS,
+        query="query", tasks=BackgroundTasks()))
+
+
+def test_fast_success_skips_later_strategies():
+    """Test that a success within the grace period wins alone."""
+    db = DelayedStrategy(0.0, SearchState.SUCCESS)
+    api = DelayedStrategy(0.0, SearchState.SUCCESS)
+    assert run_race((db, 0.0), (api, 0.5))[0] is SearchState.SUCCESS
+    assert not api.started
+
+
+def test_failure_starts_next_strategy_early():
+    """Test that a failure starts the next strategy before its grace."""
+    db = DelayedStrategy(0.0, SearchState.FAIL)
+    api = DelayedStrategy(0.0, SearchState.SUCCESS)
+    start = time.monotonic()
+    assert run_race((db, 0.0), (api, 10.0))[0] is SearchState.SUCCESS
+    assert time.monotonic() - start < 1.0
+
+
+def test_slow_strategy_is_raced_and_cancelled():
+    """Test that a slow strategy is raced after its grace & cancelled."""
+    db = DelayedStrategy(1.0, SearchState.SUCCESS)
+    api = DelayedStrategy(0.01, SearchState.SUCCESS)
+    assert run_race((db, 0.0), (api, 0.01))[0] is SearchState.SUCCESS
+    assert api.started and db.cancelled
+
+
+def test_no_success_returns_lowest_priority_result():
+    """Test that the last strategy's result is returned if none succeed."""
+    db = DelayedStrategy(0.0, SearchState.FAIL)
+    api = DelayedStrategy(0.0, SearchState.CIRCUIT_OPEN)
+    assert run_race((db, 0.0), (api, 0.0))[0] is SearchState.CIRCUIT_OPEN
+
+
+class FailingStrategy(patterns.Strategy):
+    """Raises an error, like a strategy whose DB is down."""
+
+    @staticmethod
+    async def execute(context):
+        raise OSError("Connection refused")
+
+
+def test_raising_strategy_falls_back_to_the_next():
+    """Test that an error is not accepted, but does not end the race."""
+    api = DelayedStrategy(0.0, SearchState.SUCCESS)
+    assert run_race((FailingStrategy(), 0.0), (api, 0.0))[0] \
+        is SearchState.SUCCESS
+    api = DelayedStrategy(0.0, SearchState.SUCCESS)
+    assert run_race((FailingStrategy(), 0.0), (api, 10.0))[0] \
+        is SearchState.SUCCESS
+
+
+def test_every_strategy_raising_raises():
+    """Test that the race raises if no strategy returned a result."""
+    with pytest.raises(OSError):
+        run_race((FailingStrategy(), 0.0), (FailingStrategy(), 0.0))
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend.app.api.skaupat.fake_server import Catalog
+from backend.app.core import store_search
+from backend.app.utils import exceptions
+
+catalog = Catalog(seed=1, store_count=5, product_count=0, store_page_size=2)
+
+
+def serve_pages(monkeypatch, fail_page: int | None = None) -> list:
+    """Answer store searches from the catalog, failing the given page."""
+    cursors: list[str | None] = []
+
+    async def send_request(params):
+        body = params.get("content") or json.dumps(params["json"])
+        variables = json.loads(body)["variables"]
+        cursors.append(variables["cursor"])
+        if len(cursors) - 1 == fail_page:
+            return None
+        return httpx.Response(200, json={"data": {
+            "searchStores": catalog.search_stores(
+                query=variables["query"], brand=variables["brand"],
+                cursor=variables["cursor"])}})
+
+    monkeypatch.setattr(store_search.request, "send_request", send_request)
+    return cursors
+
+
+async def collect(**kwargs) -> list[list[str]]:
+    """Get the store ids of every page of a store search."""
+    return [[str(store.store_id) for store in stores]
+            async for stores in store_search.fetch_store_pages(**kwargs)]
+
+
+def test_cursors_are_followed_to_the_last_page(monkeypatch):
+    """Test that every page is fetched, following the returned cursors."""
+    cursors = serve_pages(monkeypatch)
+    pages = asyncio.run(collect())
+    assert cursors == [None, "2", "4"]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == [store["id"] for store in catalog.stores]
+
+
+def test_pages_are_capped_by_max_pages(monkeypatch):
+    """Test that a search stops after max_pages pages."""
+    cursors = serve_pages(monkeypatch)
+    assert len(asyncio.run(collect(max_pages=2))) == 2
+    assert cursors == [None, "2"]
+
+
+def test_missing_page_raises_pagination_error(monkeypatch):
+    """Test that a page without a response fails the whole search."""
+    serve_pages(monkeypatch, fail_page=1)
+    with pytest.raises(exceptions.PaginationError):
+        asyncio.run(collect())
+
+
+def test_ingestion_runs_once_at_a_time(monkeypatch):
+    """Test that an ingestion is not started while one is running."""
+    release = asyncio.Event()
+
+    async def ingest_store_catalog(brands):
+        await release.wait()
+        return {"brands": brands}
+
+    monkeypatch.setattr(
+        store_search, "ingest_store_catalog", ingest_store_catalog)
+    ingestion = store_search.CatalogIngestion()
+
+    async def main():
+        assert ingestion.start(brands=[])
+        assert not ingestion.start(brands=[])
+        release.set()
+        while ingestion.running:
+            await asyncio.sleep(0)
+        assert ingestion.start(brands=None)
+        await ingestion.close()
+
+    asyncio.run(main())
+    stats = ingestion.statistics()
+    assert stats["started"] == 2 and stats["rejected"] == 1
+    assert stats["last_summary"] == {"brands": []}
@@ -0,0 +1,58 @@
+import asyncio
+
+from backend.app.core.orm import schemas
+from backend.app.core.write_buffer import WriteBehindBuffer
+
+
+def store(store_id: int, name: str) -> schemas.Store:
+    """Create a store with the given id & name."""
+    return schemas.Store(
+        store_id=store_id, store_name=name, slug=name.lower(), brand="brand")
+
+
+class Writer:
+    """Records the batches written by a buffer."""
+
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+
+    def __call__(self, stores, products, product_data) -> None:
+        self.batches.append([s.store_name for s in stores])
+
+
+def test_records_are_deduplicated_and_drained():
+    """Test that records are written once per key, when closing."""
+    writer = Writer()
+    buffer = WriteBehindBuffer(
+        write=writer, enabled=True, flush_size=100, flush_interval=60.0)
+
+    async def main():
+        buffer.start()
+        await buffer.add_stores([store(1, "Old"), store(2, "Other")])
+        await buffer.add_stores([store(1, "New")])
+        assert writer.batches == [] and buffer.depth == 2
+        await buffer.close()
+
+    asyncio.run(main())
+    assert writer.batches == [["New", "Other"]]
+    stats = buffer.statistics()
+    assert stats["deduplicated"] == 1 and stats["flushes"] == 1
+    assert stats["depth"] == 0 and not stats["running"]
+
+
+def test_full_buffer_waits_for_a_flush():
+    """Test that reaching the size threshold flushes the buffer."""
+    writer = Writer()
+    buffer = WriteBehindBuffer(
+        write=writer, enabled=True, flush_size=2, flush_interval=60.0,
+        max_pending=2)
+
+    async def main():
+        buffer.start()
+        await buffer.add_stores([store(1, "A"), store(2, "B")])
+        await buffer.add_stores([store(3, "C")])
+        await buffer.close()
+
+    asyncio.run(main())
+    assert writer.batches == [["A", "B"], ["C"]]
+    assert buffer.statistics()["backpressure_waits"] == 1
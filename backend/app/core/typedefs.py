@@ -1,4 +1,6 @@
 """Contains type definitions for easier re-use throughout the app."""
+from datetime import datetime
+
 from backend.app.core.orm import schemas, models
 
 # ---- Grouped Aliases ----
@@ -9,6 +11,9 @@ SchemaOut = schemas.StoreDB | schemas.ProductDB | schemas.ProductDataDB
 SchemaInOrDict = SchemaIn | dict
 SchemaOutOrDict = SchemaOut | dict
 
+# A ProductData row to save, see tasks.build_product_rows()
+ProductDataRowT = dict[str, str | int | datetime]
+
 
 # ---- Function return signatures ----
 ProductSearchResultT = \
@@ -22,4 +27,16 @@ ProductSearchResultT = \
                 ]
             ]
         ]
-    ]
\ No newline at end of file
+    ]
+
+# A single (store, query) entry of a ProductSearchResultT
+ProductQueryResultT = \
+    tuple[
+        dict[str, str | int],
+        list[
+            tuple[
+                schemas.Product,
+                schemas.ProductData
+            ]
+        ]
+    ]
@@ -0,0 +1,210 @@
+"""Process-wide write-behind buffer for the results saved in the background.
+
+Each search used to save its results in a background task of its own,
+which under load means many small transactions, often saving the same
+products at the same time. Instead, the results are buffered, deduplicated
+by their natural key & written in large batches by a single flusher task.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Hashable, Iterable, Sequence
+
+from backend.app.core import config
+from backend.app.core import tasks
+from backend.app.core.orm import schemas
+from backend.app.core.typedefs import ProductDataRowT
+from backend.app.core.typedefs import ProductSearchResultT
+from backend.app.utils import LoggerManager
+
+logger = LoggerManager().get_logger(path=__name__, sh=0, fh=10)
+
+_settings = config.parser["WRITE_BUFFER"]
+ENABLED = _settings.getboolean("enabled")
+FLUSH_SIZE = _settings.getint("flush_size")
+FLUSH_INTERVAL = _settings.getfloat("flush_interval")
+MAX_PENDING = _settings.getint("max_pending")
+
+WriterT = Callable[[list[schemas.Store], list[schemas.Product],
+                    list[ProductDataRowT]], None]
+
+
+class WriteBehindBuffer:
+    """Buffers records to save & writes them in batches in the background.
+
+    Records are kept by their natural key, so a record added again before
+    it is written replaces the buffered one. A flush writes every buffered
+    record once 'flush_size' of them are buffered, or 'flush_interval'
+    seconds after the previous flush. Adding records waits for a flush
+    while 'max_pending' are buffered, so that a slow database slows down
+    the background tasks instead of growing the buffer without bounds.
+
+    Records are only buffered while the flusher is running (see start()),
+    otherwise they are written right away, as they are if not 'enabled'.
+    """
+
+    def __init__(
+            self, write: WriterT = tasks.save_records,
+            enabled: bool = ENABLED,
+            flush_size: int = FLUSH_SIZE,
+            flush_interval: float = FLUSH_INTERVAL,
+            max_pending: int = MAX_PENDING,
+            sample_size: int = 1000) -> None:
+        self.write = write
+        self.enabled = enabled
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._stores: dict[Hashable, schemas.Store] = {}
+        self._products: dict[Hashable, schemas.Product] = {}
+        self._product_data: dict[Hashable, ProductDataRowT] = {}
+        self._flusher: asyncio.Task | None = None
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Event()
+        self.in_flight = 0
+        self.counters: dict[str, int] = {
+            "added": 0, "deduplicated": 0, "direct_writes": 0,
+            "backpressure_waits": 0, "flushes": 0, "failed_flushes": 0,
+            "flushed": 0}
+        self._sizes: deque[int] = deque(maxlen=sample_size)
+        self._latencies: deque[float] = deque(maxlen=sample_size)
+
+    @property
+    def depth(self) -> int:
+        """The amount of buffered records, not counting the in-flight."""
+        return len(self._stores) + len(self._products) \
+            + len(self._product_data)
+
+    @property
+    def running(self) -> bool:
+        """Whether records are buffered, instead of written right away."""
+        return self._flusher is not None and not self._closing
+
+    def start(self) -> None:
+        """Start the flusher task, must be called within the event loop."""
+        if self.enabled and self._flusher is None:
+            self._closing = False
+            self._flusher = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop buffering & drain the buffer, waiting for the last flush."""
+        if (flusher := self._flusher) is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await flusher
+        self._flusher = None
+        logger.info("Write-behind buffer drained.")
+
+    async def add_stores(self, results: Sequence[schemas.Store]) -> None:
+        """Buffer store results, see tasks.save_store_results()."""
+        await self._add(stores=results)
+
+    async def add_product_results(
+            self, results: ProductSearchResultT) -> None:
+        """Buffer product results, see tasks.save_product_results()."""
+        products, product_data = tasks.build_product_rows(results)
+        await self._add(products=products, product_data=product_data)
+
+    async def _add(
+            self, stores: Sequence[schemas.Store] = (),
+            products: Sequence[schemas.Product] = (),
+            product_data: Sequence[ProductDataRowT] = ()) -> None:
+        """Add records to the buffer, waiting while it is full."""
+        while self.depth >= self.max_pending and self.running:
+            self.counters["backpressure_waits"] += 1
+            self._flushed.clear()
+            self._wakeup.set()
+            await self._flushed.wait()
+        if not self.running:
+            self.counters["direct_writes"] += 1
+            await asyncio.to_thread(
+                self.write, list(stores), list(products), list(product_data))
+            return
+        self._put(self._stores, ((store.store_id, store) for store in stores))
+        self._put(self._products,
+                  ((product.ean, product) for product in products))
+        # A product's data is only saved once per store & query
+        self._put(self._product_data, (
+            ((data["store_id"], data["product_ean"], data["query_key"]),
+             data) for data in product_data))
+        if self.depth >= self.flush_size:
+            self._wakeup.set()
+
+    def _put[T](self, buffer: dict[Hashable, T],
+                items: Iterable[tuple[Hashable, T]]) -> None:
+        """Buffer items by key, replacing the older items of a key."""
+        for key, item in items:
+            if key in buffer:
+                self.counters["deduplicated"] += 1
+            buffer[key] = item
+            self.counters["added"] += 1
+
+    async def _run(self) -> None:
+        """Flush on size or time, until closed & the buffer is empty."""
+        logger.debug("Write-behind buffer started.")
+        try:
+            while not self._closing or self.depth > 0:
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=self.flush_interval)
+                except TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self._flush()
+        finally:
+            # Releases any waiters, which then write their records directly
+            self._flushed.set()
+
+    async def _flush(self) -> None:
+        """Write every buffered record in a single batch."""
+        if self.depth == 0:
+            return
+        stores = list(self._stores.values())
+        products = list(self._products.values())
+        product_data = list(self._product_data.values())
+        self._stores, self._products, self._product_data = {}, {}, {}
+        self.in_flight = size = len(stores) + len(products) \
+            + len(product_data)
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.write, stores, products, product_data)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # The records are dropped, as a failed background task would
+            self.counters["failed_flushes"] += 1
+            logger.exception("Failed to flush %s buffered record(s).", size)
+        else:
+            self.counters["flushes"] += 1
+            self.counters["flushed"] += size
+        finally:
+            self.in_flight = 0
+            # Only now, so that waiters are held back by a slow database
+            self._flushed.set()
+            self._sizes.append(size)
+            self._latencies.append(time.perf_counter() - start)
+        logger.debug("Flushed %s buffered record(s).", size)
+
+    def statistics(self) -> dict[str, int | float | bool]:
+        """Get the buffer depth, counters & recent flush sizes & latencies."""
+        latencies = sorted(self._latencies)
+        sizes = self._sizes
+        return {
+            "running": self.running,
+            "flush_size": self.flush_size,
+            "max_pending": self.max_pending,
+            "depth": self.depth,
+            "in_flight": self.in_flight,
+            **self.counters,
+            "flush_size_mean": sum(sizes) / len(sizes) if sizes else 0.0,
+            "flush_size_max": max(sizes, default=0),
+            "flush_latency_mean":
+                sum(latencies) / len(latencies) if latencies else 0.0,
+            "flush_latency_p95":
+                latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+            "flush_latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+
+# Shared by the background saves of every search
+buffer = WriteBehindBuffer()
@@ -0,0 +1,73 @@
+"""Per-request deadlines, propagated through a context variable.
+
+A deadline set with scope() applies to the code within the scope and
+to every task created within it, as tasks copy the current context.
+Functions that wait on I/O can then bound their waits by remaining().
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+# Absolute deadline as a time.monotonic() value, None if unbounded
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+def remaining() -> float | None:
+    """Get the seconds left until the current deadline, None if unbounded.
+
+    Returns zero rather than a negative number once the deadline passed.
+    """
+    if (deadline := _deadline.get()) is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired() -> bool:
+    """Check if the current deadline has passed."""
+    return remaining() == 0.0
+
+
+@contextmanager
+def scope(timeout: float | None) -> Iterator[float | None]:
+    """Set a deadline 'timeout' seconds from now for the enclosed code.
+
+    An enclosing deadline that is sooner takes precedence, a timeout
+    of None keeps the enclosing deadline as is.
+
+    Yields:
+        float | None: The seconds left until the effective deadline.
+    """
+    deadline = _deadline.get()
+    if timeout is not None:
+        candidate = time.monotonic() + timeout
+        if deadline is None or candidate < deadline:
+            deadline = candidate
+    token = _deadline.set(deadline)
+    try:
+        yield remaining()
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def detached() -> Iterator[None]:
+    """Remove the deadline for the enclosed code.
+
+    For work shared by callers with different deadlines (see
+    api.coalesce), each caller then bounds its own wait instead.
+    """
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def from_milliseconds(*timeouts: int | None) -> float | None:
+    """Get the shortest of the given millisecond timeouts in seconds.
+
+    Timeouts of None are ignored, returns None if every timeout is None.
+    """
+    given = [timeout for timeout in timeouts if timeout is not None]
+    return min(given) / 1000 if given else None
@@ -19,3 +19,11 @@ class InvalidMatchCaseError(CustomErrorBase):
 
 class ExceptionInContext(CustomErrorBase):
     """An exception occurred within the context of a context manager."""
+
+
+class ClientNotOpenError(CustomErrorBase):
+    """The shared HTTP client was used before it was opened."""
+
+
+class PaginationError(CustomErrorBase):
+    """A page of a paginated search could not be fetched or parsed."""
@@ -48,3 +48,13 @@ class Project:
     def graphql_path(cls):
         """Path to the graphql file."""
         return cls.data_dir_path() / "graphql"
+
+    @classmethod
+    def samples_dir_path(cls):
+        """Path to the directory of recorded sample responses."""
+        return cls.data_dir_path() / "samples"
+
+    @classmethod
+    def cassettes_dir_path(cls):
+        """Path to the directory of recorded request/response cassettes."""
+        return cls.data_dir_path() / "cassettes"
@@ -0,0 +1 @@
+"""Micro-benchmarks for performance sensitive parts of the app."""
@@ -0,0 +1,63 @@
+"""Benchmark the bulk & lenient product response parsing paths.
+
+Run from the project root:
+    python -m backend.benchmarks.parse_benchmark [response.json ...]
+
+Each given file should contain a recorded GetProductByName response
+body. Defaults to the sample responses in app/data/samples.
+"""
+import sys
+import timeit
+from pathlib import Path
+
+import httpx
+
+from backend.app.core import parse
+from backend.app.utils import paths
+
+QUERY = {"query": "benchmark", "category": ""}
+
+
+def parse_lenient(response: httpx.Response):
+    """Parse a response using only the item-by-item path."""
+    content = parse.prepare_response_dict(response)
+    return parse.parse_product_store(
+        store=content["data"]["store"], query=QUERY)  # type: ignore
+
+
+def parse_bulk(response: httpx.Response):
+    """Parse a response using only the bulk validation path."""
+    return parse.parse_product_response_fast(response, query=QUERY)
+
+
+def benchmark(path: Path, number: int = 2000) -> None:
+    """Time both parsing paths on a recorded response & print results."""
+    response = httpx.Response(200, content=path.read_bytes())
+    lenient, bulk = parse_lenient(response), parse_bulk(response)
+    if bulk is None:
+        print(f"{path.name}: bulk validation fails, lenient path only.")
+    elif [tuple(map(dict, i)) for i in lenient[1]] != \
+            [tuple(map(dict, i)) for i in bulk[1]]:
+        raise ValueError(f"{path.name}: parsing paths disagree.")
+    results = {"lenient": timeit.timeit(
+        lambda: parse_lenient(response), number=number)}
+    if bulk is not None:
+        results["bulk"] = timeit.timeit(
+            lambda: parse_bulk(response), number=number)
+    print(f"{path.name} ({len(lenient[1])} items, {number} runs):")
+    for name, total in results.items():
+        print(f"    {name:>8}: {total / number * 1e6:9.1f} µs/response")
+    if "bulk" in results:
+        print(f"    speedup: {results['lenient'] / results['bulk']:.2f}x")
+
+
+def main(args: list[str]) -> None:
+    """Benchmark the given response files, or the bundled samples."""
+    files = [Path(arg) for arg in args] or sorted(
+        paths.Project.samples_dir_path().glob("product_*.json"))
+    for path in files:
+        benchmark(path)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
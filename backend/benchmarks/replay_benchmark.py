@@ -0,0 +1,91 @@
+"""Benchmark product searches against a recorded cassette.
+
+Record a cassette by setting [CASSETTE] mode = record & running product
+searches against the real API (or the fake server), then run from the
+project root:
+    python -m backend.benchmarks.replay_benchmark [name] [speed] [rounds]
+
+The recorded GetProductByName requests are sent again through the
+per-pair path of APIProductSearchStrategy, served by the replay
+transport. The response cache is disabled so that every round parses
+every response. Requests still pass through the upstream limiter, so
+rounds exceeding its rate are throttled just as they would be live.
+Recorded bodies that the bulk parsing path can no longer
+validate are reported, as those fall back to the slower lenient path.
+"""
+import sys
+import json
+import time
+import asyncio
+
+import httpx
+
+from backend.app.api import cache
+from backend.app.api import cassette
+from backend.app.api import request
+from backend.app.api.skaupat.query_utils import Operation
+from backend.app.core import parse
+from backend.app.core import product_search
+
+
+def recorded_pairs(entries: list[dict]) -> list[tuple[int, dict[str, str]]]:
+    """Get the distinct (store id, query) pairs of recorded searches."""
+    pairs = {}
+    for entry in entries:
+        if entry["operation"] != Operation.PRODUCT_SEARCH.value:
+            continue
+        variables = json.loads(entry["request"])["variables"]
+        query = {"query": variables["query"],
+                 "category": variables["slugs"]}
+        pairs[(variables["StoreID"], json.dumps(query))] = \
+            (variables["StoreID"], query)
+    return list(pairs.values())
+
+
+def count_bulk_fallbacks(entries: list[dict]) -> int:
+    """Count the recorded responses that fail bulk validation."""
+    return sum(
+        1 for entry in entries
+        if entry["operation"] == Operation.PRODUCT_SEARCH.value
+        and entry["status"] == 200
+        and parse.parse_product_response_fast(
+            httpx.Response(200, content=entry["body"].encode()),
+            query={"query": "", "category": ""}) is None)
+
+
+async def run(name: str, speed: float, rounds: int) -> None:
+    """Replay the recorded searches of a cassette & print timings."""
+    entries = cassette.load_cassette(cassette.cassette_path(name))
+    pairs = recorded_pairs(entries)
+    print(f"{name}: {len(entries)} recorded responses, "
+          f"{len(pairs)} product search pairs, speed {speed}.")
+    fallbacks = count_bulk_fallbacks(entries)
+    if fallbacks:
+        print(f"    {fallbacks} response(s) fail bulk validation, "
+              "the response schema may have drifted.")
+    cache.upstream.enabled = False
+    transport = cassette.ReplayTransport(entries, speed=speed)
+    await request.open_client(transport=transport)
+    try:
+        for index in range(rounds):
+            start = time.perf_counter()
+            results = await product_search.send_pair_queries(pairs)
+            elapsed = time.perf_counter() - start
+            items = sum(len(result[1]) for result in results)
+            print(f"    round {index + 1}: {elapsed * 1000:9.1f} ms, "
+                  f"{items} items")
+    finally:
+        await request.close_client()
+    print(f"    replayed: {transport.counters}")
+
+
+def main(args: list[str]) -> None:
+    """Benchmark the given cassette, or the one set in [CASSETTE]."""
+    name = args[0] if len(args) > 0 else cassette.NAME
+    speed = float(args[1]) if len(args) > 1 else cassette.SPEED
+    rounds = int(args[2]) if len(args) > 2 else 5
+    asyncio.run(run(name, speed, rounds))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])